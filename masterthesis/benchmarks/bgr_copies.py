@@ -0,0 +1,73 @@
+import argparse
+import timeit
+import tracemalloc
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def legacy(img, buffer):
+    """The original tf2_inference hot path: RGB view, tensor conversion, copy for drawing, BGR view."""
+    rgb = img[:, :, ::-1]
+    tensor = np.array(rgb[np.newaxis])  # tf.convert_to_tensor copies the negative-stride view
+    out = rgb.copy()
+    # cv2.VideoWriter.write needs a contiguous frame, so the BGR view of out is copied again
+    bgr = np.ascontiguousarray(out[:, :, ::-1])
+    return tensor.nbytes + out.nbytes + bgr.nbytes
+
+
+def host(img, buffer):
+    """Channels are converted once into a reusable buffer, detections are drawn on the original frame."""
+    if cv2 is not None:
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=buffer[0])
+    else:
+        np.copyto(buffer[0], img[:, :, ::-1])
+    tensor = np.array(buffer)
+    return buffer.nbytes + tensor.nbytes
+
+
+def graph(img, buffer):
+    """Channels are reversed inside the model graph, the BGR frame is only copied by tensor conversion."""
+    tensor = np.array(img[np.newaxis])
+    return tensor.nbytes
+
+
+def measure(fn, img, repeat, number):
+    buffer = np.empty((1, *img.shape), dtype=np.uint8)
+
+    tracemalloc.start()
+    copied = fn(img, buffer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    elapsed_time = min(timeit.repeat(lambda: fn(img, buffer), repeat=repeat, number=number)) / number
+    return copied, peak, elapsed_time
+
+
+def run(sizes, repeat, number):
+    if cv2 is None:
+        print('OpenCV is not installed, the host conversion falls back to NumPy.')
+
+    print(f'{"frame size":>10} {"path":>8} {"copied (MiB)":>13} {"allocated (MiB)":>16} {"time (ms)":>10}')
+    for width, height in sizes:
+        img = np.random.default_rng(0).integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+        for name, fn in [('legacy', legacy), ('host', host), ('graph', graph)]:
+            copied, allocated, elapsed_time = measure(fn, img, repeat, number)
+            print(f'{f"{width}x{height}":>10} {name:>8} {copied / 2 ** 20:>13.2f} {allocated / 2 ** 20:>16.2f} '
+                  f'{elapsed_time * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bytes copied per frame by the BGR/RGB handling of inference')
+
+    parser.add_argument('--sizes', nargs='+', default=['640x480', '1280x720', '1920x1080'])
+    parser.add_argument('--repeat', default=5, type=int)
+    parser.add_argument('--number', default=20, type=int)
+
+    args = parser.parse_args()
+    run([tuple(int(v) for v in size.split('x')) for size in args.sizes], args.repeat, args.number)
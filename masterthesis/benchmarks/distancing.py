@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import numpy as np
+
+from masterthesis.distancing import DistancingEngine, Homography
+
+
+def simulate(num_people, num_frames, width, height, speed, rng):
+    """Yields the (num_people, 4) person boxes of every frame of people walking at random."""
+    positions = rng.uniform((0, 0), (width, height), size=(num_people, 2))
+    velocities = rng.normal(0, speed, size=(num_people, 2))
+    sizes = rng.uniform((20, 50), (40, 120), size=(num_people, 2))
+
+    for _ in range(num_frames):
+        positions = np.clip(positions + velocities, 0, (width, height))
+        yield np.concatenate([positions - sizes * (0.5, 1), positions + sizes * (0.5, 0)], axis=1)
+
+
+def run(num_people, num_frames, width, height, speed, min_distance, skin, with_ids, seed):
+    # A 1920x1080 frame covering roughly 40x22 metres of ground
+    homography = Homography.from_points(
+        [[0, 0], [width, 0], [width, height], [0, height]],
+        [[0, 0], [40, 0], [38, 22], [2, 22]]
+    )
+
+    for label, engine_skin in [('incremental', skin), ('rebuild every frame', 0)]:
+        engine = DistancingEngine(homography, min_distance=min_distance, skin=engine_skin)
+        rng = np.random.default_rng(seed)
+        ids = np.arange(num_people) if with_ids else None
+
+        num_violations = 0
+        start_time = time.perf_counter()
+        for boxes in simulate(num_people, num_frames, width, height, speed, rng):
+            num_violations += len(engine.update(boxes, ids=ids))
+        elapsed_time = time.perf_counter() - start_time
+
+        print(f'{label}: {num_frames / elapsed_time:.1f} FPS, {elapsed_time / num_frames * 1000:.3f} ms/frame, '
+              f'{engine.num_rebuilds} rebuilds, {num_violations / num_frames:.1f} violations/frame')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--num-people', type=int, default=200)
+    parser.add_argument('--num-frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--speed', type=float, default=2, help='Standard deviation of the speed in pixels/frame')
+    parser.add_argument('--min-distance', type=float, default=2.0)
+    parser.add_argument('--skin', type=float, default=0.5)
+    parser.add_argument('--no-ids', dest='with_ids', action='store_false',
+                        help='Match people by proximity instead of using tracker ids')
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    run(
+        args.num_people,
+        args.num_frames,
+        args.width,
+        args.height,
+        args.speed,
+        args.min_distance,
+        args.skin,
+        args.with_ids,
+        args.seed
+    )
@@ -0,0 +1,103 @@
+import argparse
+import glob
+import io
+import itertools
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from masterthesis.datasets.kitti_utils import DEFAULT_ENCODING, JPEG_SUBSAMPLINGS, RESAMPLING_FILTERS, encode_image
+
+
+def create_images(images_dir, num_images, width, height, seed=0):
+    """Writes num_images smooth noise JPEGs, about as costly to decode as photos, returns their paths."""
+    rng = np.random.default_rng(seed)
+    image_paths = []
+
+    for i in range(num_images):
+        small = rng.integers(0, 256, size=(height // 16, width // 16, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((width, height), Image.BICUBIC)
+
+        image_path = os.path.join(images_dir, f'{i:06d}.jpg')
+        img.save(image_path, 'JPEG', quality=90)
+        image_paths.append(image_path)
+
+    return image_paths
+
+
+def reference(image_path, kitti_image_size):
+    """Full resolution decoding and Lanczos resize, without encoding."""
+    with Image.open(image_path) as img:
+        return np.asarray(img.convert('RGB').resize(kitti_image_size, Image.LANCZOS), dtype=np.float64)
+
+
+def psnr(a, b):
+    mse = np.mean((a - b) ** 2)
+    return 10 * np.log10(255 ** 2 / mse) if mse > 0 else float('inf')
+
+
+def run(image_paths, kitti_image_size, configs):
+    # Also reads the sources into the page cache and warms up the decoder before timing
+    references = [reference(image_path, kitti_image_size) for image_path in image_paths]
+    baseline_time = None
+
+    print(f'{"draft":>6} {"resample":>9} {"quality":>8} {"subsampling":>12} {"ms/image":>9} {"speedup":>8} '
+          f'{"KiB/image":>10} {"PSNR (dB)":>10}')
+    for encoding in configs:
+        elapsed_time = 0
+        sizes = []
+        psnrs = []
+
+        for image_path, expected in zip(image_paths, references):
+            buffer = io.BytesIO()
+
+            start_time = time.perf_counter()
+            with Image.open(image_path) as img:
+                encode_image(img, buffer, kitti_image_size, **encoding)
+            elapsed_time += time.perf_counter() - start_time
+
+            sizes.append(buffer.tell())
+            buffer.seek(0)
+            psnrs.append(psnr(np.asarray(Image.open(buffer).convert('RGB'), dtype=np.float64), expected))
+
+        ms = 1000 * elapsed_time / len(image_paths)
+        if baseline_time is None:
+            baseline_time = ms
+
+        print(f'{str(encoding["draft"]):>6} {str(encoding["resample"]):>9} {encoding["quality"]:>8} '
+              f'{str(encoding["subsampling"]):>12} {ms:>9.2f} {baseline_time / ms:>8.2f} '
+              f'{np.mean(sizes) / 1024:>10.1f} {np.mean(psnrs):>10.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Speed, size and quality (PSNR against a full resolution Lanczos '
+                                                 'resize) of the JPEG encodings of the KITTI conversion. The first '
+                                                 'row is the default encoding.')
+
+    parser.add_argument('--images-dir', default=None, help='Directory of JPEGs to use instead of synthetic images')
+    parser.add_argument('--num-images', default=20, type=int)
+    parser.add_argument('--image-size', nargs=2, type=int, default=[3000, 2000], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--kitti-image-size', nargs=2, type=int, default=[960, 544], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--resample', nargs='+', choices=list(RESAMPLING_FILTERS), default=['bicubic', 'lanczos'])
+    parser.add_argument('--quality', nargs='+', type=int, default=[75, 90])
+    parser.add_argument('--subsampling', nargs='+', choices=list(JPEG_SUBSAMPLINGS), default=['4:2:0', '4:4:4'])
+
+    args = parser.parse_args()
+
+    configs = [DEFAULT_ENCODING] + [
+        {'draft': draft, 'resample': resample, 'quality': quality, 'subsampling': subsampling}
+        for draft, resample, quality, subsampling in itertools.product(
+            [False, True], args.resample, args.quality, args.subsampling
+        )
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.images_dir:
+            image_paths = sorted(glob.glob(os.path.join(args.images_dir, '*.jpg')))[:args.num_images]
+        else:
+            image_paths = create_images(tmp_dir, args.num_images, *args.image_size)
+
+        run(image_paths, tuple(args.kitti_image_size), configs)
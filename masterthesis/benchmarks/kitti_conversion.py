@@ -0,0 +1,104 @@
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from masterthesis.datasets.kitti_utils import ToKittiBaseConverter
+
+CLASS_NAME = 'Face'
+
+
+class SyntheticConverter(ToKittiBaseConverter):
+
+    def __init__(self, output_dir, limit, kitti_image_size, workers):
+        super(SyntheticConverter, self).__init__(
+            kitti_images_dir=os.path.join(output_dir, 'images'),
+            kitti_labels_dir=os.path.join(output_dir, 'labels'),
+            limit={CLASS_NAME: limit},
+            kitti_image_size=kitti_image_size,
+            strict=True,
+            workers=workers
+        )
+
+    def __call__(self, examples):
+        for image_path, bboxes in examples:
+            self.write_example(image_path, [CLASS_NAME] * len(bboxes), bboxes)
+        return self.count[CLASS_NAME]
+
+    def log(self, image_path, w, h, bbox):
+        pass
+
+
+def create_images(images_dir, num_images, width, height, seed=0):
+    """Writes num_images noisy JPEGs with a few random boxes each, returns the (image path, boxes) examples."""
+    rng = np.random.default_rng(seed)
+    examples = []
+
+    for i in range(num_images):
+        # Smooth noise, so that JPEG encoding costs about as much as on photos
+        small = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+
+        image_path = os.path.join(images_dir, f'{i:06d}.jpg')
+        img.save(image_path, 'JPEG')
+
+        xy = rng.integers(0, [width // 2, height // 2], size=(rng.integers(1, 4), 2))
+        wh = rng.integers(16, [width // 2, height // 2], size=xy.shape)
+        examples.append((image_path, np.concatenate([xy, xy + wh], axis=1).tolist()))
+
+    return examples
+
+
+def digest(output_dir):
+    sha = hashlib.sha256()
+    for subdir in ['images', 'labels']:
+        for filename in sorted(os.listdir(os.path.join(output_dir, subdir))):
+            sha.update(filename.encode())
+            with open(os.path.join(output_dir, subdir, filename), 'rb') as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+def run(num_images, image_size, kitti_image_size, workers, limit):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        images_dir = os.path.join(tmp_dir, 'source')
+        os.makedirs(images_dir)
+        examples = create_images(images_dir, num_images, *image_size)
+
+        reference = None
+        serial_time = None
+
+        print(f'{"workers":>8} {"time (s)":>10} {"images/s":>10} {"speedup":>8} {"identical":>10}')
+        for num_workers in workers:
+            output_dir = os.path.join(tmp_dir, f'kitti_{num_workers}')
+
+            start_time = time.perf_counter()
+            with SyntheticConverter(output_dir, limit, kitti_image_size, num_workers) as converter:
+                count = converter(examples)
+            elapsed_time = time.perf_counter() - start_time
+
+            result = (count, digest(output_dir))
+            if reference is None:
+                reference, serial_time = result, elapsed_time
+            shutil.rmtree(output_dir)
+
+            print(f'{num_workers:>8} {elapsed_time:>10.3f} {num_images / elapsed_time:>10.2f} '
+                  f'{serial_time / elapsed_time:>8.2f} {str(result == reference):>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scaling of the KITTI conversion with the number of workers')
+
+    parser.add_argument('--num-images', default=200, type=int)
+    parser.add_argument('--image-size', nargs=2, type=int, default=[1920, 1080], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--kitti-image-size', nargs=2, type=int, default=[960, 544], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--workers', nargs='+', type=int, default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument('--limit', default=300, type=int, help='Category limit, applied in traversal order')
+
+    args = parser.parse_args()
+    run(args.num_images, args.image_size, tuple(args.kitti_image_size), args.workers, args.limit)
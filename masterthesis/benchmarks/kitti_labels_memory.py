@@ -0,0 +1,50 @@
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from masterthesis.datasets import kitti_utils as kitti
+
+
+def load_labels(labels_dir, frozen):
+    labels = {}
+    for filename in sorted(os.listdir(labels_dir)):
+        if filename.endswith('.txt'):
+            labels[filename] = kitti.read_annotation_file(os.path.join(labels_dir, filename), frozen=frozen)
+    return labels
+
+
+def measure(labels_dir, frozen):
+    gc.collect()
+    tracemalloc.start()
+
+    start_time = time.perf_counter()
+    labels = load_labels(labels_dir, frozen)
+    elapsed_time = time.perf_counter() - start_time
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    num_boxes = sum(len(annotations) for annotations in labels.values())
+    return len(labels), num_boxes, current, peak, elapsed_time
+
+
+def run(labels_dir):
+    for label, frozen in [('BoundingBox', False), ('FrozenBoundingBox', True)]:
+        num_files, num_boxes, current, peak, elapsed_time = measure(labels_dir, frozen)
+
+        print(label)
+        print(f'  {num_files} label files, {num_boxes} bounding boxes loaded in {elapsed_time:.3f}s')
+        print(f'  Resident memory: {current / 2 ** 20:.2f} MiB ({current / max(1, num_boxes):.1f} B/box)')
+        print(f'  Peak memory: {peak / 2 ** 20:.2f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('labels_dir', type=str, help='KITTI labels directory, e.g. <kitti-base-dir>/train/labels')
+
+    args = parser.parse_args()
+
+    run(args.labels_dir)
@@ -0,0 +1,95 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from masterthesis.detection.nms import non_max_suppression, soft_non_max_suppression
+
+
+def random_boxes(n, num_classes, rng):
+    # Clustered boxes, as produced by a detector: many overlapping proposals around few objects
+    centers = rng.uniform(0.1, 0.9, size=(max(1, n // 20), 2))
+    cxcy = centers[rng.integers(0, len(centers), size=n)] + rng.normal(0, 0.01, size=(n, 2))
+    wh = rng.uniform(0.02, 0.1, size=(n, 2))
+
+    boxes = np.concatenate([cxcy - wh / 2, cxcy + wh / 2], axis=1).astype(np.float32)
+    scores = rng.uniform(size=n).astype(np.float32)
+    classes = rng.integers(1, num_classes + 1, size=n)
+
+    return boxes, scores, classes
+
+
+def benchmark(fn, repeat, number):
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def run(sizes, num_classes, iou_threshold, score_threshold, max_output_size, repeat, number, seed):
+    rng = np.random.default_rng(seed)
+
+    try:
+        import tensorflow as tf
+    except ImportError:
+        tf = None
+        print('TensorFlow is not installed, skipping tf.image.non_max_suppression.')
+
+    for n in sizes:
+        boxes, scores, classes = random_boxes(n, num_classes, rng)
+
+        results = {
+            'numpy': benchmark(lambda: non_max_suppression(
+                boxes, scores,
+                iou_threshold=iou_threshold,
+                score_threshold=score_threshold,
+                max_output_size=max_output_size
+            ), repeat, number),
+            'numpy (class-aware)': benchmark(lambda: non_max_suppression(
+                boxes, scores, classes,
+                iou_threshold=iou_threshold,
+                score_threshold=score_threshold,
+                max_output_size=max_output_size
+            ), repeat, number),
+            'numpy (soft, gaussian)': benchmark(lambda: soft_non_max_suppression(
+                boxes, scores,
+                iou_threshold=iou_threshold,
+                max_output_size=max_output_size
+            ), repeat, number),
+        }
+
+        if tf is not None:
+            results['tensorflow'] = benchmark(lambda: tf.image.non_max_suppression(
+                boxes=boxes,
+                scores=scores,
+                max_output_size=max_output_size,
+                iou_threshold=iou_threshold,
+                score_threshold=score_threshold
+            ).numpy(), repeat, number)
+
+        print(f'{n} boxes')
+        for label, elapsed in results.items():
+            print(f'  {label:<24}{elapsed * 1000:10.3f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--num-classes', type=int, default=2)
+    parser.add_argument('--iou-threshold', type=float, default=0.5)
+    parser.add_argument('--score-threshold', type=float, default=0.005)
+    parser.add_argument('--max-output-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    run(
+        args.sizes,
+        args.num_classes,
+        args.iou_threshold,
+        args.score_threshold,
+        args.max_output_size,
+        args.repeat,
+        args.number,
+        args.seed
+    )
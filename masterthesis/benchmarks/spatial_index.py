@@ -0,0 +1,73 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from masterthesis.detection.spatial import GridIndex, RTree
+
+
+def brute_force_pairs(points, radius):
+    diff = points[:, None, :] - points[None, :, :]
+    distances = np.hypot(diff[..., 0], diff[..., 1])
+    i, j = np.nonzero(np.triu(distances <= radius, k=1))
+    return np.stack([i, j], axis=1)
+
+
+def benchmark(fn, repeat, number):
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def run(sizes, width, height, radius, repeat, number, brute_force_limit, seed):
+    rng = np.random.default_rng(seed)
+
+    print(f'{"boxes":>8}{"pairs":>10}{"brute force":>16}{"grid":>12}{"r-tree":>12}{"grid knn":>12}{"r-tree knn":>12}')
+
+    for n in sizes:
+        points = rng.uniform((0, 0), (width, height), size=(n, 2))
+
+        grid = GridIndex(points, radius)
+        rtree = RTree(points)
+        num_pairs = len(grid.query_pairs(radius))
+
+        def time(fn):
+            return f'{benchmark(fn, repeat, number) * 1000:9.3f} ms'
+
+        brute_force = time(lambda: brute_force_pairs(points, radius)) if n <= brute_force_limit else f'{"-":>12}'
+        query = points[0]
+
+        print(''.join([
+            f'{n:>8}',
+            f'{num_pairs:>10}',
+            f'{brute_force:>16}',
+            f'{time(lambda: GridIndex(points, radius).query_pairs(radius)):>12}',
+            f'{time(lambda: RTree(points).query_pairs(radius)):>12}',
+            f'{time(lambda: grid.query_knn(query, 8)):>12}',
+            f'{time(lambda: rtree.query_knn(query, 8)):>12}',
+        ]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build + all pairs within radius, and 8 nearest neighbours')
+
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--radius', type=float, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--number', type=int, default=5)
+    parser.add_argument('--brute-force-limit', type=int, default=5000,
+                        help='Skip the O(N^2) brute force baseline above this number of boxes')
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    run(
+        args.sizes,
+        args.width,
+        args.height,
+        args.radius,
+        args.repeat,
+        args.number,
+        args.brute_force_limit,
+        args.seed
+    )
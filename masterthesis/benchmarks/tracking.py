@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import numpy as np
+
+from masterthesis.detection.geometry import iou
+from masterthesis.detection.tracking import MATCHING_METHODS, StridedTracker, Tracker
+
+
+def random_scene(num_objects, num_frames, rng, size=(1920, 1080)):
+    """Returns the (num_frames, num_objects, 4) ground truth boxes of objects moving at constant speed."""
+    w, h = size
+    wh = rng.uniform(40, 120, size=(num_objects, 2)) * [1, 2]
+    start = rng.uniform([0, 0], [w, h], size=(num_objects, 2))
+    velocity = rng.normal(0, 3, size=(num_objects, 2))
+
+    centers = start[None] + np.arange(num_frames)[:, None, None] * velocity[None]
+    return np.concatenate([centers - wh / 2, centers + wh / 2], axis=2)
+
+
+class SyntheticDetector(object):
+    """Returns the noisy ground truth boxes of a frame after sleeping latency seconds, like a real detector."""
+
+    def __init__(self, scene, latency, noise, rng):
+        self.scene = scene
+        self.latency = latency
+        self.noise = noise
+        self.rng = rng
+
+    def __call__(self, frame_index):
+        time.sleep(self.latency)
+        boxes = self.scene[frame_index] + self.rng.normal(0, self.noise, size=self.scene[frame_index].shape)
+        return boxes, np.ones(len(boxes)), np.ones(len(boxes), dtype=np.int64)
+
+
+def run(strides, num_objects, num_frames, latency, noise, matching, seed):
+    rng = np.random.default_rng(seed)
+    scene = random_scene(num_objects, num_frames, rng)
+
+    print(f'{num_objects} objects, {num_frames} frames, detector latency: {latency * 1000:.1f} ms')
+    print(f'{"stride":>6} {"FPS":>10} {"tracker (ms)":>13} {"mean IoU":>9} {"IDs":>6}')
+
+    for stride in strides:
+        detector = SyntheticDetector(scene, latency, noise, rng)
+        tracker = StridedTracker(detector, stride=stride, tracker=Tracker(min_hits=1, matching=matching))
+
+        tracker_time = 0
+        overlaps = []
+        ids = set()
+
+        start_time = time.perf_counter()
+        for frame_index in range(num_frames):
+            frame_start = time.perf_counter()
+            tracks = tracker(frame_index)
+            elapsed_time = time.perf_counter() - frame_start
+
+            # Do not count the time spent in the detector
+            if frame_index % stride == 0:
+                elapsed_time -= latency
+            tracker_time += elapsed_time
+
+            if len(tracks) > 0:
+                overlaps.append(iou(tracks.boxes, scene[frame_index]).max(axis=1))
+            ids.update(tracks.ids.tolist())
+
+        total_time = time.perf_counter() - start_time
+        mean_iou = np.concatenate(overlaps).mean() if overlaps else 0
+
+        print(f'{stride:>6} {num_frames / total_time:>10.2f} {tracker_time / num_frames * 1000:>13.3f} '
+              f'{mean_iou:>9.3f} {len(ids):>6}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Effective FPS of a detector running every k frames with tracking')
+
+    parser.add_argument('--strides', nargs='+', default=[1, 2, 3, 5, 10], type=int)
+    parser.add_argument('--num-objects', default=50, type=int)
+    parser.add_argument('--num-frames', default=300, type=int)
+    parser.add_argument('--latency', default=0.05, type=float, help='Detector latency, in seconds')
+    parser.add_argument('--noise', default=2.0, type=float, help='Standard deviation of the detections, in pixels')
+    parser.add_argument('--matching', default='hungarian', choices=MATCHING_METHODS)
+    parser.add_argument('--seed', default=0, type=int)
+
+    args = parser.parse_args()
+    run(args.strides, args.num_objects, args.num_frames, args.latency, args.noise, args.matching, args.seed)
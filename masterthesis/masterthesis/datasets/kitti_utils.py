@@ -1,17 +1,23 @@
+import io
 import logging
 import os
+import shutil
 from abc import ABC
-from collections import UserList, defaultdict
+from collections import Counter, OrderedDict, UserList, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Union
 
 import imagesize
 from PIL import Image
 
+from .manifest import Manifest, atomic_write_text, file_digest, remove_temporary_files, text_digest
 from .utils import LineReader
-from ..detection.boundingbox import BoundingBox
+from ..detection.boundingbox import BoundingBox, FrozenBoundingBox
 
 Arithmetic = Union[float, int]
 
+MAX_PENDING_PER_WORKER = 4
+
 
 def is_string(x):
     return isinstance(x, str)
@@ -26,7 +32,7 @@ def is_arithmetic(x):
 
 def is_array(items, expected_len, item_fn):
     return all([
-        any([isinstance(items, list), isinstance(items, UserList)]),
+        isinstance(items, (list, tuple, UserList, FrozenBoundingBox)),
         len(items) == expected_len,
         all([item_fn(item) for item in items])
     ])
@@ -40,7 +46,7 @@ def create_annotation(
         truncated: Arithmetic = None,
         occluded: Arithmetic = None,
         alpha: Arithmetic = None,
-        bbox: Union[List[Arithmetic], BoundingBox] = None,
+        bbox: Union[List[Arithmetic], BoundingBox, FrozenBoundingBox] = None,
         dimensions: List[Arithmetic] = None,
         location: List[Arithmetic] = None,
         rotation_y: Arithmetic = None,
@@ -79,7 +85,7 @@ def write_annotation(out_file, annotation, truncated=False):
     def write(key):
         if key in annotation:
             value = annotation[key]
-            if isinstance(value, list) or isinstance(value, UserList):
+            if isinstance(value, (list, tuple, UserList, FrozenBoundingBox)):
                 for item in value:
                     columns.append(tostr(item))
             elif isinstance(value, str):
@@ -100,7 +106,7 @@ def write_annotation(out_file, annotation, truncated=False):
     out_file.write(' '.join(columns))
 
 
-def read_annotation(annotation_str):
+def read_annotation(annotation_str, frozen=False):
     reader = LineReader(annotation_str, r'[\t ]+')
     assert reader.has_columns(15)
 
@@ -118,7 +124,7 @@ def read_annotation(annotation_str):
     read('truncated', func=float)
     read('occluded', func=int)
     read('alpha', func=float)
-    read('bbox', 4, func=float, finalizer=BoundingBox)
+    read('bbox', 4, func=float, finalizer=FrozenBoundingBox if frozen else BoundingBox)
     read('dimensions', 3, func=float)
     read('location', 3, func=float)
     read('rotation_y', func=float)
@@ -127,85 +133,499 @@ def read_annotation(annotation_str):
     return annotation
 
 
-def read_annotation_file(annotation_path):
+def read_annotation_file(annotation_path, frozen=False):
     with open(annotation_path, 'r') as f:
         annotations = []
         for line in f.readlines():
             line = line.strip()
             if not line:
                 continue
-            annotations.append(read_annotation(line))
+            annotations.append(read_annotation(line, frozen=frozen))
         return annotations
 
 
-class ToKittiBaseConverter(ABC):
+# An example planned by ToKittiBaseConverter: the image to convert and its rendered KITTI label
+KittiExample = namedtuple('KittiExample', ['image_path', 'kitti_image_path', 'kitti_label_path', 'label'])
+
+
+# Ways of writing a source image that already is a KITTI image, from the cheapest to the most expensive
+COPY_METHODS = ['hardlink', 'reflink', 'copy']
+
+# ioctl cloning a file on copy-on-write file systems (Btrfs, XFS) on Linux
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+
+def copy_file(src, dst, method='hardlink'):
+    """
+    Writes dst with the content of src using method, or the next methods of COPY_METHODS if it is not supported
+    (e.g. hardlinks across file systems). Returns the method used.
+    """
+    for candidate in COPY_METHODS[COPY_METHODS.index(method):]:
+        try:
+            if candidate == 'hardlink':
+                os.link(src, dst)
+            elif candidate == 'reflink':
+                _reflink(src, dst)
+            else:
+                shutil.copyfile(src, dst)
+            return candidate
+        except (OSError, ImportError):
+            if os.path.isfile(dst):
+                os.remove(dst)
+            if candidate == COPY_METHODS[-1]:
+                raise
+
+
+# EXIF tag of the orientation of the image, 1 if the image is stored upright
+EXIF_ORIENTATION = 0x0112
+
+
+def is_kitti_image(img, kitti_image_size=None):
+    """
+    Whether an opened image, from its header only, is an RGB JPEG of kitti_image_size (of any size if None).
+    Images with an EXIF orientation are not, as their encoded copies drop it and EXIF-aware loaders would
+    rotate the copied images away from their labels.
+    """
+    return img.format == 'JPEG' and img.mode == 'RGB' and \
+        (not kitti_image_size or img.size == tuple(kitti_image_size)) and \
+        img.getexif().get(EXIF_ORIENTATION, 1) == 1
+
+
+RESAMPLING_FILTERS = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS
+}
+
+# Chroma subsamplings of the encoded JPEGs, by the value of the subsampling option of PIL
+JPEG_SUBSAMPLINGS = {
+    '4:4:4': 0,
+    '4:2:2': 1,
+    '4:2:0': 2
+}
+
+# Options of encode_image, the defaults are those of PIL
+DEFAULT_ENCODING = {
+    'draft': False,
+    'resample': None,
+    'quality': 75,
+    'subsampling': None
+}
+
+
+def encode_image(img, fp, kitti_image_size=None, draft=False, resample=None, quality=75, subsampling=None):
+    """
+    Converts an opened image to RGB, resizes it to kitti_image_size with one of RESAMPLING_FILTERS (the default
+    of PIL if None) and saves it to fp as a JPEG of quality with one of JPEG_SUBSAMPLINGS.
+
+    With draft, JPEGs larger than kitti_image_size are decoded at 1/2, 1/4 or 1/8 of their size by the DCT
+    scaling of libjpeg, as long as the decoded image stays larger than kitti_image_size, and then resized. This
+    skips most of the decoding of large sources, img must not have been loaded yet.
+    """
+    if draft and kitti_image_size:
+        img.draft('RGB', tuple(kitti_image_size))
+
+    img = img.convert('RGB')
+
+    if kitti_image_size:
+        if resample:
+            img = img.resize(kitti_image_size, RESAMPLING_FILTERS[resample])
+        else:
+            img = img.resize(kitti_image_size)
+
+    options = {'quality': quality}
+    if subsampling:
+        options['subsampling'] = JPEG_SUBSAMPLINGS[subsampling]
+
+    img.save(fp, 'JPEG', **options)
+
+
+def encode_example(example, kitti_image_size=None, digest=False, copy_method=None, **encoding):
+    """
+    Writes the converted image and the label of a planned example, through temporary files so that
+    interrupted conversions never leave partial outputs. Runs in the worker processes.
+
+    Images are encoded by encode_image with the encoding options. If copy_method is given, source images that
+    already are KITTI images are written with copy_file instead of being decoded and encoded again.
+
+    Returns the size in bytes of the image, the SHA-256 of the source image if digest is True (None otherwise)
+    and how the image has been written, 'encode' or a copy method.
+    """
+    tmp_path = f'{example.kitti_image_path}.tmp-{os.getpid()}'
 
-    def __init__(self, kitti_images_dir, kitti_labels_dir, limit, kitti_image_size, strict=False, verbose=False):
+    with Image.open(example.image_path) as img:
+        if copy_method and is_kitti_image(img, kitti_image_size):
+            method = copy_file(example.image_path, tmp_path, copy_method)
+        else:
+            encode_image(img, tmp_path, kitti_image_size, **encoding)
+            method = 'encode'
+
+    os.replace(tmp_path, example.kitti_image_path)
+
+    atomic_write_text(example.kitti_label_path, example.label)
+
+    return (
+        os.path.getsize(example.kitti_image_path),
+        file_digest(example.image_path) if digest else None,
+        method
+    )
+
+
+class ToKittiBaseConverter(ABC):
+    """
+    Base class of the converters of datasets to KITTI, that yield the examples of their dataset from examples.
+    Calling a converter writes every example with write_example. Otherwise, the examples of several converters
+    can be planned at once by masterthesis.datasets.planning, without decoding any image, and written with
+    write_selection.
+
+    Conversion is split into planning, which applies the category limits and renders the labels serially in
+    traversal order, so that the selected examples do not depend on the number of workers, and encoding,
+    which does the image I/O. With workers greater than one, examples are encoded by a process pool while
+    the following ones are planned, and the output is the same as with a single worker. flush (or leaving
+    the converter as a context manager) waits for all the pending examples.
+
+    If manifest_path is given, conversion is incremental: every written example is recorded in a Manifest
+    with its source (path, mtime, size and hash) and the parameters of the conversion, and the examples whose
+    source, parameters and outputs have not changed are not encoded again (only their label is rewritten if
+    the category limits changed it). Interrupted conversions resume from the recorded examples. When the
+    converter is closed after a complete run, the outputs it had written before but has not planned in this
+    run are removed. force ignores the recorded examples.
+
+    If copy_method is one of COPY_METHODS, the source images that already are RGB JPEGs of kitti_image_size
+    (as told by their header) are hardlinked, reflinked or copied instead of being decoded and encoded again.
+    The other images are encoded by encode_image with the encoding options (see DEFAULT_ENCODING).
+    """
+
+    def __init__(self, kitti_images_dir, kitti_labels_dir, limit, kitti_image_size, strict=False, verbose=False,
+                 frozen=False, workers=1, manifest_path=None, force=False, copy_method=None, encoding=None):
         self.kitti_images_dir = kitti_images_dir
         self.kitti_labels_dir = kitti_labels_dir
         self.limit = limit
         self.kitti_image_size = kitti_image_size
         self.strict = strict
         self.verbose = verbose
+        # FrozenBoundingBox takes a fraction of the memory of BoundingBox on large datasets
+        self.bbox_class = FrozenBoundingBox if frozen else BoundingBox
+        self.workers = workers
+        self.copy_method = copy_method
+        self.encoding = {**DEFAULT_ENCODING, **(encoding or {})}
+
+        self.force = force
 
         self.count = defaultdict(lambda: 0)
+        self.num_encoded = 0
+        self.num_skipped = 0
+        # Number of images written by every method ('encode' or a copy method) and bytes of the written images,
+        # hardlinked images taking no disk space of their own
+        self.methods = Counter()
+        self.bytes_written = 0
+        self.bytes_linked = 0
+
+        self._executor = None
+        # Pending (example, future) encodings by output image path, in submission order
+        self._pending = OrderedDict()
+        # Output image paths planned in this run
+        self._planned = set()
 
         os.makedirs(self.kitti_labels_dir, exist_ok=True)
         os.makedirs(self.kitti_images_dir, exist_ok=True)
 
-    def write_example(self, image_path, class_names, bboxes):
+        remove_temporary_files(self.kitti_images_dir)
+        remove_temporary_files(self.kitti_labels_dir)
+
+        # Opened by the first write, so that the converters of a stage can all be created before writing
+        self.manifest_path = manifest_path
+        self.manifest = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Stale outputs are only known after a complete run
+        self.close(prune=exc_type is None)
+
+    def open(self):
+        if self.manifest is None and self.manifest_path:
+            self.manifest = Manifest(self.manifest_path)
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def params(self):
+        """Parameters of the conversion that change the encoded images."""
+        params = {
+            'kitti_image_size': list(self.kitti_image_size) if self.kitti_image_size else None,
+            'format': 'JPEG'
+        }
+
+        # Copied images keep the bytes of their source, the copy method itself does not change them
+        if self.copy_method:
+            params['copy_sources'] = True
+
+        # Only the encoding options that differ from the defaults, so that the images converted before they were
+        # introduced are still up to date
+        for key, value in self.encoding.items():
+            if value != DEFAULT_ENCODING[key]:
+                params[key] = value
+
+        return params
+
+    def plan_example(self, image_path, class_names, bboxes):
+        """
+        Applies the category limits to the annotations of an example and updates the category counts.
+        Returns the KittiExample to encode, or None if the example is skipped.
+        """
         assert len(bboxes) == len(class_names), f'The number of bounding boxes ({len(bboxes)}) differs from the ' \
                                                 f'number of classes ({len(class_names)}).'
 
-        if len(bboxes) > 0:
-            annotations = []
-            img_size = imagesize.get(image_path)
+        if len(bboxes) == 0:
+            return None
 
-            img_bbox = BoundingBox([0, 0, *img_size])
+        # Examples whose classes have all reached their limit are skipped, rather than written without labels
+        if all(self.count[class_name] >= self.limit[class_name] for class_name in class_names):
+            return None
 
-            filename = os.path.splitext(os.path.basename(image_path))[0]
-            local_count = defaultdict(lambda: 0)
+        annotations = []
+        img_size = imagesize.get(image_path)
+
+        img_bbox = self.bbox_class([0, 0, *img_size])
+
+        local_count = defaultdict(lambda: 0)
+
+        for class_name, bbox in zip(class_names, bboxes):
+            bbox = self.bbox_class(bbox)
+
+            if self.count[class_name] < self.limit[class_name]:
+                # check if bounding box is valid and within image bounds
+                if bbox and bbox in img_bbox:
+                    local_count[class_name] += 1
+
+                    if self.kitti_image_size:
+                        bbox = bbox.resize(img_size, self.kitti_image_size)
+
+                    # Append KITTI annotation
+                    annotations.append(create_annotation(class_name, bbox=bbox))
+                else:
+                    w, h = img_size
+                    self.log(image_path, w, h, list(bbox))
+                    if self.verbose:
+                        logging.warning(f'{bbox} is not a valid bounding box (image size {w}x{h})')
+            elif self.verbose:
+                logging.info(f'Category limit reached for \'{class_name}\' category')
+
+        # If strict mode is enabled, write example only if all annotations were correct and within category limits
+        if self.strict and len(bboxes) != len(annotations):
+            return None
+
+        # Update category count
+        for k, v in local_count.items():
+            self.count[k] += v
+
+        return self._example(image_path, annotations)
+
+    def _example(self, image_path, annotations):
+        filename = os.path.splitext(os.path.basename(image_path))[0]
+
+        label = io.StringIO()
+        for annotation in annotations:
+            write_annotation(label, annotation, truncated=True)
+            label.write('\n')
+
+        return KittiExample(
+            image_path=image_path,
+            kitti_image_path=os.path.join(self.kitti_images_dir, filename + '.jpg'),
+            kitti_label_path=os.path.join(self.kitti_labels_dir, filename + '.txt'),
+            label=label.getvalue()
+        )
+
+    def is_up_to_date(self, example):
+        """
+        Whether the image of example has already been encoded from the same source with the same parameters.
+        The label of an up-to-date example is rewritten if it changed.
+        """
+        entry = self.manifest.get(example.kitti_image_path)
+        if entry is None or entry['params'] != self.params():
+            return False
+
+        if not os.path.isfile(example.kitti_image_path) or \
+                os.path.getsize(example.kitti_image_path) != entry['image_size']:
+            return False
+
+        stat = os.stat(example.image_path)
+        if entry['source_mtime_ns'] != stat.st_mtime_ns or entry['source_size'] != stat.st_size:
+            # Sources touched without being modified (e.g. copied) are not encoded again
+            if entry['source_size'] != stat.st_size or entry['source_sha256'] != file_digest(example.image_path):
+                return False
+
+        label_sha256 = text_digest(example.label)
+        if entry['label_sha256'] != label_sha256 or not os.path.isfile(example.kitti_label_path):
+            atomic_write_text(example.kitti_label_path, example.label)
+
+        if entry['source_mtime_ns'] != stat.st_mtime_ns or entry['label_sha256'] != label_sha256:
+            self._record(example, entry['image_size'], entry['source_sha256'], stat)
+
+        return True
+
+    def _record(self, example, image_size, source_sha256, stat=None):
+        if self.manifest is None:
+            return
+
+        stat = stat or os.stat(example.image_path)
+        self.manifest.put(
+            example.kitti_image_path,
+            converter=self.name,
+            source=example.image_path,
+            source_mtime_ns=stat.st_mtime_ns,
+            source_size=stat.st_size,
+            source_sha256=source_sha256,
+            params=self.params(),
+            image_size=image_size,
+            label_sha256=text_digest(example.label)
+        )
+
+    def _complete(self, example, future):
+        self._finish(example, *future.result())
+
+    def _finish(self, example, image_size, source_sha256, method):
+        self.methods[method] += 1
+        if method == 'hardlink':
+            self.bytes_linked += image_size
+        else:
+            self.bytes_written += image_size
 
-            for class_name, bbox in zip(class_names, bboxes):
-                bbox = BoundingBox(bbox)
-
-                if self.count[class_name] < self.limit[class_name]:
-                    # check if bounding box is valid and within image bounds
-                    if bbox and bbox in img_bbox:
-                        local_count[class_name] += 1
-
-                        if self.kitti_image_size:
-                            bbox = bbox.resize(img_size, self.kitti_image_size)
-
-                        # Append KITTI annotation
-                        annotations.append(create_annotation(class_name, bbox=bbox))
-                    else:
-                        w, h = img_size
-                        self.log(image_path, w, h, bbox.data)
-                        if self.verbose:
-                            logging.warning(f'{bbox} is not a valid bounding box (image size {w}x{h})')
-                elif self.verbose:
-                    logging.info(f'Category limit reached for \'{class_name}\' category')
-
-            # If strict mode is enabled, write example only if all annotations were correct and within category limits
-            if not self.strict or len(bboxes) == len(annotations):
-                # Update category count
-                for k, v in local_count.items():
-                    self.count[k] += v
-
-                # Save image
-                img = Image.open(image_path).convert('RGB')
+        self._record(example, image_size, source_sha256)
 
-                if self.kitti_image_size:
-                    img = img.resize(self.kitti_image_size)
+    def examples(self):
+        """Yields the (image_path, class_names, bboxes) examples of the dataset, in traversal order."""
+        raise NotImplementedError('examples is not implemented.')
 
-                img.save(os.path.join(self.kitti_images_dir, filename + '.jpg'), 'JPEG')
+    def __call__(self):
+        """Writes the examples of the dataset one after the other, returns the category counts."""
+        for image_path, class_names, bboxes in self.examples():
+            self.write_example(image_path, class_names, bboxes)
+        return self.count
 
-                # Save annotations
-                with open(os.path.join(self.kitti_labels_dir, filename + '.txt'), 'w') as f:
-                    for annotation in annotations:
-                        write_annotation(f, annotation, truncated=True)
-                        f.write('\n')
+    def write_example(self, image_path, class_names, bboxes):
+        self._write(self.plan_example(image_path, class_names, bboxes))
+
+    def write_selection(self, examples):
+        """
+        Writes examples selected by masterthesis.datasets.planning, (image_path, (width, height), class_names,
+        bboxes) tuples whose boxes have already been checked and limited, without reading the headers again.
+        Returns the category counts.
+        """
+        for image_path, img_size, class_names, bboxes in examples:
+            annotations = []
+            for class_name, bbox in zip(class_names, bboxes):
+                bbox = self.bbox_class(bbox)
+                if self.kitti_image_size:
+                    bbox = bbox.resize(img_size, self.kitti_image_size)
+                annotations.append(create_annotation(class_name, bbox=bbox))
+                self.count[class_name] += 1
+
+            self._write(self._example(image_path, annotations))
+
+        return self.count
+
+    def _write(self, example):
+        if example is None:
+            return
+
+        self.open()
+        self._planned.add(example.kitti_image_path)
+
+        if self.manifest is not None and not self.force:
+            # Examples with the same output are compared to the manifest once the previous one is written
+            previous = self._pending.pop(example.kitti_image_path, None)
+            if previous is not None:
+                self._complete(*previous)
+
+            if self.is_up_to_date(example):
+                self.num_skipped += 1
+                return
+
+        self.num_encoded += 1
+        digest = self.manifest is not None
+
+        if self.workers <= 1:
+            self._finish(
+                example, *encode_example(example, self.kitti_image_size, digest, self.copy_method, **self.encoding)
+            )
+            return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        # Examples with the same output overwrite each other in traversal order, as in a serial conversion
+        previous = self._pending.pop(example.kitti_image_path, None)
+        if previous is not None:
+            self._complete(*previous)
+
+        # Bound the number of pending examples, so that planning does not run arbitrarily far ahead
+        while len(self._pending) >= self.workers * MAX_PENDING_PER_WORKER:
+            _, previous = self._pending.popitem(last=False)
+            self._complete(*previous)
+
+        self._pending[example.kitti_image_path] = (
+            example,
+            self._executor.submit(
+                encode_example, example, self.kitti_image_size, digest, self.copy_method, **self.encoding
+            )
+        )
+
+    def flush(self):
+        """Waits for the pending examples to be written, raising the first error of the workers."""
+        while self._pending:
+            _, previous = self._pending.popitem(last=False)
+            self._complete(*previous)
+
+    def prune(self):
+        """Removes the outputs recorded by this converter in previous runs that have not been planned again."""
+        planned = {self.manifest.key(path) for path in self._planned}
+        stale = [
+            key for key, entry in self.manifest.entries.items()
+            if entry['converter'] == self.name and key not in planned
+        ]
+
+        for key in stale:
+            entry = self.manifest.entries[key]
+            image_path = os.path.join(self.manifest.root, key)
+            label_path = os.path.join(self.kitti_labels_dir, os.path.splitext(os.path.basename(key))[0] + '.txt')
+
+            for path in [image_path, label_path]:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+            self.manifest.remove(key)
+            if self.verbose:
+                logging.info(f'Removed {key}, converted from {entry["source"]} by a previous run')
+
+        return len(stale)
+
+    def close(self, prune=False):
+        try:
+            self.flush()
+            if self.manifest is not None and prune:
+                self.prune()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+            if self.manifest is not None:
+                self.manifest.compact()
+                self.manifest.close()
+                self.manifest = None
 
     def log(self, image_path, w, h, bbox):
         raise NotImplementedError('log is not implemented.')
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def atomic_write_text(path, text):
+    """Writes text to path through a temporary file, so that path is never left half-written."""
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def remove_temporary_files(directory):
+    """Removes the temporary files left in directory by interrupted atomic writes."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if '.tmp-' in entry.name and entry.is_file():
+                os.remove(entry.path)
+
+
+class Manifest(object):
+    """
+    Records, for every output file of a conversion, what it has been generated from (a dict per entry, keyed
+    by the path of the output relative to the manifest). Entries are appended to a JSON lines file as soon as
+    their outputs are complete, the last entry of a key winning, so that an interrupted conversion can resume
+    from the entries written so far. compact rewrites the file with the current entries only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(path)
+        self.entries = {}
+
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            # The last line of an interrupted run may be torn, it is cut off so that the entries appended by this
+            # run start on a line of their own
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+
+            for line in data[:end].decode().splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('deleted'):
+                    self.entries.pop(entry['key'], None)
+                else:
+                    self.entries[entry['key']] = entry
+
+        self._file = open(path, 'a')
+
+    def key(self, path):
+        return os.path.relpath(path, self.root)
+
+    def get(self, path):
+        return self.entries.get(self.key(path))
+
+    def put(self, path, **values):
+        entry = {'key': self.key(path), **values}
+        self.entries[entry['key']] = entry
+        self._append(entry)
+
+    def remove(self, key):
+        if self.entries.pop(key, None) is not None:
+            self._append({'key': key, 'deleted': True})
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def compact(self):
+        self._file.close()
+        atomic_write_text(self.path, ''.join(json.dumps(entry) + '\n' for entry in self.entries.values()))
+        self._file = open(self.path, 'a')
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return len(self.entries)
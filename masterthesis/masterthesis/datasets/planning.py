@@ -0,0 +1,173 @@
+import imagesize
+import numpy as np
+import pandas as pd
+
+BOX_COLUMNS = ['xmin', 'ymin', 'xmax', 'ymax']
+
+
+def annotations_table(sources):
+    """
+    Loads the annotations of the examples of every source (a dict from the name of a source to an iterable of
+    (image_path, class_names, bboxes) examples, in traversal order) into a table with one row per box and the
+    source, example, image_path, class_name, xmin, ymin, xmax and ymax columns. Examples are numbered in
+    traversal order across all the sources, examples without boxes are dropped.
+    """
+    names, examples, image_paths, class_names, boxes = [], [], [], [], []
+
+    num_examples = 0
+    for name, source_examples in sources.items():
+        for image_path, example_class_names, bboxes in source_examples:
+            assert len(bboxes) == len(example_class_names), f'The number of bounding boxes ({len(bboxes)}) ' \
+                                                            f'differs from the number of classes ' \
+                                                            f'({len(example_class_names)}).'
+            if len(bboxes) == 0:
+                continue
+
+            names += [name] * len(bboxes)
+            examples += [num_examples] * len(bboxes)
+            image_paths += [image_path] * len(bboxes)
+            class_names += list(example_class_names)
+            boxes += [list(bbox) for bbox in bboxes]
+
+            num_examples += 1
+
+    table = pd.DataFrame({
+        'source': pd.Categorical(names, categories=list(sources)),
+        'example': np.asarray(examples, dtype=np.int64),
+        'image_path': image_paths,
+        'class_name': pd.Categorical(class_names),
+    })
+
+    table[BOX_COLUMNS] = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return table
+
+
+def add_image_sizes(table):
+    """Adds the width and height columns of the images, read from their headers only (-1 if unknown)."""
+    sizes = {}
+    for image_path in table['image_path'].unique():
+        try:
+            sizes[image_path] = imagesize.get(image_path)
+        except OSError:
+            sizes[image_path] = (-1, -1)
+
+    size = np.asarray([sizes[image_path] for image_path in table['image_path']], dtype=np.float64).reshape(-1, 2)
+    table['width'] = size[:, 0]
+    table['height'] = size[:, 1]
+    return table
+
+
+def _class_counts(example, codes, num_examples, num_classes, weights=None):
+    """(E, K) number of boxes of every class in every example."""
+    counts = np.bincount(example * num_classes + codes, weights=weights, minlength=num_examples * num_classes)
+    return counts.reshape(num_examples, num_classes).astype(np.int64)
+
+
+def plan(table, limit, strict=False):
+    """
+    Applies the validity checks and the category limits of ToKittiBaseConverter to the annotations table (with
+    image sizes), as if its examples were written one after the other, and adds the columns:
+
+    - valid: the box is not empty and is within the image
+    - kept: the box is written to the label of its example
+    - selected: the example is written
+
+    In strict mode an example is only selected if all its boxes are valid and all its classes are below their
+    limit, otherwise an example is selected if one of its classes is below its limit and the boxes of a class
+    are kept while the class is below its limit. limit is a dict from class name to the maximum number of boxes
+    of the class.
+    """
+    categories = table['class_name'].cat.categories
+    codes = table['class_name'].cat.codes.to_numpy().astype(np.int64)
+    example = table['example'].to_numpy()
+
+    num_examples = int(example.max()) + 1 if len(example) else 0
+    num_classes = len(categories)
+    limits = np.asarray([limit[name] for name in categories], dtype=np.float64)
+
+    x0, y0, x1, y1 = (table[column].to_numpy() for column in BOX_COLUMNS)
+    valid = (x1 > x0) & (y1 > y0) & (x0 >= 0) & (y0 >= 0) & (x1 <= table['width'].to_numpy()) & \
+        (y1 <= table['height'].to_numpy())
+
+    valid_counts = _class_counts(example, codes, num_examples, num_classes, weights=valid)
+
+    if strict:
+        counts = _class_counts(example, codes, num_examples, num_classes)
+
+        selected = np.ones(num_examples, dtype=np.bool_)
+        selected[example[~valid]] = False
+
+        # An example is rejected once one of its classes has reached its limit, and so are all the following
+        # examples of that class. Every iteration saturates at least one class.
+        while True:
+            contributions = counts * selected[:, np.newaxis]
+            before = np.cumsum(contributions, axis=0) - contributions
+            violations = (before >= limits) & (counts > 0) & selected[:, np.newaxis]
+
+            rows = np.flatnonzero(violations.any(axis=1))
+            if len(rows) == 0:
+                break
+
+            first = rows[0]
+            saturated = violations[first]
+            later = np.arange(num_examples) >= first
+            selected &= ~(later & (counts[:, saturated] > 0).any(axis=1))
+
+        kept = valid & selected[example]
+    else:
+        # Boxes are kept as long as the valid boxes of the previous examples are below the limit
+        before = np.cumsum(valid_counts, axis=0) - valid_counts
+        below = before < limits
+        kept = valid & below[example, codes]
+        selected = np.zeros(num_examples, dtype=np.bool_)
+        selected[example[below[example, codes]]] = True
+
+    table['valid'] = valid
+    table['kept'] = kept
+    table['selected'] = selected[example]
+    return table
+
+
+def selection(table, source=None):
+    """
+    Yields the (image_path, (width, height), class_names, bboxes) of the kept boxes of the selected examples
+    of a planned table (of a single source if given), in traversal order.
+    """
+    rows = table[table['selected']]
+    if source is not None:
+        rows = rows[rows['source'] == source]
+
+    if len(rows) == 0:
+        return
+
+    boxes = rows[BOX_COLUMNS].to_numpy()
+    kept = rows['kept'].to_numpy()
+
+    example = rows['example'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, example[1:] != example[:-1]])
+    ends = np.r_[starts[1:], len(rows)]
+
+    image_paths = rows['image_path'].to_numpy()
+    class_names = rows['class_name'].to_numpy()
+    sizes = rows[['width', 'height']].to_numpy().astype(np.int64)
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        mask = kept[start:end]
+        yield (
+            image_paths[start],
+            tuple(sizes[start].tolist()),
+            class_names[start:end][mask].tolist(),
+            boxes[start:end][mask].tolist()
+        )
+
+
+def composition(table):
+    """Number of selected examples and of kept boxes of every class, by source."""
+    selected = table[table['selected']]
+
+    boxes = selected[selected['kept']].pivot_table(
+        index='source', columns='class_name', values='example', aggfunc='count', fill_value=0, observed=False
+    )
+    boxes.insert(0, 'examples', selected.groupby('source', observed=False)['example'].nunique())
+    boxes.loc['Total'] = boxes.sum()
+    return boxes
@@ -1,9 +1,15 @@
 from collections import UserList
 from enum import IntEnum, auto
 
+import numpy as np
+
 
 # From https://leimao.github.io/blog/Bounding-Box-Encoding-Decoding/#bounding-box-mode
 class BoxMode(IntEnum):
+    def _generate_next_value_(self, start, count, last_values):
+        """Generate consecutive automatic numbers starting from zero."""
+        return count
+
     CXCYWH = 0
     """
     The bounding box is represented as [cx, cy, w, h], where xc and yc are the coordinates of the 
@@ -30,135 +36,146 @@ class BoxMode(IntEnum):
     bounding box top-left corner, and w and h are the width and height of the bounding box.
     """
 
-    def _generate_next_value_(self, start, count, last_values):
-        """Generate consecutive automatic numbers starting from zero."""
-        return count
-
     def new(self, data, relative=None, absolute=None):
         return BoundingBox(data, mode=self, relative=relative, absolute=absolute)
 
 
-class BoundingBox(UserList):
-
-    def new_like(self, data):
-        return BoundingBox(data, mode=self.mode, relative=self.relative)
-
-    def __init__(self, data, mode=BoxMode.XYXY, relative=None, absolute=None):
-        assert isinstance(mode, BoxMode)
-        assert len(data) == 4, 'Bounding box must have length of 4.'
-        assert not (relative and absolute), 'Either relative or absolute can be passed as ' \
-                                            'argument, not both.'
-
-        super(BoundingBox, self).__init__(data)
-
-        if relative is not None:
-            self.relative = relative
-        else:
-            self.relative = absolute is not None and not absolute
+# Every BoxMode is a linear transform of [xmin, ymin, xmax, ymax], so that converting between two modes (and
+# scaling the coordinates along the way) is a single 4x4 matrix product.
+_LAYOUTS = {
+    BoxMode.CXCYWH: [
+        [.5, 0, .5, 0],
+        [0, .5, 0, .5],
+        [-1, 0, 1, 0],
+        [0, -1, 0, 1],
+    ],
+    BoxMode.XYXY: [
+        [1, 0, 0, 0],
+        [0, 1, 0, 0],
+        [0, 0, 1, 0],
+        [0, 0, 0, 1],
+    ],
+    BoxMode.XXYY: [
+        [1, 0, 0, 0],
+        [0, 0, 1, 0],
+        [0, 1, 0, 0],
+        [0, 0, 0, 1],
+    ],
+    BoxMode.XYWH: [
+        [1, 0, 0, 0],
+        [0, 1, 0, 0],
+        [-1, 0, 1, 0],
+        [0, -1, 0, 1],
+    ],
+}
+
+# Whether each coordinate of a mode is along the x axis, used to fold scaling into the conversion matrix
+_X_AXIS = {mode: np.abs(np.asarray(layout))[:, ::2].sum(axis=1) > 0 for mode, layout in _LAYOUTS.items()}
+
+_CONVERSION_MATRICES = {
+    (source_mode, target_mode): np.asarray(_LAYOUTS[target_mode], dtype=np.float64) @
+                                np.linalg.inv(np.asarray(_LAYOUTS[source_mode], dtype=np.float64))
+    for source_mode in BoxMode
+    for target_mode in BoxMode
+}
+
+# Row-major tuples of the conversion matrices and of the axes of the target coordinates, faster than NumPy
+# for single boxes
+_CONVERSION_ROWS = {key: tuple(tuple(row) for row in matrix.tolist()) for key, matrix in _CONVERSION_MATRICES.items()}
+_X_AXIS_ROWS = {mode: tuple(is_x.tolist()) for mode, is_x in _X_AXIS.items()}
+
+
+def conversion_matrix(source_mode, target_mode, scale=None):
+    """
+    Returns the 4x4 matrix that converts a bounding box from source_mode to target_mode, scaling the x and y
+    coordinates by scale = (ratio_w, ratio_h) if given.
+    """
+    matrix = _CONVERSION_MATRICES[(source_mode, target_mode)]
 
-        self.mode = mode
+    if scale is not None:
+        ratio_w, ratio_h = scale
+        matrix = np.where(_X_AXIS[target_mode], ratio_w, ratio_h)[:, None] * matrix
 
-    def to(self, target_mode):
-        assert isinstance(target_mode, BoxMode)
-
-        if self.mode == target_mode:
-            return self
+    return matrix
 
-        is_tgt_xyxy = target_mode == BoxMode.XYXY
-        is_tgt_centroid = target_mode == BoxMode.CXCYWH
-        is_tgt_xywh = target_mode == BoxMode.XYWH
 
-        def create(data):
-            return target_mode.new(data, relative=self.relative)
-
-        # YOLO bounding box
-        if self.mode == BoxMode.CXCYWH:
-            xc, yc, w, h = self
+def convert(data, source_mode, target_mode, scale=None):
+    """
+    Converts data from source_mode to target_mode, scaling the coordinates by scale = (ratio_w, ratio_h) if
+    given. data is either a single bounding box (a sequence of 4 numbers, a list is returned) or an (N, 4)
+    array of bounding boxes (an (N, 4) array is returned).
+    """
+    if isinstance(data, np.ndarray) and data.ndim == 2:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+        return data @ conversion_matrix(source_mode, target_mode, scale).T.astype(dtype, copy=False)
 
-            xmin = xc - w / 2
-            ymin = yc - h / 2
+    a, b, c, d = data
+    rows = _CONVERSION_ROWS[(source_mode, target_mode)]
 
-            if is_tgt_xywh:
-                return create([xmin, ymin, w, h])
+    if scale is None:
+        return [r0 * a + r1 * b + r2 * c + r3 * d for r0, r1, r2, r3 in rows]
 
-            xmax = xmin + w
-            ymax = ymin + h
+    ratio_w, ratio_h = scale
+    return [
+        (ratio_w if is_x else ratio_h) * (r0 * a + r1 * b + r2 * c + r3 * d)
+        for (r0, r1, r2, r3), is_x in zip(rows, _X_AXIS_ROWS[target_mode])
+    ]
 
-            return create([xmin, ymin, xmax, ymax] if is_tgt_xyxy
-                          else [xmin, xmax, ymin, ymax])
 
-        # MS COCO bounding box
-        if self.mode == BoxMode.XYWH:
-            xmin, ymin, w, h = self
+def _is_relative(relative, absolute):
+    assert not (relative and absolute), 'Either relative or absolute can be passed as ' \
+                                        'argument, not both.'
 
-            if is_tgt_centroid:
-                return create([xmin + w / 2, ymin + h / 2, w, h])
+    if relative is not None:
+        return relative
+    return absolute is not None and not absolute
 
-            xmax = xmin + w
-            ymax = ymin + h
 
-            return create([xmin, ymin, xmax, ymax] if is_tgt_xyxy
-                          else [xmin, xmax, ymin, ymax])
+class _BoundingBoxBase(object):
+    """Operations shared by BoundingBox and FrozenBoundingBox, which only rely on indexing, mode and relative."""
 
-        if self.mode == BoxMode.XYXY:
-            xmin, ymin, xmax, ymax = self
-        else:
-            xmin, xmax, ymin, ymax = self  # self.mode == BoxMode.MIN_MAX
+    __slots__ = ()
 
-        if is_tgt_centroid:
-            w = xmax - xmin
-            h = ymax - ymin
-            xc = xmin + w / 2
-            yc = ymin + h / 2
+    def new_like(self, data):
+        return type(self)(data, mode=self.mode, relative=self.relative)
 
-            return create([xc, yc, w, h])
+    def to(self, target_mode):
+        assert isinstance(target_mode, BoxMode)
 
-        if is_tgt_xywh:
-            w = xmax - xmin
-            h = ymax - ymin
+        if self.mode == target_mode:
+            return self
 
-            return create([xmin, ymin, w, h])
+        return type(self)(convert(self.data, self.mode, target_mode), mode=target_mode, relative=self.relative)
 
-        return create([xmin, ymin, xmax, ymax] if is_tgt_xyxy
-                      else [xmin, xmax, ymin, ymax])
+    def scale(self, ratio_w, ratio_h, mode=None, relative=None):
+        if mode is None:
+            mode = self.mode
+        if relative is None:
+            relative = self.relative
+        return type(self)(convert(self.data, self.mode, mode, scale=(ratio_w, ratio_h)), mode=mode,
+                          relative=relative)
 
-    def resize(self, source_size, target_size):
+    def resize(self, source_size, target_size, mode=None):
         (src_w, src_h), (tgt_w, tgt_h) = source_size, target_size
 
         if self.relative or (src_w == tgt_w and src_h == tgt_h):
-            return self
-
-        ratio_w, ratio_h = tgt_w / src_w, tgt_h / src_h
-
-        resized_bbox = self.to(BoxMode.XYXY)
-        xmin, ymin, xmax, ymax = resized_bbox
-        resized_bbox = resized_bbox.new_like(
-            [xmin * ratio_w, ymin * ratio_h, xmax * ratio_w, ymax * ratio_h]
-        )
+            return self if mode is None else self.to(mode)
 
-        return resized_bbox.to(self.mode)
+        return self.scale(tgt_w / src_w, tgt_h / src_h, mode)
 
-    def normalize(self, size):
+    def normalize(self, size, mode=None):
         assert self.absolute
 
         w, h = size
 
-        normalized_bbox = self.to(BoxMode.XYXY)
-        xmin, ymin, xmax, ymax = normalized_bbox
-        normalized_bbox = normalized_bbox.new_like([xmin / w, ymin / h, xmax / w, ymax / h])
+        return self.scale(1 / w, 1 / h, mode, relative=True)
 
-        return normalized_bbox.to(self.mode)
-
-    def denormalize(self, size):
+    def denormalize(self, size, mode=None):
         assert self.relative
 
         w, h = size
 
-        denormalized_bbox = self.to(BoxMode.XYXY)
-        xmin, ymin, xmax, ymax = denormalized_bbox
-        denormalized_bbox = denormalized_bbox.new_like([xmin * w, ymin * h, xmax * w, ymax * h])
-
-        return denormalized_bbox.to(self.mode)
+        return self.scale(w, h, mode, relative=False)
 
     def area(self):
         return self.width * self.height
@@ -181,14 +198,14 @@ class BoundingBox(UserList):
 
     def __eq__(self, other):
         return all([
-            isinstance(other, BoundingBox),
+            isinstance(other, _BoundingBoxBase),
             self.mode == other.mode,
             self.relative == other.relative,
-            self.data == other.cache
+            tuple(self) == tuple(other)
         ])
 
     def __contains__(self, other):
-        if not isinstance(other, BoundingBox):
+        if not isinstance(other, _BoundingBoxBase):
             return False
 
         x0, y0, x1, y1 = self.to(BoxMode.XYXY)
@@ -206,6 +223,62 @@ class BoundingBox(UserList):
         return xmax > xmin and ymax > ymin
 
     def __repr__(self):
-        return f'BoundingBox({self.data}, ' \
+        return f'{type(self).__name__}({list(self)}, ' \
                f'mode={self.mode.name}, ' \
                f'relative={self.relative})'
+
+
+class BoundingBox(_BoundingBoxBase, UserList):
+
+    def __init__(self, data, mode=BoxMode.XYXY, relative=None, absolute=None):
+        assert isinstance(mode, BoxMode)
+        assert len(data) == 4, 'Bounding box must have length of 4.'
+
+        super(BoundingBox, self).__init__(data)
+
+        self.relative = _is_relative(relative, absolute)
+        self.mode = mode
+
+    def freeze(self):
+        return FrozenBoundingBox(self.data, mode=self.mode, relative=self.relative)
+
+
+class FrozenBoundingBox(_BoundingBoxBase):
+    """
+    Immutable and hashable bounding box. Coordinates are stored in a tuple and attributes in slots, so that it
+    takes a fraction of the memory of a BoundingBox and can be used as a dict key or in a set.
+    """
+
+    __slots__ = ('data', 'mode', 'relative')
+
+    def __init__(self, data, mode=BoxMode.XYXY, relative=None, absolute=None):
+        assert isinstance(mode, BoxMode)
+        assert len(data) == 4, 'Bounding box must have length of 4.'
+
+        object.__setattr__(self, 'data', tuple(data))
+        object.__setattr__(self, 'mode', mode)
+        object.__setattr__(self, 'relative', _is_relative(relative, absolute))
+
+    def thaw(self):
+        return BoundingBox(list(self.data), mode=self.mode, relative=self.relative)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable.')
+
+    def __delattr__(self, item):
+        raise AttributeError(f'{type(self).__name__} is immutable.')
+
+    def __reduce__(self):
+        return FrozenBoundingBox, (self.data, self.mode, self.relative)
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return 4
+
+    def __hash__(self):
+        return hash((self.data, self.mode, self.relative))
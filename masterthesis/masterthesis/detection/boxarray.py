@@ -0,0 +1,179 @@
+import numpy as np
+
+from .boundingbox import BoundingBox, BoxMode, FrozenBoundingBox, _is_relative, convert
+
+
+def _box_view(data, mode, relative):
+    # Bypass UserList.__init__, which would copy data into a new list, so that writes to the returned box
+    # are reflected in the array it was taken from.
+    bbox = BoundingBox.__new__(BoundingBox)
+    bbox.data = data
+    bbox.mode = mode
+    bbox.relative = relative
+    return bbox
+
+
+class BoxArray(object):
+    """
+    Collection of N bounding boxes stored in a single (N, 4) NumPy array sharing one BoxMode and one
+    relative flag. All the operations of BoundingBox are applied to the whole collection at once.
+    """
+
+    @staticmethod
+    def from_boxes(bboxes, mode=None, dtype=None):
+        if len(bboxes) == 0:
+            return BoxArray(np.empty((0, 4)), mode=BoxMode.XYXY if mode is None else mode, dtype=dtype)
+
+        first = bboxes[0]
+        if mode is None:
+            mode = first.mode
+
+        assert all(bbox.relative == first.relative for bbox in bboxes), 'Cannot mix relative and absolute ' \
+                                                                        'bounding boxes.'
+
+        return BoxArray(
+            [list(bbox.to(mode)) for bbox in bboxes],
+            mode=mode,
+            relative=first.relative,
+            dtype=dtype
+        )
+
+    @staticmethod
+    def from_box(bbox, dtype=None):
+        # A box taken from a BoxArray is a view of one of its rows, so the returned array shares its memory.
+        return BoxArray(np.reshape(bbox.data, (1, 4)), mode=bbox.mode, relative=bbox.relative, dtype=dtype)
+
+    def new_like(self, data):
+        return BoxArray(data, mode=self.mode, relative=self.relative)
+
+    def __init__(self, data, mode=BoxMode.XYXY, relative=None, absolute=None, dtype=None, copy=False):
+        assert isinstance(mode, BoxMode)
+
+        data = np.array(data, dtype=dtype, copy=True) if copy else np.asarray(data, dtype=dtype)
+
+        if data.size == 0:
+            data = data.reshape(0, 4)
+        if dtype is None and not np.issubdtype(data.dtype, np.floating):
+            data = data.astype(np.float32)
+
+        assert data.ndim == 2 and data.shape[1] == 4, f'Bounding box array must have shape (N, 4), ' \
+                                                      f'got {data.shape}.'
+
+        self.data = data
+        self.relative = _is_relative(relative, absolute)
+        self.mode = mode
+
+    def to(self, target_mode):
+        assert isinstance(target_mode, BoxMode)
+
+        if self.mode == target_mode:
+            return self
+
+        return BoxArray(convert(self.data, self.mode, target_mode), mode=target_mode, relative=self.relative)
+
+    def scale(self, ratio_w, ratio_h, mode=None):
+        if mode is None:
+            mode = self.mode
+        return BoxArray(convert(self.data, self.mode, mode, scale=(ratio_w, ratio_h)), mode=mode,
+                        relative=self.relative)
+
+    def resize(self, source_size, target_size, mode=None):
+        (src_w, src_h), (tgt_w, tgt_h) = source_size, target_size
+
+        if self.relative or (src_w == tgt_w and src_h == tgt_h):
+            return self if mode is None else self.to(mode)
+
+        return self.scale(tgt_w / src_w, tgt_h / src_h, mode)
+
+    def normalize(self, size, mode=None):
+        assert self.absolute
+
+        w, h = size
+
+        normalized = self.scale(1 / w, 1 / h, mode)
+        normalized.relative = True
+
+        return normalized
+
+    def denormalize(self, size, mode=None):
+        assert self.relative
+
+        w, h = size
+
+        denormalized = self.scale(w, h, mode)
+        denormalized.relative = False
+
+        return denormalized
+
+    def area(self):
+        return self.width * self.height
+
+    @property
+    def width(self):
+        if self.mode == BoxMode.CXCYWH or self.mode == BoxMode.XYWH:
+            return self.data[:, 2]
+        return self.data[:, 2 if self.mode == BoxMode.XYXY else 1] - self.data[:, 0]
+
+    @property
+    def height(self):
+        if self.mode == BoxMode.CXCYWH or self.mode == BoxMode.XYWH:
+            return self.data[:, 3]
+        return self.data[:, 3] - self.data[:, 1 if self.mode == BoxMode.XYXY else 2]
+
+    @property
+    def absolute(self):
+        return not self.relative
+
+    def valid(self):
+        """Boolean mask of the boxes with positive width and height."""
+        return (self.width > 0) & (self.height > 0)
+
+    def within(self, bbox):
+        """Boolean mask of the boxes contained in bbox, which may be a BoundingBox or a list [xmin, ymin, xmax, ymax]."""
+        if isinstance(bbox, (BoundingBox, FrozenBoundingBox)):
+            bbox = bbox.to(BoxMode.XYXY)
+        x0, y0, x1, y1 = bbox
+
+        xmin, ymin, xmax, ymax = convert(self.data, self.mode, BoxMode.XYXY).T
+
+        return (xmin >= x0) & (ymin >= y0) & (xmax <= x1) & (ymax <= y1)
+
+    def to_boxes(self):
+        return [BoundingBox(row.tolist(), mode=self.mode, relative=self.relative) for row in self.data]
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return _box_view(self.data[item], self.mode, self.relative)
+        return self.new_like(self.data[item])
+
+    def __setitem__(self, key, value):
+        if isinstance(value, (BoundingBox, FrozenBoundingBox)):
+            assert value.relative == self.relative
+            value = list(value.to(self.mode))
+        elif isinstance(value, BoxArray):
+            assert value.relative == self.relative
+            value = value.to(self.mode).data
+        self.data[key] = value
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+
+    def __eq__(self, other):
+        return all([
+            isinstance(other, BoxArray),
+            self.mode == other.mode,
+            self.relative == other.relative,
+            np.array_equal(self.data, other.data)
+        ])
+
+    def __repr__(self):
+        return f'BoxArray({self.data.tolist()}, ' \
+               f'mode={self.mode.name}, ' \
+               f'relative={self.relative})'
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def expand_boxes(boxes, margin, size):
+    """Expands [xmin, ymin, xmax, ymax] boxes by margin times their size on every side, clipped to size."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    width, height = size
+
+    wh = boxes[:, 2:] - boxes[:, :2]
+    expanded = np.concatenate([boxes[:, :2] - margin * wh, boxes[:, 2:] + margin * wh], axis=1)
+
+    return np.clip(expanded, 0, [width, height, width, height])
+
+
+def crop_and_resize(image, boxes, size, out=None):
+    """
+    Crops the [xmin, ymin, xmax, ymax] pixel boxes from image (H, W, C) and resizes them to size
+    (width, height) with nearest-neighbour sampling, in a single gather. Returns the (N, height, width, C)
+    array of the crops, written into out (at least N crops, same dtype as image) if given.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    width, height = size
+    image_height, image_width = image.shape[:2]
+
+    # Sampling positions of the pixel centres of every crop, (N, height) rows and (N, width) columns
+    xs = boxes[:, 0:1] + (np.arange(width) + 0.5) * ((boxes[:, 2:3] - boxes[:, 0:1]) / width)
+    ys = boxes[:, 1:2] + (np.arange(height) + 0.5) * ((boxes[:, 3:4] - boxes[:, 1:2]) / height)
+
+    xs = np.clip(xs.astype(np.intp), 0, image_width - 1)
+    ys = np.clip(ys.astype(np.intp), 0, image_height - 1)
+
+    # Flat pixel indices of the crops, gathered at once into the output array
+    indices = ys[:, :, np.newaxis] * image_width + xs[:, np.newaxis, :]
+    pixels = image.reshape(image_height * image_width, -1)
+
+    if out is not None:
+        out = out[:len(boxes)].reshape(*indices.shape, pixels.shape[1])
+
+    crops = np.take(pixels, indices, axis=0, out=out)
+    return crops.reshape(*indices.shape, *image.shape[2:])
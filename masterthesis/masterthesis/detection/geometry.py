@@ -0,0 +1,131 @@
+import numpy as np
+
+from .boundingbox import BoundingBox, BoxMode, FrozenBoundingBox
+from .boxarray import BoxArray
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+"""Maximum number of bytes allocated for the temporary arrays of a single chunk of a pairwise computation."""
+
+# Number of (n, m) temporaries allocated by the most expensive kernel (giou)
+_NUM_TEMPORARIES = 8
+
+
+def as_xyxy_array(boxes, mode=BoxMode.XYXY):
+    """
+    Returns boxes as an (N, 4) array in XYXY mode. boxes can be a BoxArray, a (Frozen)BoundingBox, a sequence
+    of (Frozen)BoundingBox or anything that can be converted to an (N, 4) array, whose layout is given by mode.
+    """
+    if isinstance(boxes, BoxArray):
+        return boxes.to(BoxMode.XYXY).data
+    if isinstance(boxes, (BoundingBox, FrozenBoundingBox)):
+        return np.asarray(list(boxes.to(BoxMode.XYXY)), dtype=np.float64).reshape(1, 4)
+    if len(boxes) > 0 and isinstance(boxes[0], (BoundingBox, FrozenBoundingBox)):
+        return BoxArray.from_boxes(boxes, mode=BoxMode.XYXY).data
+    return BoxArray(np.reshape(boxes, (-1, 4)), mode=mode).to(BoxMode.XYXY).data
+
+
+def _area(boxes):
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def _intersection(a, b):
+    w = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    h = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    return np.clip(w, 0, None) * np.clip(h, 0, None)
+
+
+def _union(a, b, inter):
+    return _area(a)[:, None] + _area(b)[None, :] - inter
+
+
+def _iou(a, b):
+    inter = _intersection(a, b)
+    union = _union(a, b, inter)
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _giou(a, b):
+    inter = _intersection(a, b)
+    union = _union(a, b, inter)
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    w = np.maximum(a[:, None, 2], b[None, :, 2]) - np.minimum(a[:, None, 0], b[None, :, 0])
+    h = np.maximum(a[:, None, 3], b[None, :, 3]) - np.minimum(a[:, None, 1], b[None, :, 1])
+    enclosing = w * h
+
+    return iou - np.divide(enclosing - union, enclosing, out=np.zeros_like(inter), where=enclosing > 0)
+
+
+def _containment(a, b):
+    # Same semantics as `b[j] in a[i]` for BoundingBox
+    return (b[None, :, 0] >= a[:, None, 0]) & \
+           (b[None, :, 1] >= a[:, None, 1]) & \
+           (b[None, :, 2] <= a[:, None, 2]) & \
+           (b[None, :, 3] <= a[:, None, 3])
+
+
+_KERNELS = {
+    'intersection': (_intersection, None),
+    'iou': (_iou, None),
+    'giou': (_giou, None),
+    'containment': (_containment, np.bool_),
+}
+
+
+def compute_chunk_size(num_columns, itemsize=8, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Number of rows that can be compared with num_columns boxes at once within memory_budget bytes."""
+    return max(1, memory_budget // (max(1, num_columns) * itemsize * _NUM_TEMPORARIES))
+
+
+def _iter_blocks(a, b, kernel, chunk_size, memory_budget):
+    # a and b are (N, 4) and (M, 4) arrays in XYXY mode
+    if chunk_size is None:
+        chunk_size = compute_chunk_size(len(b), np.result_type(a, b).itemsize, memory_budget)
+
+    for start in range(0, len(a), chunk_size):
+        stop = min(start + chunk_size, len(a))
+        yield start, stop, kernel(a[start:stop], b)
+
+
+def iter_pairwise(a, b, metric='iou', mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Yields (start, stop, block) tuples, where block is the (stop - start, M) matrix of metric between
+    a[start:stop] and every box of b. Useful for reductions (e.g. the best match of every box) that do not
+    need the whole (N, M) matrix.
+    """
+    assert metric in _KERNELS, f'Unknown metric: \'{metric}\''
+    kernel, _ = _KERNELS[metric]
+
+    return _iter_blocks(as_xyxy_array(a, mode), as_xyxy_array(b, mode), kernel, chunk_size, memory_budget)
+
+
+def pairwise(a, b, metric='iou', mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    assert metric in _KERNELS, f'Unknown metric: \'{metric}\''
+    kernel, dtype = _KERNELS[metric]
+
+    a = as_xyxy_array(a, mode)
+    b = as_xyxy_array(b, mode)
+
+    out = np.empty((len(a), len(b)), dtype=dtype or np.result_type(a, b))
+
+    for start, stop, block in _iter_blocks(a, b, kernel, chunk_size, memory_budget):
+        out[start:stop] = block
+
+    return out
+
+
+def intersection_area(a, b, mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    return pairwise(a, b, 'intersection', mode, chunk_size, memory_budget)
+
+
+def iou(a, b, mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    return pairwise(a, b, 'iou', mode, chunk_size, memory_budget)
+
+
+def giou(a, b, mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    return pairwise(a, b, 'giou', mode, chunk_size, memory_budget)
+
+
+def containment(a, b, mode=BoxMode.XYXY, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Boolean (N, M) matrix whose element (i, j) tells whether b[j] is contained in a[i]."""
+    return pairwise(a, b, 'containment', mode, chunk_size, memory_budget)
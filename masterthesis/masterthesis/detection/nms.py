@@ -0,0 +1,152 @@
+import numpy as np
+
+from .boundingbox import BoxMode
+from .geometry import as_xyxy_array
+
+SOFT_NMS_METHODS = [
+    'linear',
+    'gaussian'
+]
+
+
+def _prepare(boxes, scores, classes, score_threshold, top_k, mode):
+    boxes = as_xyxy_array(boxes, mode)
+    scores = np.asarray(scores).reshape(-1)
+
+    assert len(boxes) == len(scores), f'The number of bounding boxes ({len(boxes)}) differs from the ' \
+                                      f'number of scores ({len(scores)}).'
+
+    candidates = np.flatnonzero(scores > score_threshold) if score_threshold is not None else np.arange(len(scores))
+
+    # Sort once by decreasing score (stable, so that ties keep the input order)
+    order = candidates[np.argsort(-scores[candidates], kind='stable')]
+    if top_k is not None:
+        order = order[:top_k]
+
+    boxes = boxes[order]
+
+    if classes is not None and len(boxes) > 0:
+        classes = np.asarray(classes).reshape(-1)[order]
+        # Move the boxes of each class to a disjoint region of the plane, so that boxes of different classes
+        # never overlap and a single class-agnostic pass is enough.
+        offsets = classes.astype(boxes.dtype) * (boxes.max() - boxes.min() + 1)
+        boxes = boxes + offsets[:, None]
+
+    return order, boxes
+
+
+def _areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def _iou_one_to_many(box, box_area, boxes, areas):
+    w = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    h = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    inter = np.clip(w, 0, None) * np.clip(h, 0, None)
+    union = box_area + areas - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def non_max_suppression(
+        boxes,
+        scores,
+        classes=None,
+        iou_threshold=0.5,
+        score_threshold=None,
+        max_output_size=None,
+        top_k=None,
+        mode=BoxMode.XYXY
+):
+    """
+    Greedy non-maximum suppression. Returns the indices of the selected boxes, sorted by decreasing score.
+
+    If classes is given, boxes are only suppressed by boxes of the same class (class-aware mode), otherwise
+    boxes of any class suppress each other (class-agnostic mode). Only boxes whose score is greater than
+    score_threshold are considered and, if top_k is given, only the top_k highest scoring ones.
+    """
+    order, boxes = _prepare(boxes, scores, classes, score_threshold, top_k, mode)
+
+    if max_output_size is None:
+        max_output_size = len(order)
+
+    areas = _areas(boxes)
+
+    # Boolean mask of the candidates that have not been suppressed yet
+    alive = np.ones(len(order), dtype=np.bool_)
+    selected = []
+
+    for i in range(len(order)):
+        if len(selected) >= max_output_size:
+            break
+        if not alive[i]:
+            continue
+
+        selected.append(i)
+
+        rest = i + 1 + np.flatnonzero(alive[i + 1:])
+        if len(rest) == 0:
+            break
+
+        iou = _iou_one_to_many(boxes[i], areas[i], boxes[rest], areas[rest])
+        alive[rest[iou > iou_threshold]] = False
+
+    return order[np.asarray(selected, dtype=np.intp)]
+
+
+def soft_non_max_suppression(
+        boxes,
+        scores,
+        classes=None,
+        iou_threshold=0.5,
+        score_threshold=0.001,
+        max_output_size=None,
+        top_k=None,
+        method='gaussian',
+        sigma=0.5,
+        mode=BoxMode.XYXY
+):
+    """
+    Soft non-maximum suppression (Bodla et al., 2017). Instead of discarding the boxes that overlap a selected
+    box, their scores are decayed linearly (only above iou_threshold) or with a gaussian penalty, and boxes
+    are dropped once their score falls below score_threshold.
+
+    Returns a tuple (indices, scores) with the indices of the selected boxes and their decayed scores, both
+    sorted by decreasing decayed score.
+    """
+    assert method in SOFT_NMS_METHODS, f'Unknown soft-NMS method: \'{method}\''
+
+    order, boxes = _prepare(boxes, scores, classes, score_threshold, top_k, mode)
+
+    if max_output_size is None:
+        max_output_size = len(order)
+
+    areas = _areas(boxes)
+    decayed = np.asarray(scores, dtype=np.float64).reshape(-1)[order]
+
+    remaining = np.arange(len(order))
+    selected = []
+    selected_scores = []
+
+    while len(remaining) > 0 and len(selected) < max_output_size:
+        best = np.argmax(decayed[remaining])
+        i = remaining[best]
+
+        selected.append(i)
+        selected_scores.append(decayed[i])
+
+        remaining = np.delete(remaining, best)
+        if len(remaining) == 0:
+            break
+
+        iou = _iou_one_to_many(boxes[i], areas[i], boxes[remaining], areas[remaining])
+        if method == 'linear':
+            decay = np.where(iou > iou_threshold, 1 - iou, 1)
+        else:
+            decay = np.exp(-(iou * iou) / sigma)
+
+        decayed[remaining] *= decay
+
+        if score_threshold is not None:
+            remaining = remaining[decayed[remaining] > score_threshold]
+
+    return order[np.asarray(selected, dtype=np.intp)], np.asarray(selected_scores)
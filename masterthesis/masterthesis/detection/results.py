@@ -0,0 +1,205 @@
+import re
+
+import numpy as np
+
+from .boundingbox import BoxMode
+from .boxarray import BoxArray
+from .nms import non_max_suppression
+from ..utils.visualization_utils import draw_detections_on_image_array
+
+# The TF2 Object Detection API returns [ymin, xmin, ymax, xmax] boxes
+YXYX_TO_XYXY = [1, 0, 3, 2]
+
+
+def _to_numpy(value):
+    return value.numpy() if hasattr(value, 'numpy') else np.asarray(value)
+
+
+def read_labelmap(path):
+    """Reads a label map (as written by scripts/create_labelmap.py), returns a dict {id: (name, display_name)}."""
+    with open(path, 'r') as f:
+        labelmap_str = f.read()
+
+    labelmap = {}
+    for item in re.findall(r'item\s*{([^}]*)}', labelmap_str):
+        fields = dict(re.findall(r'(\w+)\s*:\s*[\'"]?([^\'"\n]*)[\'"]?', item))
+        name = fields.get('name')
+        labelmap[int(fields['id'])] = (name, fields.get('display_name', name))
+
+    return labelmap
+
+
+class DetectionResult(object):
+    """
+    Detections of a batch of frames, stored in preallocated (B, D, ...) buffers that are reused by every call
+    to load(). B is the number of frames and D the number of detections per frame; the detections of a
+    frame that are still alive are given by mask.
+
+    Every post-processing step (thresholding, class remapping, NMS, denormalization) works on the whole batch
+    in place and returns the result itself, so that steps can be chained.
+    """
+
+    def __init__(self, batch_size=1, max_detections=100):
+        self._boxes = np.zeros((batch_size, max_detections, 4), dtype=np.float32)
+        self._scores = np.zeros((batch_size, max_detections), dtype=np.float32)
+        self._classes = np.zeros((batch_size, max_detections), dtype=np.int32)
+        self._mask = np.zeros((batch_size, max_detections), dtype=np.bool_)
+
+        self.num_frames = 0
+        self.num_detections = 0
+        self.relative = True
+
+    def _reserve(self, batch_size, max_detections):
+        capacity_b, capacity_d = self._scores.shape
+        if batch_size <= capacity_b and max_detections <= capacity_d:
+            return
+
+        shape = (max(batch_size, capacity_b), max(max_detections, capacity_d))
+        self._boxes = np.zeros((*shape, 4), dtype=np.float32)
+        self._scores = np.zeros(shape, dtype=np.float32)
+        self._classes = np.zeros(shape, dtype=np.int32)
+        self._mask = np.zeros(shape, dtype=np.bool_)
+
+    @property
+    def boxes(self):
+        """(B, D, 4) array of [xmin, ymin, xmax, ymax] boxes."""
+        return self._boxes[:self.num_frames, :self.num_detections]
+
+    @property
+    def scores(self):
+        return self._scores[:self.num_frames, :self.num_detections]
+
+    @property
+    def classes(self):
+        return self._classes[:self.num_frames, :self.num_detections]
+
+    @property
+    def mask(self):
+        return self._mask[:self.num_frames, :self.num_detections]
+
+    @property
+    def absolute(self):
+        return not self.relative
+
+    def __len__(self):
+        return self.num_frames
+
+    def load(self, outputs, box_order=YXYX_TO_XYXY, num_frames=None):
+        """
+        Copies the batched outputs of a detector (a dict with the detection_boxes, detection_scores,
+        detection_classes and num_detections tensors or arrays) into the buffers. box_order permutes the
+        coordinates of the boxes to [xmin, ymin, xmax, ymax]. If num_frames is given, only the first
+        num_frames frames of the batch are kept, the other ones being padding.
+        """
+        boxes = _to_numpy(outputs['detection_boxes'])[:num_frames]
+        batch_size, max_detections = boxes.shape[:2]
+
+        self._reserve(batch_size, max_detections)
+        self.num_frames = batch_size
+        self.num_detections = max_detections
+        self.relative = True
+
+        np.take(boxes, box_order, axis=2, out=self.boxes)
+        np.copyto(self.scores, _to_numpy(outputs['detection_scores'])[:num_frames], casting='unsafe')
+        np.copyto(self.classes, _to_numpy(outputs['detection_classes'])[:num_frames], casting='unsafe')
+
+        if 'num_detections' in outputs:
+            num_detections = _to_numpy(outputs['num_detections'])[:num_frames].astype(np.int64).reshape(-1, 1)
+            np.less(np.arange(max_detections), num_detections, out=self.mask)
+        else:
+            self.mask.fill(True)
+
+        return self
+
+    def threshold(self, min_score):
+        mask = self.mask
+        mask &= self.scores >= min_score
+        return self
+
+    def remap_classes(self, mapping):
+        """
+        Replaces every class id with mapping[id], where mapping is a dict {id: new_id} (e.g. from the ids of
+        the label map of a model to the ones of a dataset). Detections whose class is not mapped are dropped.
+        """
+        lut = np.full(max(mapping) + 2, -1, dtype=np.int32)
+        lut[list(mapping.keys())] = list(mapping.values())
+
+        # Ids out of the table are looked up in its last entry, which is never mapped
+        classes = self.classes
+        np.take(lut, np.clip(classes, -1, len(lut) - 1), out=classes)
+
+        mask = self.mask
+        mask &= classes >= 0
+        return self
+
+    def non_max_suppression(
+            self,
+            iou_threshold=0.5,
+            score_threshold=None,
+            max_output_size=None,
+            top_k=None,
+            class_agnostic=False
+    ):
+        boxes, scores, classes, mask = self.boxes, self.scores, self.classes, self.mask
+
+        for i in range(self.num_frames):
+            indices = np.flatnonzero(mask[i])
+            if len(indices) == 0:
+                continue
+
+            selected = non_max_suppression(
+                boxes=boxes[i, indices],
+                scores=scores[i, indices],
+                classes=None if class_agnostic else classes[i, indices],
+                iou_threshold=iou_threshold,
+                score_threshold=score_threshold,
+                max_output_size=max_output_size,
+                top_k=top_k
+            )
+
+            mask[i, indices] = False
+            mask[i, indices[selected]] = True
+
+        return self
+
+    def denormalize(self, size):
+        """size is the (width, height) of all the frames, or an (B, 2) array with the size of every frame."""
+        assert self.relative
+
+        size = np.asarray(size, dtype=np.float32).reshape(-1, 1, 2)
+        boxes = self.boxes
+        boxes *= np.concatenate([size, size], axis=2)
+
+        self.relative = False
+        return self
+
+    def frame(self, index):
+        """Returns the (boxes, scores, classes) arrays of the detections of a frame."""
+        mask = self.mask[index]
+        return self.boxes[index, mask], self.scores[index, mask], self.classes[index, mask]
+
+    def frame_boxes(self, index):
+        return BoxArray(self.boxes[index, self.mask[index]], mode=BoxMode.XYXY, relative=self.relative)
+
+    def draw(self, images, display_names=None, colors=None, **kwargs):
+        """
+        Draws the detections of every frame on images (a (B, H, W, 3) array or a list of B images) in place.
+        Additional keyword arguments are forwarded to draw_detections_on_image_array.
+        """
+        assert len(images) == self.num_frames
+
+        for i in range(self.num_frames):
+            boxes, scores, classes = self.frame(i)
+
+            draw_detections_on_image_array(
+                images[i],
+                boxes=boxes,
+                classes=None if display_names is None else classes,
+                scores=scores,
+                display_names=display_names,
+                colors=colors,
+                use_normalized_coordinates=self.relative,
+                **kwargs
+            )
+
+        return images
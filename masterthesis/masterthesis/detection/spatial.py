@@ -0,0 +1,312 @@
+import heapq
+import math
+
+import numpy as np
+
+from .boundingbox import BoxMode
+from .geometry import as_xyxy_array
+
+
+def foot_points(boxes, mode=BoxMode.XYXY):
+    """Returns the (N, 2) array of the bottom-centre points of boxes, i.e. where people touch the ground."""
+    boxes = as_xyxy_array(boxes, mode)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+
+
+def _as_points(points):
+    points = np.asarray(points, dtype=np.float64)
+    if points.size == 0:
+        return points.reshape(0, 2)
+    return points.reshape(-1, 2)
+
+
+def _expand_ranges(starts, ends):
+    """
+    Given N half-open ranges [starts[i], ends[i]), returns (rows, values), where values is the concatenation
+    of all ranges and rows[k] is the index of the range values[k] comes from.
+    """
+    counts = ends - starts
+    rows = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, starts[rows] + offsets
+
+
+def _sorted_pairs(i, j):
+    pairs = np.stack([np.minimum(i, j), np.maximum(i, j)], axis=1)
+    if len(pairs) == 0:
+        return pairs.reshape(0, 2).astype(np.intp)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+class GridIndex(object):
+    """
+    Uniform grid over 2D points. Points are sorted by cell so that every cell is a contiguous slice of the
+    index, and cells are looked up with a binary search over their (dense, row-major) keys.
+
+    cell_size should be close to the typical query radius: pairs within radius are then found by looking at
+    a 3x3 neighbourhood only.
+    """
+
+    def __init__(self, points, cell_size):
+        assert cell_size > 0, 'Cell size must be positive.'
+
+        self.points = _as_points(points)
+        self.cell_size = cell_size
+
+        cells = np.floor(self.points / cell_size).astype(np.int64)
+
+        if len(cells) > 0:
+            self._min_cell = cells.min(axis=0)
+            self._shape = cells.max(axis=0) - self._min_cell + 1
+        else:
+            self._min_cell = np.zeros(2, dtype=np.int64)
+            self._shape = np.ones(2, dtype=np.int64)
+
+        self._cells = cells - self._min_cell
+
+        keys = self._keys(self._cells)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _keys(self, cells):
+        return cells[..., 0] * self._shape[1] + cells[..., 1]
+
+    def _lookup(self, cells):
+        """Returns the [start, end) slices of self._order holding the points of cells, empty if out of the grid."""
+        inside = np.all((cells >= 0) & (cells < self._shape), axis=-1)
+        keys = np.where(inside, self._keys(cells), -1)
+
+        starts = np.searchsorted(self._sorted_keys, keys, side='left')
+        ends = np.searchsorted(self._sorted_keys, keys, side='right')
+        ends[~inside] = starts[~inside]
+
+        return starts, ends
+
+    def _cell_of(self, point):
+        return np.floor(np.asarray(point, dtype=np.float64) / self.cell_size).astype(np.int64) - self._min_cell
+
+    def _block(self, center, reach):
+        offsets = np.arange(-reach, reach + 1)
+        dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+        return center + np.stack([dx.ravel(), dy.ravel()], axis=1)
+
+    def query_radius(self, point, radius):
+        """Returns the sorted indices of the points within radius of point."""
+        reach = int(math.ceil(radius / self.cell_size))
+
+        starts, ends = self._lookup(self._block(self._cell_of(point), reach))
+        _, positions = _expand_ranges(starts, ends)
+        candidates = self._order[positions]
+
+        distances = np.hypot(*(self.points[candidates] - point).T)
+        return np.sort(candidates[distances <= radius])
+
+    def query_knn(self, point, k):
+        """Returns the indices of the k nearest points to point and their distances, sorted by distance."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        center = self._cell_of(point)
+        max_reach = int(np.max(np.maximum(np.abs(center), np.abs(self._shape - 1 - center))))
+
+        for reach in range(0, max_reach + 1):
+            starts, ends = self._lookup(self._block(center, reach))
+            _, positions = _expand_ranges(starts, ends)
+
+            if len(positions) < k:
+                continue
+
+            candidates = self._order[positions]
+            distances = np.hypot(*(self.points[candidates] - point).T)
+            nearest = np.argsort(distances, kind='stable')[:k]
+
+            # Points outside the block are at least reach cells away, so the result is final
+            if reach == max_reach or distances[nearest[-1]] <= reach * self.cell_size:
+                return candidates[nearest], distances[nearest]
+
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    def query_pairs(self, radius):
+        """Returns the (P, 2) array of the index pairs (i, j), i < j, of the points within radius of each other."""
+        reach = int(math.ceil(radius / self.cell_size))
+
+        # Visit half of the neighbourhood, so that every pair of cells is compared only once
+        offsets = [(dx, dy) for dx in range(0, reach + 1) for dy in range(-reach, reach + 1) if dx > 0 or dy >= 0]
+
+        all_i, all_j = [], []
+        for offset in offsets:
+            starts, ends = self._lookup(self._cells + np.asarray(offset))
+            rows, positions = _expand_ranges(starts, ends)
+
+            i, j = rows, self._order[positions]
+            if offset == (0, 0):
+                keep = j > i
+                i, j = i[keep], j[keep]
+
+            distances = np.hypot(*(self.points[i] - self.points[j]).T)
+            keep = distances <= radius
+
+            all_i.append(i[keep])
+            all_j.append(j[keep])
+
+        return _sorted_pairs(np.concatenate(all_i), np.concatenate(all_j))
+
+
+def _str_order(centers, node_size):
+    """Sort-Tile-Recursive order: sort by x into vertical slices, then sort every slice by y."""
+    n = len(centers)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    num_nodes = int(math.ceil(n / node_size))
+    slice_size = node_size * int(math.ceil(math.sqrt(num_nodes)))
+
+    by_x = np.argsort(centers[:, 0], kind='stable')
+    order = []
+    for start in range(0, n, slice_size):
+        slice_indices = by_x[start:start + slice_size]
+        order.append(slice_indices[np.argsort(centers[slice_indices, 1], kind='stable')])
+
+    return np.concatenate(order)
+
+
+def _group(rects, node_size):
+    """Groups consecutive rects into nodes of node_size, returns the node rects and their [start, end) ranges."""
+    starts = np.arange(0, len(rects), node_size)
+    ends = np.minimum(starts + node_size, len(rects))
+
+    node_rects = np.concatenate([
+        np.minimum.reduceat(rects[:, :2], starts, axis=0),
+        np.maximum.reduceat(rects[:, 2:], starts, axis=0)
+    ], axis=1)
+
+    return node_rects, starts, ends
+
+
+def _rect_distance(points, rects):
+    dx = np.maximum(np.maximum(rects[:, 0] - points[:, 0], points[:, 0] - rects[:, 2]), 0)
+    dy = np.maximum(np.maximum(rects[:, 1] - points[:, 1], points[:, 1] - rects[:, 3]), 0)
+    return np.hypot(dx, dy)
+
+
+class RTree(object):
+    """
+    Static R-tree bulk loaded with the Sort-Tile-Recursive algorithm. Items are either (N, 2) points or
+    (N, 4) [xmin, ymin, xmax, ymax] rectangles, and distances are measured from the query point to the
+    closest point of every item.
+
+    Queries traverse the tree one level at a time for all the query points at once, so that every level costs
+    a handful of vectorized operations.
+    """
+
+    def __init__(self, items, leaf_size=16):
+        assert leaf_size > 1, 'Leaf size must be greater than one.'
+
+        items = np.asarray(items, dtype=np.float64)
+        if items.size == 0:
+            items = items.reshape(0, 2)
+        if items.shape[-1] == 2:
+            items = np.concatenate([items, items], axis=1)
+
+        self.items = items
+        self.leaf_size = leaf_size
+
+        self._order = _str_order((items[:, :2] + items[:, 2:]) / 2, leaf_size)
+        self._rects = items[self._order]
+
+        # Every level holds its node rects and the [start, end) ranges of their children in the level below
+        # (or in self._rects for the leaves). self._levels[-1] is the root level.
+        self._levels = []
+
+        rects = self._rects
+        while len(self._levels) == 0 or len(rects) > 1:
+            if len(rects) == 0:
+                break
+
+            node_rects, starts, ends = _group(rects, leaf_size)
+
+            if len(node_rects) > 1:
+                order = _str_order((node_rects[:, :2] + node_rects[:, 2:]) / 2, leaf_size)
+                node_rects, starts, ends = node_rects[order], starts[order], ends[order]
+
+            self._levels.append((node_rects, starts, ends))
+            rects = node_rects
+
+    def __len__(self):
+        return len(self.items)
+
+    def query_radius_many(self, points, radius):
+        """
+        Returns (query_indices, item_indices), the pairs of query points and items within radius of each
+        other.
+        """
+        points = _as_points(points)
+
+        if len(self._levels) == 0 or len(points) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        root_rects, _, _ = self._levels[-1]
+        queries = np.repeat(np.arange(len(points)), len(root_rects))
+        nodes = np.tile(np.arange(len(root_rects)), len(points))
+
+        for node_rects, starts, ends in reversed(self._levels):
+            keep = _rect_distance(points[queries], node_rects[nodes]) <= radius
+            queries, nodes = queries[keep], nodes[keep]
+
+            rows, nodes = _expand_ranges(starts[nodes], ends[nodes])
+            queries = queries[rows]
+
+        keep = _rect_distance(points[queries], self._rects[nodes]) <= radius
+
+        return queries[keep], self._order[nodes[keep]]
+
+    def query_radius(self, point, radius):
+        """Returns the sorted indices of the items within radius of point."""
+        _, indices = self.query_radius_many(np.reshape(point, (1, 2)), radius)
+        return np.sort(indices)
+
+    def query_knn(self, point, k):
+        """Returns the indices of the k nearest items to point and their distances, sorted by distance."""
+        if len(self._levels) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        point = np.reshape(np.asarray(point, dtype=np.float64), (1, 2))
+        top = len(self._levels) - 1
+
+        # Best-first search: entries are (distance, level, index), level -1 being the items
+        root_rects, _, _ = self._levels[top]
+        heap = [(d, top, i) for i, d in enumerate(_rect_distance(point, root_rects).tolist())]
+        heapq.heapify(heap)
+
+        indices, distances = [], []
+        while heap and len(indices) < k:
+            distance, level, index = heapq.heappop(heap)
+
+            if level < 0:
+                indices.append(self._order[index])
+                distances.append(distance)
+                continue
+
+            _, starts, ends = self._levels[level]
+            children = np.arange(starts[index], ends[index])
+            child_rects = self._levels[level - 1][0][children] if level > 0 else self._rects[children]
+
+            for child, child_distance in zip(children.tolist(), _rect_distance(point, child_rects).tolist()):
+                heapq.heappush(heap, (child_distance, level - 1, child))
+
+        return np.asarray(indices, dtype=np.intp), np.asarray(distances)
+
+    def query_pairs(self, radius):
+        """
+        Returns the (P, 2) array of the index pairs (i, j), i < j, of the items within radius of each other.
+        Only meaningful when the tree has been built from points.
+        """
+        centers = (self.items[:, :2] + self.items[:, 2:]) / 2
+        i, j = self.query_radius_many(centers, radius)
+
+        keep = j > i
+        return _sorted_pairs(i[keep], j[keep])
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+
+from .nms import non_max_suppression
+from ..utils import memoize
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+
+    # Fewest tiles covering the axis with at least overlap pixels in common, spread evenly
+    num_tiles = math.ceil((length - overlap) / (tile - overlap))
+    return np.linspace(0, length - tile, num_tiles).round().astype(int).tolist()
+
+
+@memoize
+def tile_layout(width, height, tile_width, tile_height, overlap=0):
+    """
+    Returns the (T, 4) array of the [xmin, ymin, xmax, ymax] pixel rects of the tiles of a width x height
+    frame. All the tiles have the same size (clipped to the frame) and neighbouring tiles overlap by at least
+    overlap pixels, so that objects up to overlap pixels wide are entirely visible in at least one tile.
+
+    Layouts are cached per resolution, the returned array is read-only.
+    """
+    tile_width, tile_height = min(tile_width, width), min(tile_height, height)
+    assert overlap < min(tile_width, tile_height), 'Overlap must be smaller than the tiles.'
+
+    xs = _tile_starts(width, tile_width, overlap)
+    ys = _tile_starts(height, tile_height, overlap)
+
+    x0, y0 = np.meshgrid(xs, ys)
+    x0, y0 = x0.ravel(), y0.ravel()
+
+    layout = np.stack([x0, y0, x0 + tile_width, y0 + tile_height], axis=1)
+    layout.flags.writeable = False
+
+    return layout
+
+
+def merge_tiles(boxes, scores, classes, tiles, iou_threshold=0.5, class_agnostic=False):
+    """
+    Maps the detections of every tile (lists of (N_t, 4) [xmin, ymin, xmax, ymax] boxes in tile pixels, with
+    their scores and classes) back to frame pixels and removes the duplicates found in overlapping tiles with
+    NMS. Returns the (boxes, scores, classes) arrays of the frame.
+    """
+    offsets = np.repeat(np.asarray(tiles)[:, :2], [len(b) for b in boxes], axis=0)
+
+    boxes = np.concatenate([np.reshape(b, (-1, 4)) for b in boxes]) + np.tile(offsets, 2)
+    scores = np.concatenate(scores)
+    classes = np.concatenate(classes)
+
+    if len(boxes) == 0:
+        return boxes, scores, classes
+
+    selected = non_max_suppression(
+        boxes,
+        scores,
+        classes=None if class_agnostic else classes,
+        iou_threshold=iou_threshold
+    )
+
+    return boxes[selected], scores[selected], classes[selected]
@@ -0,0 +1,241 @@
+import numpy as np
+
+from .boundingbox import BoxMode
+from .boxarray import BoxArray
+from .geometry import as_xyxy_array, iou
+
+MATCHING_METHODS = [
+    'hungarian',
+    'greedy'
+]
+
+# Constant velocity model over [cx, cy, s, r, vcx, vcy, vs], where s is the area and r the aspect ratio of the
+# box, from SORT (Bewley et al., 2016, https://github.com/abewley/sort)
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1
+
+_H = np.eye(4, 7)
+
+_Q = np.diag([1, 1, 1, 1, .01, .01, .0001])
+_R = np.diag([1, 1, 10, 10])
+_P0 = np.diag([10, 10, 10, 10, 10000, 10000, 10000])
+
+
+def _xyxy_to_z(boxes):
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-9)], axis=1)
+
+
+def _x_to_xyxy(x):
+    s = np.maximum(x[:, 2], 0)
+    w = np.sqrt(s * np.maximum(x[:, 3], 0))
+    h = np.divide(s, w, out=np.zeros_like(s), where=w > 0)
+    return np.stack([x[:, 0] - w / 2, x[:, 1] - h / 2, x[:, 0] + w / 2, x[:, 1] + h / 2], axis=1)
+
+
+def greedy_matching(cost):
+    """Matches rows and columns by increasing cost, returns the (K, 2) array of matched (row, column) pairs."""
+    if cost.size == 0:
+        return np.empty((0, 2), dtype=np.intp)
+
+    rows, cols = np.unravel_index(np.argsort(cost, axis=None, kind='stable'), cost.shape)
+    used_rows = np.zeros(cost.shape[0], dtype=np.bool_)
+    used_cols = np.zeros(cost.shape[1], dtype=np.bool_)
+
+    matches = []
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if not used_rows[row] and not used_cols[col]:
+            used_rows[row] = used_cols[col] = True
+            matches.append((row, col))
+            if len(matches) == min(cost.shape):
+                break
+
+    return np.asarray(matches, dtype=np.intp).reshape(-1, 2)
+
+
+def hungarian_matching(cost):
+    """Optimal matching of rows and columns, falls back to greedy_matching if SciPy is not installed."""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return greedy_matching(cost)
+
+    rows, cols = linear_sum_assignment(cost)
+    return np.stack([rows, cols], axis=1).astype(np.intp)
+
+
+class Tracks(object):
+
+    def __init__(self, boxes, ids, classes=None, scores=None):
+        self.boxes = boxes
+        """BoxArray of the tracked boxes, in XYXY mode."""
+        self.ids = ids
+        self.classes = classes
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f'Tracks(ids={self.ids.tolist()}, boxes={self.boxes})'
+
+
+class Tracker(object):
+    """
+    SORT multi-object tracker. Every track is a Kalman filter over the box centre, area and aspect ratio; the
+    filters of all tracks are predicted and updated at once as stacked arrays.
+
+    update() must be called with the detections of a frame, extrapolate() on the frames without detections
+    (e.g. when the detector only runs every k frames): it moves the tracks forward without aging them.
+    """
+
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, matching='hungarian', mode=BoxMode.XYXY):
+        assert matching in MATCHING_METHODS, f'Unknown matching method: \'{matching}\''
+
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.matching = hungarian_matching if matching == 'hungarian' else greedy_matching
+        self.mode = mode
+
+        self.frame_count = 0
+        self._next_id = 1
+
+        self._x = np.empty((0, 7))
+        self._P = np.empty((0, 7, 7))
+        self._ids = np.empty(0, dtype=np.int64)
+        self._classes = np.empty(0, dtype=np.int64)
+        self._scores = np.empty(0)
+        self._hit_streak = np.empty(0, dtype=np.int64)
+        self._time_since_update = np.empty(0, dtype=np.int64)
+        self._visible = np.empty(0, dtype=np.bool_)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _predict(self):
+        # Do not let the area become negative
+        shrinking = self._x[:, 2] + self._x[:, 6] <= 0
+        self._x[shrinking, 6] = 0
+
+        self._x = self._x @ _F.T
+        self._P = _F @ self._P @ _F.T + _Q
+
+    def _correct(self, indices, z):
+        P = self._P[indices]
+        x = self._x[indices]
+
+        S = P[:, :4, :4] + _R
+        K = P[:, :, :4] @ np.linalg.inv(S)
+
+        residual = z - x[:, :4]
+        self._x[indices] = x + (K @ residual[:, :, None])[:, :, 0]
+        self._P[indices] = (np.eye(7) - K @ _H) @ P
+
+    def _select(self, keep):
+        self._x = self._x[keep]
+        self._P = self._P[keep]
+        self._ids = self._ids[keep]
+        self._classes = self._classes[keep]
+        self._scores = self._scores[keep]
+        self._hit_streak = self._hit_streak[keep]
+        self._time_since_update = self._time_since_update[keep]
+        self._visible = self._visible[keep]
+
+    def _tracks(self, mask):
+        return Tracks(
+            BoxArray(_x_to_xyxy(self._x[mask])),
+            self._ids[mask],
+            classes=self._classes[mask],
+            scores=self._scores[mask]
+        )
+
+    def update(self, boxes, scores=None, classes=None):
+        """Updates the tracks with the detections of a frame, returns the confirmed Tracks of the frame."""
+        boxes = as_xyxy_array(boxes, self.mode) if len(boxes) > 0 else np.empty((0, 4))
+        num_detections = len(boxes)
+        scores = np.ones(num_detections) if scores is None else np.asarray(scores).reshape(-1)
+        classes = np.zeros(num_detections, dtype=np.int64) if classes is None else np.asarray(classes).reshape(-1)
+
+        self.frame_count += 1
+
+        self._predict()
+        self._time_since_update += 1
+
+        # Associate detections to predicted tracks
+        predicted = _x_to_xyxy(self._x)
+        if len(predicted) > 0 and num_detections > 0:
+            overlaps = iou(boxes, predicted)
+            matches = self.matching(-overlaps)
+            matches = matches[overlaps[matches[:, 0], matches[:, 1]] >= self.iou_threshold]
+        else:
+            matches = np.empty((0, 2), dtype=np.intp)
+
+        detection_indices, track_indices = matches[:, 0], matches[:, 1]
+
+        self._correct(track_indices, _xyxy_to_z(boxes[detection_indices]))
+        self._classes[track_indices] = classes[detection_indices]
+        self._scores[track_indices] = scores[detection_indices]
+        self._hit_streak[track_indices] += 1
+        self._time_since_update[track_indices] = 0
+
+        # Tracks that were not matched in this frame start counting hits from scratch
+        self._hit_streak[self._time_since_update > 0] = 0
+
+        # Create a new track for every unmatched detection
+        unmatched = np.setdiff1d(np.arange(num_detections), detection_indices)
+        num_new = len(unmatched)
+
+        new_x = np.zeros((num_new, 7))
+        new_x[:, :4] = _xyxy_to_z(boxes[unmatched])
+
+        self._x = np.concatenate([self._x, new_x])
+        self._P = np.concatenate([self._P, np.broadcast_to(_P0, (num_new, 7, 7))])
+        self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + num_new)])
+        self._classes = np.concatenate([self._classes, classes[unmatched]])
+        self._scores = np.concatenate([self._scores, scores[unmatched]])
+        self._hit_streak = np.concatenate([self._hit_streak, np.ones(num_new, dtype=np.int64)])
+        self._time_since_update = np.concatenate([self._time_since_update, np.zeros(num_new, dtype=np.int64)])
+        self._visible = np.concatenate([self._visible, np.zeros(num_new, dtype=np.bool_)])
+        self._next_id += num_new
+
+        # Remove dead tracks
+        self._select(self._time_since_update <= self.max_age)
+
+        self._visible = (self._time_since_update == 0) & \
+                        ((self._hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+
+        return self._tracks(self._visible)
+
+    def extrapolate(self):
+        """Moves the tracks forward by one frame without detections, returns the Tracks visible at the last update."""
+        if len(self) > 0:
+            self._predict()
+        return self._tracks(self._visible)
+
+
+class StridedTracker(object):
+    """
+    Runs detect (frame -> (boxes, scores, classes)) every stride frames only, and extrapolates the tracks of
+    tracker on the frames in between. Calling it with a frame returns the Tracks of that frame.
+    """
+
+    def __init__(self, detect, stride=1, tracker=None):
+        assert stride >= 1
+
+        self.detect = detect
+        self.stride = stride
+        self.tracker = tracker if tracker is not None else Tracker()
+
+        self.frame_index = 0
+
+    def __call__(self, frame):
+        if self.frame_index % self.stride == 0:
+            boxes, scores, classes = self.detect(frame)
+            tracks = self.tracker.update(boxes, scores=scores, classes=classes)
+        else:
+            tracks = self.tracker.extrapolate()
+
+        self.frame_index += 1
+        return tracks
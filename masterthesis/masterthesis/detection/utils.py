@@ -1,8 +1,10 @@
 import math
 from collections import namedtuple
-from itertools import islice
+
+import numpy as np
 
 from .boundingbox import BoxMode, BoundingBox
+from .boxarray import BoxArray
 
 Point = namedtuple('Point', ['x', 'y'])
 
@@ -20,9 +22,6 @@ def ellipse_to_bbox(center, radius, angle, mode=BoxMode.XYXY, relative=None, abs
     u = polar_to_cartesian(radius.x, angle)
     v = polar_to_cartesian(radius.y, angle + math.pi / 2)
 
-    print(u)
-    print(v)
-
     translation = Point(
         math.sqrt(u.x * u.x + v.x * v.x),
         math.sqrt(u.y * u.y + v.y * v.y)
@@ -40,21 +39,70 @@ def ellipse_to_bbox(center, radius, angle, mode=BoxMode.XYXY, relative=None, abs
     ).to(mode)
 
 
+def ellipses_to_bboxes(ellipses, mode=BoxMode.XYXY, relative=None, absolute=None):
+    """
+    Vectorized ellipse_to_bbox. ellipses is an (N, 5) array whose rows are
+    [major_axis_radius, minor_axis_radius, angle, center_x, center_y], as in FDDB annotations.
+    """
+    ellipses = np.asarray(ellipses, dtype=np.float64).reshape(-1, 5)
+    radius_x, radius_y, angle, center_x, center_y = ellipses.T
+
+    cos, sin = np.cos(angle), np.sin(angle)
+
+    # u = radius_x * (cos, sin), v = radius_y * (cos, sin) rotated by 90 degrees = radius_y * (-sin, cos)
+    translation_x = np.hypot(radius_x * cos, radius_y * sin)
+    translation_y = np.hypot(radius_x * sin, radius_y * cos)
+
+    return BoxArray(
+        np.stack([
+            center_x - translation_x,
+            center_y - translation_y,
+            center_x + translation_x,
+            center_y + translation_y
+        ], axis=1),
+        relative=relative,
+        absolute=absolute
+    ).to(mode)
+
+
 def mask_to_bbox(mask, mode=BoxMode.XYXY, relative=None, absolute=None):
-    xmin, ymin, xmax, ymax = mask[0][0], mask[0][1], mask[0][0], mask[0][1]
-
-    for x, y in islice(mask, 1, None):
-        if x < xmin:
-            xmin = x
-        elif x > xmax:
-            xmax = x
-        if y < ymin:
-            ymin = y
-        elif y > ymax:
-            ymax = y
+    xs = [x for x, _ in mask]
+    ys = [y for _, y in mask]
 
     return BoundingBox(
-        [xmin, ymin, xmax, ymax],
+        [min(xs), min(ys), max(xs), max(ys)],
+        relative=relative,
+        absolute=absolute
+    ).to(mode)
+
+
+def masks_to_bboxes(masks, lengths=None, mode=BoxMode.XYXY, relative=None, absolute=None):
+    """
+    Vectorized mask_to_bbox. masks is either a sequence of (K_i, 2) point arrays or, if lengths is given, a
+    single (sum(K_i), 2) array with the points of all masks, lengths being the number of points K_i of each
+    mask. Every mask must have at least one point.
+    """
+    if lengths is None:
+        lengths = [len(mask) for mask in masks]
+        points = np.concatenate([np.asarray(mask, dtype=np.float64).reshape(-1, 2) for mask in masks]) \
+            if len(masks) > 0 else np.empty((0, 2))
+    else:
+        points = np.asarray(masks, dtype=np.float64).reshape(-1, 2)
+
+    lengths = np.asarray(lengths, dtype=np.intp)
+    assert np.all(lengths > 0), 'Every mask must have at least one point.'
+    assert lengths.sum() == len(points), 'The number of points differs from the sum of the mask lengths.'
+
+    if len(lengths) == 0:
+        return BoxArray(np.empty((0, 4)), relative=relative, absolute=absolute).to(mode)
+
+    starts = np.cumsum(lengths) - lengths
+
+    return BoxArray(
+        np.concatenate([
+            np.minimum.reduceat(points, starts, axis=0),
+            np.maximum.reduceat(points, starts, axis=0)
+        ], axis=1),
         relative=relative,
         absolute=absolute
     ).to(mode)
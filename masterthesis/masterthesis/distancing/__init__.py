@@ -0,0 +1,9 @@
+from .engine import DistancingEngine, Violations, connected_components
+from .homography import Homography
+
+__all__ = [
+    'DistancingEngine',
+    'Homography',
+    'Violations',
+    'connected_components'
+]
@@ -0,0 +1,187 @@
+import numpy as np
+
+from .homography import Homography
+from ..detection.boundingbox import BoxMode
+from ..detection.spatial import GridIndex, RTree, foot_points
+
+DEFAULT_MIN_DISTANCE = 2.0
+DEFAULT_SKIN = 0.5
+
+
+def connected_components(num_nodes, pairs):
+    """Labels every node with the smallest node index of its connected component."""
+    labels = np.arange(num_nodes)
+    if len(pairs) == 0:
+        return labels
+
+    i, j = pairs[:, 0], pairs[:, 1]
+    while True:
+        previous = labels.copy()
+
+        smallest = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, i, smallest)
+        np.minimum.at(labels, j, smallest)
+
+        # Pointer jumping
+        labels = labels[labels]
+
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class Violations(object):
+
+    def __init__(self, points, pairs, distances, ids=None, started=None, ended=None):
+        self.points = points
+        """(N, 2) ground plane foot points of the people in the frame."""
+        self.pairs = pairs
+        """(P, 2) indices of the pairs of people closer than the minimum distance."""
+        self.distances = distances
+        """(P,) ground plane distances of pairs."""
+        self.ids = ids
+        self.started = started if started is not None else set()
+        """Pairs of ids that started violating the minimum distance in this frame (only if ids are given)."""
+        self.ended = ended if ended is not None else set()
+        """Pairs of ids that stopped violating the minimum distance in this frame (only if ids are given)."""
+
+        self._labels = None
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @property
+    def violating(self):
+        """Boolean mask of the people violating the minimum distance."""
+        mask = np.zeros(len(self.points), dtype=np.bool_)
+        mask[self.pairs.ravel()] = True
+        return mask
+
+    @property
+    def labels(self):
+        """Cluster label of every person: people transitively too close to each other share the same label."""
+        if self._labels is None:
+            self._labels = connected_components(len(self.points), self.pairs)
+        return self._labels
+
+    @property
+    def clusters(self):
+        """List of the index arrays of the clusters with at least two people."""
+        labels = self.labels
+        roots, counts = np.unique(labels, return_counts=True)
+        return [np.flatnonzero(labels == root) for root in roots[counts > 1]]
+
+
+class DistancingEngine(object):
+    """
+    Finds the people closer than min_distance on the ground plane, frame after frame.
+
+    All pairs closer than min_distance + skin are kept in a neighbour list (Verlet list), built with a uniform
+    grid. As long as nobody moved more than skin / 2 since the list was built, every pair closer than
+    min_distance is guaranteed to be in it, so that only its pairs have to be checked in the following
+    frames. People are matched across frames by id when ids (e.g. from a tracker) are given, or else by
+    proximity to the points the list was built from.
+    """
+
+    def __init__(self, homography=None, min_distance=DEFAULT_MIN_DISTANCE, skin=DEFAULT_SKIN, mode=BoxMode.XYXY):
+        assert min_distance > 0 and skin >= 0
+
+        self.homography = homography if homography is not None else Homography(np.eye(3))
+        self.min_distance = min_distance
+        self.skin = skin
+        self.mode = mode
+
+        self.num_frames = 0
+        self.num_rebuilds = 0
+
+        self._reference_points = None
+        self._reference_ids = None
+        self._reference_tree = None
+        self._candidates = None
+        self._violating_ids = set()
+
+    def reset(self):
+        self._reference_points = None
+        self._reference_ids = None
+        self._reference_tree = None
+        self._candidates = None
+        self._violating_ids = set()
+
+    def _rebuild(self, points, ids):
+        cutoff = self.min_distance + self.skin
+
+        self._reference_points = points
+        self._reference_ids = ids
+        self._reference_tree = RTree(points) if ids is None else None
+        self._candidates = GridIndex(points, cutoff).query_pairs(cutoff)
+
+        self.num_rebuilds += 1
+
+    def _match(self, points, ids):
+        """Index of the reference point of every point, or None if the neighbour list must be rebuilt."""
+        if self._reference_points is None or len(points) == 0:
+            return None
+
+        if ids is not None:
+            if self._reference_ids is None:
+                return None
+
+            reference_index = {id_: index for index, id_ in enumerate(self._reference_ids.tolist())}
+            matches = np.asarray([reference_index.get(id_, -1) for id_ in ids.tolist()], dtype=np.intp)
+            if np.any(matches < 0):
+                return None
+        else:
+            if self._reference_tree is None:
+                return None
+
+            queries, references = self._reference_tree.query_radius_many(points, self.skin / 2)
+
+            # Every point must match exactly one reference point, and vice versa
+            if len(queries) != len(points) or len(np.unique(queries)) != len(points) or \
+                    len(np.unique(references)) != len(references):
+                return None
+
+            matches = np.empty(len(points), dtype=np.intp)
+            matches[queries] = references
+
+        displacements = np.hypot(*(points - self._reference_points[matches]).T)
+        if np.any(displacements > self.skin / 2):
+            return None
+
+        return matches
+
+    def update(self, boxes, ids=None):
+        """Returns the Violations of the people in boxes, the person detections of the current frame."""
+        points = self.homography.project(foot_points(boxes, self.mode))
+        if ids is not None:
+            ids = np.asarray(ids).reshape(-1)
+            assert len(ids) == len(points), 'There must be one id per bounding box.'
+
+        self.num_frames += 1
+
+        matches = self._match(points, ids)
+        if matches is None:
+            self._rebuild(points, ids)
+            candidates = self._candidates
+        else:
+            current = np.full(len(self._reference_points), -1, dtype=np.intp)
+            current[matches] = np.arange(len(points))
+
+            candidates = np.sort(current[self._candidates], axis=1)
+            candidates = candidates[candidates[:, 0] >= 0]
+
+        if len(candidates) > 0:
+            i, j = candidates[:, 0], candidates[:, 1]
+            distances = np.hypot(*(points[i] - points[j]).T)
+            close = distances < self.min_distance
+            pairs, distances = candidates[close], distances[close]
+        else:
+            pairs, distances = np.empty((0, 2), dtype=np.intp), np.empty(0)
+
+        started, ended = set(), set()
+        if ids is not None:
+            violating_ids = {tuple(sorted(pair)) for pair in ids[pairs].tolist()}
+            started = violating_ids - self._violating_ids
+            ended = self._violating_ids - violating_ids
+            self._violating_ids = violating_ids
+
+        return Violations(points, pairs, distances, ids=ids, started=started, ended=ended)
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+
+
+def _fit_homography(src, dst):
+    # Direct linear transform, from https://en.wikipedia.org/wiki/Direct_linear_transformation
+    rows = []
+    for (x, y), (u, v) in zip(src, dst):
+        rows.append([-x, -y, -1, 0, 0, 0, u * x, u * y, u])
+        rows.append([0, 0, 0, -x, -y, -1, v * x, v * y, v])
+
+    _, _, vh = np.linalg.svd(np.asarray(rows, dtype=np.float64))
+    matrix = vh[-1].reshape(3, 3)
+
+    return matrix / matrix[2, 2]
+
+
+class Homography(object):
+    """
+    Projective transform from image pixels to ground plane coordinates (e.g. metres), used to measure real
+    distances between people from their foot points.
+    """
+
+    @staticmethod
+    def from_points(image_points, world_points):
+        """Fits the homography mapping at least 4 image points to the corresponding ground plane points."""
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+        world_points = np.asarray(world_points, dtype=np.float64).reshape(-1, 2)
+
+        assert len(image_points) == len(world_points), 'Image and world points must have the same length.'
+        assert len(image_points) >= 4, 'At least 4 point correspondences are required.'
+
+        return Homography(_fit_homography(image_points, world_points))
+
+    @staticmethod
+    def from_scale(pixels_per_unit):
+        """Homography of a top-down camera, where distances only need to be scaled."""
+        return Homography(np.diag([1 / pixels_per_unit, 1 / pixels_per_unit, 1]))
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a homography from a JSON file containing either a 3x3 "matrix" or lists of "image_points" and
+        "world_points".
+        """
+        with open(path, 'r') as f:
+            config = json.load(f)
+
+        if 'matrix' in config:
+            return Homography(config['matrix'])
+        return Homography.from_points(config['image_points'], config['world_points'])
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(3, 3)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'matrix': self.matrix.tolist()}, f, indent=2)
+            f.write('\n')
+
+    def project(self, points):
+        """Projects (N, 2) image points to (N, 2) ground plane points."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        projected = points @ self.matrix[:, :2].T + self.matrix[:, 2]
+        return projected[:, :2] / projected[:, 2:]
+
+    def inverse(self):
+        return Homography(np.linalg.inv(self.matrix))
+
+    def __repr__(self):
+        return f'Homography({self.matrix.tolist()})'
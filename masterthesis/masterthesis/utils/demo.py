@@ -1,20 +1,36 @@
+import queue
+import threading
 import time
 
 import cv2
 
 from . import FpsCounter, TimeIt
+from .profiler import Profiler
 
+DROP_POLICIES = [
+    'block',
+    'drop-oldest'
+]
+
+
+def _open_writer(cap, output_path):
+    height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    return cv2.VideoWriter(output_path, int(fourcc), int(fps), (int(width), int(height)))
+
+
+def run_on_video(video_path, run_on_image, output_path=None, profiler=None):
+    """If profiler is given, the read, image and write spans of every frame are recorded in it."""
+    if profiler is None:
+        profiler = Profiler(enabled=False)
 
-def run_on_video(video_path, run_on_image, output_path=None):
     cap = cv2.VideoCapture(video_path)
 
     writer = None
     if output_path:
-        height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        writer = cv2.VideoWriter(output_path, int(fourcc), int(fps), (int(width), int(height)))
+        writer = _open_writer(cap, output_path)
 
     with FpsCounter() as counter:
         start_time = time.time()
@@ -22,15 +38,18 @@ def run_on_video(video_path, run_on_image, output_path=None):
 
         while cap.isOpened():
             # Capture frame-by-frame
-            grabbed, frame = cap.read()
+            with profiler.span('read'):
+                grabbed, frame = cap.read()
 
             if not grabbed:
                 break
 
-            out_img = run_on_image(frame)
+            with profiler.span('image'):
+                out_img = run_on_image(frame)
 
             if writer:
-                writer.write(out_img)
+                with profiler.span('write'):
+                    writer.write(out_img)
 
             total_frames += 1
 
@@ -48,3 +67,231 @@ def run_on_video(video_path, run_on_image, output_path=None):
     print()
     print(f'Ran inference on {total_frames} frames in {TimeIt.format_elapsed(elapsed_time)}.')
     print(f'Average FPS: {total_frames / elapsed_time:.2f}')
+
+
+def run_on_video_batched(video_path, run_on_batch, batch_size, output_path=None, profiler=None):
+    """
+    Same as run_on_video, but frames are collected in batches of batch_size (the last one may be smaller)
+    and run_on_batch is called with the list of frames of a batch. It must return the list of the output
+    frames, in the same order.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    cap = cv2.VideoCapture(video_path)
+
+    writer = None
+    if output_path:
+        writer = _open_writer(cap, output_path)
+
+    with FpsCounter() as counter:
+        start_time = time.time()
+        total_frames = 0
+
+        grabbed = True
+        while grabbed and cap.isOpened():
+            frames = []
+            while len(frames) < batch_size:
+                with profiler.span('read'):
+                    grabbed, frame = cap.read()
+
+                if not grabbed:
+                    break
+
+                frames.append(frame)
+
+            if not frames:
+                break
+
+            with profiler.span('batch'):
+                out_imgs = run_on_batch(frames)
+
+            assert len(out_imgs) == len(frames)
+
+            for out_img in out_imgs:
+                if writer:
+                    with profiler.span('write'):
+                        writer.write(out_img)
+
+                total_frames += 1
+
+                fps = counter.update()
+                if fps:
+                    print(f'Inference is running at {fps:.2f} FPS')
+
+        elapsed_time = time.time() - start_time
+
+    cap.release()
+    if writer:
+        writer.release()
+
+    print()
+    print(f'Ran inference on {total_frames} frames in {TimeIt.format_elapsed(elapsed_time)}.')
+    print(f'Average FPS: {total_frames / elapsed_time:.2f}')
+
+
+# Marks the end of the stream in the queues of the pipeline
+_END = object()
+
+
+class _Stage(threading.Thread):
+
+    def __init__(self, target, name):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self.error = None
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            self._target_fn()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+
+def _put(q, item, policy, *stop):
+    """
+    Puts item in q according to policy, returns the number of items that have been dropped to make room.
+    A blocking put gives up as soon as one of the stop events is set.
+    """
+    if policy == 'drop-oldest':
+        dropped = 0
+        while True:
+            try:
+                q.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    pass
+
+    # Wake up every now and then, so that the stage does not block forever when the pipeline is stopped
+    while not any(event.is_set() for event in stop):
+        try:
+            q.put(item, timeout=0.1)
+            return 0
+        except queue.Full:
+            pass
+
+    return 0
+
+
+def run_on_video_pipelined(
+        video_path,
+        run_on_image,
+        output_path=None,
+        read_queue_size=8,
+        write_queue_size=8,
+        drop_policy='block',
+        profiler=None
+):
+    """
+    Same as run_on_video, but frames are decoded by a reader thread and encoded by a writer thread, connected
+    to the inference stage (running on the calling thread) by bounded queues, so that I/O overlaps with
+    compute.
+
+    drop_policy is applied to the queue of the decoded frames: 'block' (offline processing) makes the reader
+    wait for the inference stage, 'drop-oldest' (live streams) discards the stalest frame when the queue is
+    full. Annotated frames are never dropped.
+
+    The read, image and write spans of every frame are recorded in profiler (a new one if not given) and
+    printed at the end.
+    """
+    assert drop_policy in DROP_POLICIES, f'Unknown drop policy: \'{drop_policy}\''
+
+    cap = cv2.VideoCapture(video_path)
+    writer = _open_writer(cap, output_path) if output_path else None
+
+    if profiler is None:
+        profiler = Profiler()
+
+    read_queue = queue.Queue(maxsize=read_queue_size)
+    write_queue = queue.Queue(maxsize=write_queue_size)
+    stop = threading.Event()
+
+    dropped_frames = 0
+
+    def read():
+        nonlocal dropped_frames
+        try:
+            while cap.isOpened() and not stop.is_set():
+                with profiler.span('read'):
+                    grabbed, frame = cap.read()
+                if not grabbed:
+                    break
+
+                dropped_frames += _put(read_queue, frame, drop_policy, stop)
+        finally:
+            _put(read_queue, _END, 'block', stop)
+
+    def write():
+        while True:
+            out_img = write_queue.get()
+            if out_img is _END:
+                break
+
+            with profiler.span('write'):
+                writer.write(out_img)
+
+    reader = _Stage(read, 'reader')
+    stages = [reader]
+    if writer:
+        stages.append(_Stage(write, 'writer'))
+
+    with FpsCounter() as counter:
+        start_time = time.time()
+        total_frames = 0
+
+        for stage in stages:
+            stage.start()
+
+        try:
+            while True:
+                frame = read_queue.get()
+                if frame is _END:
+                    break
+
+                with profiler.span('image'):
+                    out_img = run_on_image(frame)
+
+                if writer:
+                    # Stop as soon as the writer fails instead of waiting for it to make room forever
+                    _put(write_queue, out_img, 'block', stop, stages[-1].finished)
+                    if stages[-1].finished.is_set():
+                        break
+
+                total_frames += 1
+
+                fps = counter.update()
+                if fps:
+                    print(f'Inference is running at {fps:.2f} FPS')
+        finally:
+            # Let the reader stop early if inference failed, and the writer flush the remaining frames
+            stop.set()
+            if writer:
+                _put(write_queue, _END, 'block', stages[-1].finished)
+
+            for stage in stages:
+                stage.join()
+
+        elapsed_time = time.time() - start_time
+
+    cap.release()
+    if writer:
+        writer.release()
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+
+    print()
+    print(f'Ran inference on {total_frames} frames in {TimeIt.format_elapsed(elapsed_time)}.')
+    print(f'Average FPS: {total_frames / elapsed_time:.2f}')
+    if dropped_frames:
+        print(f'Dropped frames: {dropped_frames}')
+    print()
+    profiler.print_statistics()
@@ -0,0 +1,113 @@
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_MOTION_THRESHOLD = 0.005
+"""Fraction of the pixels of the downsampled frame that must change for inference to run."""
+
+DEFAULT_PIXEL_THRESHOLD = 15
+"""Minimum absolute difference (0-255) for a downsampled pixel to be considered changed."""
+
+DEFAULT_MAX_SKIP = 10
+
+DEFAULT_MOTION_SIZE = (64, 36)
+
+
+class MotionGate(object):
+    """
+    Wraps fn (e.g. a detector, from a frame to its detections) so that it only runs when the frame differs
+    enough from the last frame fn has run on, and the last result is reused otherwise. Frames are compared on
+    a small grayscale thumbnail, so that the gate costs a tiny fraction of fn.
+
+    fn runs at least every max_skip + 1 frames, whatever the motion.
+    """
+
+    def __init__(
+            self,
+            fn,
+            threshold=DEFAULT_MOTION_THRESHOLD,
+            pixel_threshold=DEFAULT_PIXEL_THRESHOLD,
+            max_skip=DEFAULT_MAX_SKIP,
+            size=DEFAULT_MOTION_SIZE
+    ):
+        self.fn = fn
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_skip = max_skip
+        self.size = size
+
+        self._reference = None
+        self._result = None
+        self._skipped = 0
+
+        self.num_frames = 0
+        self.num_skipped = 0
+        self.fn_time = 0
+        self.gate_time = 0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def motion(self, thumbnail):
+        """Fraction of the pixels of thumbnail that changed since the last frame fn has run on."""
+        return np.count_nonzero(np.abs(thumbnail - self._reference) > self.pixel_threshold) / thumbnail.size
+
+    def __call__(self, frame):
+        start_time = time.perf_counter()
+
+        thumbnail = self.thumbnail(frame)
+        skip = self._reference is not None and \
+            self._skipped < self.max_skip and \
+            self.motion(thumbnail) < self.threshold
+
+        self.num_frames += 1
+        self.gate_time += time.perf_counter() - start_time
+
+        if skip:
+            self._skipped += 1
+            self.num_skipped += 1
+            return self._result
+
+        start_time = time.perf_counter()
+        self._result = self.fn(frame)
+        self.fn_time += time.perf_counter() - start_time
+
+        self._reference = thumbnail
+        self._skipped = 0
+
+        return self._result
+
+    @property
+    def skipped_fraction(self):
+        return self.num_skipped / self.num_frames if self.num_frames else 0
+
+    @property
+    def speedup(self):
+        """Estimated speedup over running fn on every frame."""
+        num_runs = self.num_frames - self.num_skipped
+        if num_runs == 0 or self.fn_time + self.gate_time == 0:
+            return 1
+        return (self.fn_time / num_runs * self.num_frames) / (self.fn_time + self.gate_time)
+
+    def print_statistics(self):
+        print(f'Skipped {self.num_skipped} of {self.num_frames} frames ({self.skipped_fraction * 100:.2f}%), '
+              f'estimated speedup: {self.speedup:.2f}x')
+
+
+def motion_gated(detect, draw, **kwargs):
+    """
+    Returns a run_on_image function for run_on_video, that draws (draw(frame, detections)) on every frame
+    the detections of detect, gated by a MotionGate built with kwargs. The gate is available as the gate
+    attribute of the returned function.
+    """
+    gate = MotionGate(detect, **kwargs)
+
+    def run_on_image(frame):
+        return draw(frame, gate(frame))
+
+    run_on_image.gate = gate
+    return run_on_image
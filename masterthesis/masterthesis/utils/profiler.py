@@ -0,0 +1,173 @@
+import csv
+import functools
+import json
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CAPACITY = 4096
+"""Number of latest samples kept by every span of a Profiler."""
+
+PERCENTILES = [50, 95, 99]
+
+
+class _Span(object):
+    """Fixed-memory ring buffer of the latest durations (in nanoseconds) of a span, plus running totals."""
+
+    def __init__(self, capacity):
+        self.samples = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+        self.total_ns = 0
+
+    def add(self, elapsed_ns):
+        self.samples[self.count % len(self.samples)] = elapsed_ns
+        self.count += 1
+        self.total_ns += elapsed_ns
+
+    def latest(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+
+class _SpanContext(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start_ns = None
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        stack.append(self.name if not stack else f'{stack[-1]}/{self.name}')
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed_ns = time.perf_counter_ns() - self.start_ns
+        self.profiler.record(self.profiler._stack().pop(), elapsed_ns)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class Profiler(object):
+    """
+    Collects the durations of named spans. Spans opened within another span are named after it
+    ('frame/detect'), and every thread has its own stack of open spans, so that the stages of a pipeline
+    running on different threads can share a Profiler.
+
+    >>> profiler = Profiler()
+    >>> with profiler.span('frame'):
+    ...     with profiler.span('detect'):
+    ...         pass
+    >>> @profiler.profile('draw')
+    ... def draw(img): ...
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, enabled=True):
+        self.capacity = capacity
+        self.enabled = enabled
+
+        self._spans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name):
+        return _SpanContext(self, name) if self.enabled else _NULL_CONTEXT
+
+    def profile(self, name=None):
+        """Decorator recording every call of the decorated function as a span (named after it by default)."""
+
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name, elapsed_ns):
+        span = self._spans.get(name)
+        if span is None:
+            with self._lock:
+                span = self._spans.setdefault(name, _Span(self.capacity))
+        span.add(elapsed_ns)
+
+    def reset(self):
+        with self._lock:
+            self._spans = {}
+
+    def __contains__(self, name):
+        return name in self._spans
+
+    def statistics(self):
+        """
+        Returns a dict {span name: statistics}. Latencies are in milliseconds and computed over the latest
+        samples only, throughput is the number of calls per second of time spent in the span.
+        """
+        statistics = {}
+        for name, span in list(self._spans.items()):
+            samples = span.latest() / 1e6
+            statistics[name] = {
+                'count': span.count,
+                'total_ms': span.total_ns / 1e6,
+                'mean_ms': float(np.mean(samples)),
+                **{f'p{p}_ms': float(v) for p, v in zip(PERCENTILES, np.percentile(samples, PERCENTILES))},
+                'max_ms': float(np.max(samples)),
+                'throughput': span.count / (span.total_ns / 1e9) if span.total_ns > 0 else float('inf')
+            }
+        return statistics
+
+    def print_statistics(self):
+        statistics = self.statistics()
+        if not statistics:
+            return
+
+        width = max(len(name) for name in statistics)
+        percentiles = ''.join(f'{f"p{p} (ms)":>10}' for p in PERCENTILES)
+        print(f'{"span":<{width}} {"count":>8}{"mean (ms)":>11}{percentiles}{"FPS":>12}')
+
+        for name, stats in statistics.items():
+            percentiles = ''.join(f'{stats[f"p{p}_ms"]:>10.3f}' for p in PERCENTILES)
+            print(f'{name:<{width}} {stats["count"]:>8}{stats["mean_ms"]:>11.3f}{percentiles}'
+                  f'{stats["throughput"]:>12.2f}')
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.statistics(), f, indent=2)
+
+    def to_csv(self, path):
+        statistics = self.statistics()
+        fieldnames = ['span', *next(iter(statistics.values()), {}).keys()]
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for name, stats in statistics.items():
+                writer.writerow({'span': name, **stats})
+
+    def export(self, path):
+        """Exports the statistics as CSV if path ends with .csv, as JSON otherwise."""
+        if path.lower().endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
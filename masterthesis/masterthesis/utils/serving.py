@@ -0,0 +1,223 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from .profiler import Profiler
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_LATENCY = 0.005
+"""Maximum time (in seconds) a request waits for other requests to be batched with."""
+
+MAX_BODY_SIZE = 32 * 1024 * 1024
+
+
+class MicroBatcher(object):
+    """
+    Groups the items submitted by concurrent coroutines into batches of up to max_batch_size items, waiting
+    at most max_latency seconds after the first item of a batch. run_batch, a blocking function from the list
+    of items of a batch to the list of their results, runs on a single worker thread, so that it never runs
+    concurrently with itself and requests keep queuing (and batching) while it is busy.
+    """
+
+    def __init__(self, run_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_latency=DEFAULT_MAX_LATENCY,
+                 profiler=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.profiler = profiler if profiler is not None else Profiler()
+
+        self.num_batches = 0
+        self.num_items = 0
+
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def queue_size(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter_ns()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            items = [item for item, _, _ in batch]
+
+            start_ns = time.perf_counter_ns()
+            for _, _, submit_ns in batch:
+                self.profiler.record('queue', start_ns - submit_ns)
+
+            try:
+                results = await loop.run_in_executor(self._executor, self.run_batch, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.profiler.record('batch', time.perf_counter_ns() - start_ns)
+
+            self.num_batches += 1
+            self.num_items += len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class Request(object):
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+class Response(object):
+
+    def __init__(self, body=b'', status=HTTPStatus.OK, content_type='text/plain; charset=utf-8'):
+        self.body = body if isinstance(body, bytes) else str(body).encode('utf-8')
+        self.status = HTTPStatus(status)
+        self.content_type = content_type
+
+    @staticmethod
+    def json(obj, status=HTTPStatus.OK):
+        return Response(json.dumps(obj), status, 'application/json')
+
+    def encode(self, keep_alive):
+        head = [
+            f'HTTP/1.1 {self.status.value} {self.status.phrase}',
+            f'Content-Type: {self.content_type}',
+            f'Content-Length: {len(self.body)}',
+            f'Connection: {"keep-alive" if keep_alive else "close"}',
+        ]
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + self.body
+
+
+class HttpServer(object):
+    """
+    Minimal HTTP/1.1 server on asyncio streams, with keep-alive connections and Content-Length bodies only.
+    routes maps (method, path) to a coroutine function from a Request to a Response.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_SIZE:
+            raise ValueError(f'Request body too large: {length} bytes')
+
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), target.split('?', 1)[0], headers, body)
+
+    async def _handle(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return Response('Method not allowed', HTTPStatus.METHOD_NOT_ALLOWED)
+            return Response('Not found', HTTPStatus.NOT_FOUND)
+
+        try:
+            return await handler(request)
+        except ValueError as e:
+            return Response.json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+        except Exception as e:
+            return Response.json({'error': repr(e)}, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(Response('Bad request', HTTPStatus.BAD_REQUEST).encode(keep_alive=False))
+                    break
+
+                if request is None:
+                    break
+
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                response = await self._handle(request)
+
+                writer.write(response.encode(keep_alive))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def prometheus_metrics(counters, profiler, prefix=''):
+    """Renders counters (a dict {name: value}) and the spans of profiler in the Prometheus text format."""
+    lines = []
+    for name, value in counters.items():
+        lines.append(f'{prefix}{name} {value}')
+
+    for span, stats in profiler.statistics().items():
+        name = f'{prefix}{span.replace("/", "_")}_latency_seconds'
+        lines.append(f'# TYPE {name} summary')
+        for p in ['50', '95', '99']:
+            lines.append(f'{name}{{quantile="0.{p}"}} {stats[f"p{p}_ms"] / 1000}')
+        lines.append(f'{name}_sum {stats["total_ms"] / 1000}')
+        lines.append(f'{name}_count {stats["count"]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,315 @@
+import heapq
+import os
+import queue
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from . import FpsCounter, TimeIt
+from .demo import _END, _put, _Stage, _open_writer
+
+SCHEDULING_POLICIES = [
+    'round-robin',
+    'deadline'
+]
+
+# test:<width>x<height>@<fps>[:<num_frames>]
+_TEST_SOURCE_PATTERN = re.compile(r'^test:(\d+)x(\d+)@(\d+(?:\.\d+)?)(?::(\d+))?$')
+
+
+class TestSource(object):
+    """
+    Live test stream producing frames of random noise at fps frames per second, with the same interface as
+    cv2.VideoCapture. It stops after num_frames frames (never if None).
+    """
+
+    def __init__(self, width, height, fps, num_frames=None, seed=0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.num_frames = num_frames
+
+        self._rng = np.random.default_rng(seed)
+        self._count = 0
+        self._next_time = None
+
+    def isOpened(self):
+        return self.num_frames is None or self._count < self.num_frames
+
+    def read(self):
+        if not self.isOpened():
+            return False, None
+
+        # Frames are produced in real time, like a camera would
+        now = time.perf_counter()
+        if self._next_time is None:
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += 1 / self.fps
+
+        self._count += 1
+        return True, self._rng.integers(0, 256, size=(self.height, self.width, 3), dtype=np.uint8)
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FPS: self.fps
+        }.get(prop, 0)
+
+    def release(self):
+        self.num_frames = self._count
+
+
+def is_live_source(source):
+    return source.startswith('test:') or '://' in source
+
+
+def open_source(source):
+    """Opens a video file, a stream URL (e.g. rtsp://...) or a test stream (test:640x480@30[:300])."""
+    match = _TEST_SOURCE_PATTERN.match(source)
+    if match:
+        width, height, fps, num_frames = match.groups()
+        return TestSource(int(width), int(height), float(fps), int(num_frames) if num_frames else None)
+
+    if not is_live_source(source):
+        assert os.path.isfile(source), f'Video file not found: {source}'
+
+    return cv2.VideoCapture(source)
+
+
+class Frame(object):
+    __slots__ = ('stream', 'index', 'image', 'arrival_time', 'deadline')
+
+    def __init__(self, stream, index, image, arrival_time, deadline):
+        self.stream = stream
+        self.index = index
+        self.image = image
+        self.arrival_time = arrival_time
+        self.deadline = deadline
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class Stream(object):
+    """
+    Source read by a reader thread into a bounded queue. drop_policy tells what happens when the queue is
+    full: 'block' stops reading (files), 'drop-oldest' discards the stalest frame (live streams).
+
+    Every frame must be processed within latency_budget seconds from its arrival (1 / FPS of the source by
+    default), which defines its deadline for the deadline-first scheduling.
+    """
+
+    def __init__(self, source, name=None, queue_size=4, drop_policy=None, latency_budget=None, output_path=None):
+        self.source = source
+        self.name = name or os.path.basename(source)
+        self.drop_policy = drop_policy or ('drop-oldest' if is_live_source(source) else 'block')
+
+        self.cap = open_source(source)
+        self.writer = _open_writer(self.cap, output_path) if output_path else None
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.latency_budget = latency_budget or 1 / fps
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.ended = False
+
+        self.read_frames = 0
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.counter = FpsCounter()
+        self.fps = None
+
+        self._head = None
+        self._reader = _Stage(self._read, f'reader-{self.name}')
+
+    def _read(self):
+        try:
+            while self.cap.isOpened() and not self.stop.is_set():
+                grabbed, image = self.cap.read()
+                if not grabbed:
+                    break
+
+                now = time.perf_counter()
+                frame = Frame(self, self.read_frames, image, now, now + self.latency_budget)
+                self.read_frames += 1
+                self.dropped_frames += _put(self.queue, frame, self.drop_policy, self.stop)
+        finally:
+            _put(self.queue, _END, 'block', self.stop)
+
+    def start(self):
+        self.counter.__enter__()
+        self._reader.start()
+
+    def peek(self):
+        """Returns the oldest queued frame without removing it, None if there is none."""
+        if self._head is None and not self.ended:
+            try:
+                head = self.queue.get_nowait()
+            except queue.Empty:
+                return None
+
+            if head is _END:
+                self.ended = True
+            else:
+                self._head = head
+
+        return self._head
+
+    def pop(self):
+        frame = self.peek()
+        self._head = None
+        return frame
+
+    def done(self, out_img):
+        self.processed_frames += 1
+        if self.writer:
+            self.writer.write(out_img)
+
+        fps = self.counter.update()
+        if fps:
+            self.fps = fps
+
+    def close(self):
+        self.stop.set()
+        self._reader.join()
+        self.cap.release()
+        if self.writer:
+            self.writer.release()
+
+        if self._reader.error is not None:
+            raise self._reader.error
+
+
+def _round_robin(streams, batch_size, start):
+    batch = []
+    while len(batch) < batch_size:
+        added = False
+        for i in range(len(streams)):
+            stream = streams[(start + i) % len(streams)]
+            if len(batch) < batch_size and stream.peek() is not None:
+                batch.append(stream.pop())
+                added = True
+        if not added:
+            break
+    return batch
+
+
+def _deadline_first(streams, batch_size):
+    heads = [stream.peek() for stream in streams]
+    heap = [head for head in heads if head is not None]
+    heapq.heapify(heap)
+
+    batch = []
+    while heap and len(batch) < batch_size:
+        frame = heapq.heappop(heap)
+        batch.append(frame.stream.pop())
+
+        head = frame.stream.peek()
+        if head is not None:
+            heapq.heappush(heap, head)
+
+    return batch
+
+
+class MultiStreamRunner(object):
+    """
+    Feeds the frames of many streams into shared batches of up to batch_size frames, runs run_on_batch (a
+    function from a list of frames to the list of the output frames) on them and routes the outputs back
+    to their streams.
+
+    Frames are scheduled either round-robin, so that every stream gets the same share of the model, or
+    deadline-first, so that the frames closest to missing their latency budget go first. A batch is run as
+    soon as it is full or max_wait seconds have passed since its first frame was available.
+    """
+
+    def __init__(self, streams, run_on_batch, batch_size=1, policy='round-robin', max_wait=0.005):
+        assert policy in SCHEDULING_POLICIES, f'Unknown scheduling policy: \'{policy}\''
+
+        self.streams = streams
+        self.run_on_batch = run_on_batch
+        self.batch_size = batch_size
+        self.policy = policy
+        self.max_wait = max_wait
+
+        self.missed_deadlines = 0
+        self._next = 0
+
+    def _schedule(self, streams):
+        if self.policy == 'deadline':
+            return _deadline_first(streams, self.batch_size)
+
+        batch = _round_robin(streams, self.batch_size, self._next)
+        self._next = (self._next + 1) % max(1, len(streams))
+        return batch
+
+    def _collect(self, streams):
+        batch = self._schedule(streams)
+        if not batch:
+            return batch
+
+        wait_until = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size and time.perf_counter() < wait_until:
+            more = self._schedule(streams)
+            if more:
+                batch.extend(more[:self.batch_size - len(batch)])
+            else:
+                time.sleep(self.max_wait / 10)
+
+        return batch
+
+    def run(self, status_interval=1):
+        for stream in self.streams:
+            stream.start()
+
+        start_time = time.time()
+        last_status = start_time
+
+        try:
+            active = list(self.streams)
+            while active:
+                batch = self._collect(active)
+
+                if batch:
+                    out_imgs = self.run_on_batch([frame.image for frame in batch])
+
+                    now = time.perf_counter()
+                    for frame, out_img in zip(batch, out_imgs):
+                        if now > frame.deadline:
+                            self.missed_deadlines += 1
+                        frame.stream.done(out_img)
+                else:
+                    time.sleep(self.max_wait / 10)
+
+                active = [stream for stream in active if not (stream.ended and stream.peek() is None)]
+
+                if status_interval and time.time() - last_status > status_interval:
+                    last_status = time.time()
+                    print(' | '.join(f'{stream.name}: {stream.fps or 0:.2f} FPS' for stream in self.streams))
+        finally:
+            for stream in self.streams:
+                stream.close()
+
+        elapsed_time = time.time() - start_time
+        self.print_summary(elapsed_time)
+
+    def print_summary(self, elapsed_time):
+        total_frames = sum(stream.processed_frames for stream in self.streams)
+
+        print()
+        print(f'Ran inference on {total_frames} frames of {len(self.streams)} streams in '
+              f'{TimeIt.format_elapsed(elapsed_time)}.')
+        print(f'Average FPS: {total_frames / elapsed_time:.2f}, missed deadlines: {self.missed_deadlines}')
+        print()
+
+        width = max(len(stream.name) for stream in self.streams)
+        print(f'{"stream":<{width}} {"read":>8} {"processed":>10} {"dropped":>8} {"FPS":>8}')
+        for stream in self.streams:
+            print(f'{stream.name:<{width}} {stream.read_frames:>8} {stream.processed_frames:>10} '
+                  f'{stream.dropped_frames:>8} {stream.processed_frames / elapsed_time:>8.2f}')
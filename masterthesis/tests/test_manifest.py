@@ -0,0 +1,26 @@
+import os
+
+from masterthesis.datasets.manifest import Manifest
+
+
+def test_resume_after_torn_line(tmp_path):
+    path = os.path.join(str(tmp_path), 'manifest.jsonl')
+
+    manifest = Manifest(path)
+    manifest.put(os.path.join(str(tmp_path), 'a.jpg'), x=1)
+    manifest.close()
+
+    # Interrupted while appending the entry of b.jpg
+    with open(path, 'a') as f:
+        f.write('{"key": "b.jpg", ')
+
+    manifest = Manifest(path)
+    assert list(manifest.entries) == ['a.jpg']
+    manifest.put(os.path.join(str(tmp_path), 'c.jpg'), x=3)
+    # Interrupted again, before compact
+    manifest.close()
+
+    manifest = Manifest(path)
+    assert list(manifest.entries) == ['a.jpg', 'c.jpg']
+    assert manifest.get(os.path.join(str(tmp_path), 'c.jpg'))['x'] == 3
+    manifest.close()
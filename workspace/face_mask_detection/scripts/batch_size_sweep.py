@@ -0,0 +1,106 @@
+import argparse
+import csv
+import logging
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+from detector import Detector
+from masterthesis.utils import TimeIt
+from masterthesis.utils.profiler import Profiler
+
+tf.get_logger().setLevel(logging.ERROR)
+
+
+def read_frames(video_path, num_frames):
+    cap = cv2.VideoCapture(video_path)
+
+    frames = []
+    while len(frames) < num_frames:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        frames.append(frame)
+
+    cap.release()
+    return frames
+
+
+def random_frames(num_frames, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(num_frames)]
+
+
+def sweep(detect_fn, frames, batch_sizes, num_warmup):
+    rows = []
+
+    for batch_size in batch_sizes:
+        profiler = Profiler()
+        detector = Detector(detect_fn, batch_size=batch_size, profiler=profiler)
+
+        # The first calls with a new input shape are much slower (graph tracing, memory allocation)
+        for _ in range(num_warmup):
+            detector.detect(frames[:batch_size])
+        profiler.reset()
+
+        start_time = time.perf_counter()
+        for start in range(0, len(frames), batch_size):
+            with profiler.span('batch'):
+                detector.detect(frames[start:start + batch_size])
+        elapsed_time = time.perf_counter() - start_time
+
+        stats = profiler.statistics()['batch']
+        rows.append({
+            'batch_size': batch_size,
+            'throughput': len(frames) / elapsed_time,
+            'latency_p50_ms': stats['p50_ms'],
+            'latency_p95_ms': stats['p95_ms'],
+            'detect_mean_ms': profiler.statistics()['batch/detect']['mean_ms']
+        })
+
+        row = rows[-1]
+        print(f'{batch_size:>10} {row["throughput"]:>10.2f} {row["latency_p50_ms"]:>12.2f} '
+              f'{row["latency_p95_ms"]:>12.2f} {row["detect_mean_ms"] / batch_size:>14.2f}')
+
+    return rows
+
+
+def main(args):
+    print('Loading saved model...')
+    with TimeIt('Saved model has been loaded successfully'):
+        model = tf.saved_model.load(args.saved_model_dir)
+        detect_fn = model.signatures['serving_default']
+
+    if args.video_path:
+        frames = read_frames(args.video_path, args.num_frames)
+    else:
+        frames = random_frames(args.num_frames, *args.frame_size)
+
+    print(f'Running the sweep on {len(frames)} frames of size {frames[0].shape[1]}x{frames[0].shape[0]}')
+    print(f'{"batch size":>10} {"FPS":>10} {"p50 (ms)":>12} {"p95 (ms)":>12} {"detect/frame":>14}')
+
+    rows = sweep(detect_fn, frames, args.batch_sizes, args.num_warmup)
+
+    if args.output_path:
+        with open(args.output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput and latency of batched inference on a SavedModel')
+
+    parser.add_argument('--saved-model-dir', required=True)
+
+    input_group = parser.add_mutually_exclusive_group()
+    input_group.add_argument('--video-path')
+    input_group.add_argument('--frame-size', nargs=2, type=int, default=[640, 480], metavar=('WIDTH', 'HEIGHT'))
+
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument('--num-frames', type=int, default=128)
+    parser.add_argument('--num-warmup', type=int, default=2)
+    parser.add_argument('-o', '--output-path', help='Save the results to this CSV file')
+
+    main(parser.parse_args())
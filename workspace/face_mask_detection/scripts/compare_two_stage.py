@@ -0,0 +1,201 @@
+import argparse
+import csv
+import logging
+import os
+
+import cv2
+import numpy as np
+import tensorflow as tf
+import torch
+from converters import Category
+from detector import (
+    DEFAULT_CLASSIFIER_BATCH_SIZE,
+    DEFAULT_CROP_MARGIN,
+    DEFAULT_CROP_SIZE,
+    DEFAULT_MIN_SCORE_THRESHOLD,
+    NO_MASK_CLASS_ID,
+    Detector
+)
+from masterthesis.datasets.kitti_utils import read_annotation_file
+from masterthesis.detection.geometry import iou
+from masterthesis.detection.tracking import greedy_matching
+from masterthesis.experiment.metrics import BinaryAccuracy, BinaryConfusionMatrix
+from masterthesis.utils import TimeIt
+from masterthesis.utils.profiler import Profiler
+from two_stage import MaskClassifier, TwoStageDetector
+
+tf.get_logger().setLevel(logging.ERROR)
+
+
+def read_dataset(images_dir, labels_dir, limit=None):
+    """Returns the (image path, (N, 4) face boxes, (N,) no-mask flags) examples of a KITTI dataset."""
+    examples = []
+
+    for filename in sorted(os.listdir(images_dir))[:limit]:
+        label_path = os.path.join(labels_dir, os.path.splitext(filename)[0] + '.txt')
+        if not os.path.isfile(label_path):
+            continue
+
+        annotations = read_annotation_file(label_path)
+        boxes = np.array([list(annotation['bbox']) for annotation in annotations], dtype=np.float64).reshape(-1, 4)
+        no_mask = np.array([annotation['type'] == Category.NO_MASK for annotation in annotations], dtype=np.bool_)
+
+        examples.append((os.path.join(images_dir, filename), boxes, no_mask))
+
+    return examples
+
+
+def match(gt_boxes, boxes, iou_threshold):
+    """Returns the (K, 2) array of the (ground truth, detection) pairs overlapping by at least iou_threshold."""
+    if len(gt_boxes) == 0 or len(boxes) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+
+    overlaps = iou(gt_boxes, boxes)
+    matches = greedy_matching(1 - overlaps)
+    return matches[overlaps[matches[:, 0], matches[:, 1]] >= iou_threshold]
+
+
+def evaluate(name, detect, examples, iou_threshold, num_warmup):
+    """
+    Returns the speed and face detection statistics of a pipeline, and for every example, the indices of the
+    ground truth faces matched by a detection and whether the detections are classified as no-mask.
+    """
+    profiler = Profiler()
+
+    for image_path, _, _ in examples[:num_warmup]:
+        detect(cv2.imread(image_path))
+
+    predictions = []
+    num_faces = num_matches = num_detections = 0
+
+    for image_path, gt_boxes, _ in examples:
+        img = cv2.imread(image_path)
+
+        with profiler.span(name):
+            boxes, _, classes = detect(img)
+
+        matches = match(gt_boxes, boxes, iou_threshold)
+        predictions.append((matches[:, 0], classes[matches[:, 1]] == NO_MASK_CLASS_ID))
+
+        num_faces += len(gt_boxes)
+        num_matches += len(matches)
+        num_detections += len(boxes)
+
+    stats = profiler.statistics()[name]
+    row = {
+        'pipeline': name,
+        'fps': 1000 / stats['mean_ms'],
+        'latency_p50_ms': stats['p50_ms'],
+        'latency_p95_ms': stats['p95_ms'],
+        'face_recall': num_matches / num_faces if num_faces else np.nan,
+        'face_precision': num_matches / num_detections if num_detections else np.nan,
+    }
+    return row, predictions
+
+
+def mask_metrics(examples, predictions, faces, prefix=''):
+    """Mask classification metrics of the predictions of a pipeline, on the ground truth faces of every example."""
+    targets, outputs = [], []
+    for (_, _, gt_no_mask), (gt_indices, no_mask), example_faces in zip(examples, predictions, faces):
+        kept = np.isin(gt_indices, example_faces)
+        targets.append(gt_no_mask[gt_indices[kept]])
+        outputs.append(no_mask[kept])
+
+    targets = torch.from_numpy(np.concatenate(targets))
+    outputs = torch.from_numpy(np.concatenate(outputs)).float()
+
+    accuracy = BinaryAccuracy()
+    confusion_matrix = BinaryConfusionMatrix()
+    accuracy.update(targets, outputs)
+    confusion_matrix.update(targets, outputs)
+
+    return {
+        f'{prefix}faces': len(targets),
+        f'{prefix}accuracy': accuracy.result(),
+        f'{prefix}balanced_accuracy': confusion_matrix.accuracy(balanced=True),
+        f'{prefix}no_mask_precision': confusion_matrix.precision(),
+        f'{prefix}no_mask_recall': confusion_matrix.recall(),
+    }
+
+
+def main(args):
+    with TimeIt('Models have been loaded successfully'):
+        detect_fn = tf.saved_model.load(args.saved_model_dir).signatures['serving_default']
+        face_detect_fn = tf.saved_model.load(args.face_saved_model_dir).signatures['serving_default']
+        classifier = MaskClassifier.load(
+            args.classifier_path,
+            crop_size=tuple(args.crop_size),
+            batch_size=args.classifier_batch_size
+        )
+
+    single_stage = Detector(detect_fn, min_score_threshold=args.min_score_threshold)
+    two_stage = TwoStageDetector(
+        Detector(face_detect_fn, min_score_threshold=args.min_score_threshold),
+        classifier,
+        margin=args.crop_margin
+    )
+
+    examples = read_dataset(
+        os.path.join(args.dataset_dir, 'images'),
+        os.path.join(args.dataset_dir, 'labels'),
+        limit=args.limit
+    )
+    print(f'Comparing the pipelines on {len(examples)} images')
+
+    results = [
+        evaluate('single-stage', single_stage, examples, args.iou_threshold, args.num_warmup),
+        evaluate('two-stage', two_stage, examples, args.iou_threshold, args.num_warmup),
+    ]
+
+    # Mask classification is evaluated both on the faces matched by each pipeline, which depend on its recall,
+    # and on the faces matched by both pipelines, so that the accuracies are comparable
+    common_faces = [
+        np.intersect1d(single_stage_predictions[0], two_stage_predictions[0])
+        for single_stage_predictions, two_stage_predictions in zip(*(predictions for _, predictions in results))
+    ]
+
+    rows = []
+    for row, predictions in results:
+        own_faces = [gt_indices for gt_indices, _ in predictions]
+        row.update(mask_metrics(examples, predictions, own_faces))
+        row.update(mask_metrics(examples, predictions, common_faces, prefix='common_'))
+        rows.append(row)
+
+    print(f'{"pipeline":>12} {"FPS":>8} {"p50 (ms)":>10} {"p95 (ms)":>10} {"face recall":>12} '
+          f'{"accuracy":>9} {"balanced":>9} {"common faces":>13} {"accuracy":>9} {"balanced":>9}')
+    for row in rows:
+        print(f'{row["pipeline"]:>12} {row["fps"]:>8.2f} {row["latency_p50_ms"]:>10.2f} '
+              f'{row["latency_p95_ms"]:>10.2f} {row["face_recall"]:>12.4f} {row["accuracy"]:>9.4f} '
+              f'{row["balanced_accuracy"]:>9.4f} {row["common_faces"]:>13} {row["common_accuracy"]:>9.4f} '
+              f'{row["common_balanced_accuracy"]:>9.4f}')
+
+    if args.output_path:
+        with open(args.output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Latency and accuracy of the single-stage face-mask detector '
+                                                 'against a face detector followed by a crop classifier')
+
+    parser.add_argument('--dataset-dir', required=True, help='KITTI dataset (images and labels directories)')
+    parser.add_argument('--saved-model-dir', required=True, help='Single-stage face-mask detector')
+    parser.add_argument('--face-saved-model-dir', required=True)
+    parser.add_argument('--classifier-path', required=True, help='TorchScript mask/no-mask classifier')
+
+    parser.add_argument('--crop-size', nargs=2, type=int, default=list(DEFAULT_CROP_SIZE),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--crop-margin', default=DEFAULT_CROP_MARGIN, type=float)
+    parser.add_argument('--classifier-batch-size', default=DEFAULT_CLASSIFIER_BATCH_SIZE, type=int)
+
+    parser.add_argument('--min-score-threshold', default=DEFAULT_MIN_SCORE_THRESHOLD, type=float)
+    parser.add_argument('--iou-threshold', default=0.5, type=float,
+                        help='Minimum IoU of a detection with a ground truth face to be matched')
+
+    parser.add_argument('--limit', default=None, type=int, help='Evaluate on the first LIMIT images only')
+    parser.add_argument('--num-warmup', default=2, type=int)
+    parser.add_argument('-o', '--output-path', help='Save the results to this CSV file')
+
+    main(parser.parse_args())
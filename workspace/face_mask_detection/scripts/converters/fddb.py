@@ -1,8 +1,8 @@
-import math
 import os
 import re
 
-from masterthesis.detection.utils import ellipse_to_bbox, Point
+import numpy as np
+from masterthesis.detection.utils import ellipses_to_bboxes
 from .tokitticonverter import ToKittiConverter, Category
 
 
@@ -15,54 +15,64 @@ class FddbToKittiConverter(ToKittiConverter):
             base_dir,
             labels_dir,
             limit,
-            verbose
+            verbose,
+            workers=1,
+            force=False,
+            copy_method=None,
+            encoding=None
     ):
-        super(FddbToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, 'train')
+        super(FddbToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, 'train',
+                                                   workers=workers, force=force, copy_method=copy_method,
+                                                   encoding=encoding)
 
         self.base_dir = base_dir
         self.labels_dir = labels_dir
 
-    def __call__(self):
+    def examples(self):
         for root, dirs, files in os.walk(self.labels_dir):
             for file in files:
                 if file.endswith('ellipseList.txt'):
                     file_name = os.path.join(root, file)
-                    self.mat2data(read_file=file_name)
-
-        return self.count_mask, self.count_no_mask
+                    yield from self.mat2data(read_file=file_name)
 
     def mat2data(self, read_file):
-        strings = ("2002/", "2003/")
-        with open(read_file, 'r') as f:
-            lines = f.readlines()
-            for i in range(0, len(lines)):
-                line = lines[i]
-                if any(s in line for s in strings) and self.count_no_mask < self.no_mask_limit:
-                    image_file_location = line.strip('\n')
-                    num_faces_line = re.search(r"(\d+).*?", lines[i + 1])
-                    num_faces = int(num_faces_line.group(1))
-                    image_name = image_file_location + '.jpg'
-                    category_name = Category.NO_MASK
-                    bboxes = []
-                    class_names = []
-                    for j in range(1, num_faces + 1):
-                        faces = str(lines[i + j + 1]).split()
-
-                        face_annotations = faces[:5]
-
-                        major_axis_radius = float(face_annotations[0])
-                        minor_axis_radius = float(face_annotations[1])
-                        angle = float(face_annotations[2])
-                        cx = float(face_annotations[3])
-                        cy = float(face_annotations[4])
-
-                        bbox = ellipse_to_bbox(Point(cx, cy), Point(major_axis_radius, minor_axis_radius), angle)
-                        bboxes.append(bbox)
-                        class_names.append(category_name)
-                    if bboxes:
-                        self.write_example(
-                            image_path=os.path.join(self.base_dir, image_name),
-                            class_names=class_names,
-                            bboxes=bboxes
-                        )
-        return self.count_mask, self.count_no_mask
+        image_names, num_faces, ellipses = read_ellipse_list(read_file)
+
+        # Convert all the ellipses of the file at once
+        bboxes = ellipses_to_bboxes(ellipses).data.tolist()
+        ends = np.cumsum(num_faces)
+
+        for image_name, count, end in zip(image_names, num_faces, ends):
+            if count > 0:
+                yield os.path.join(self.base_dir, image_name), [Category.NO_MASK] * count, bboxes[end - count:end]
+
+
+def read_ellipse_list(read_file):
+    """
+    Parses an FDDB ellipseList.txt file, returns the image names, the number of faces of every image and the
+    (N, 5) array of [major_axis_radius, minor_axis_radius, angle, center_x, center_y] face ellipses.
+    """
+    strings = ("2002/", "2003/")
+    image_names = []
+    num_faces = []
+    ellipses = []
+
+    with open(read_file, 'r') as f:
+        lines = f.readlines()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if any(s in line for s in strings):
+            count = int(re.search(r"(\d+).*?", lines[i + 1]).group(1))
+
+            image_names.append(line.strip('\n') + '.jpg')
+            num_faces.append(count)
+            for j in range(i + 2, i + 2 + count):
+                ellipses.append([float(x) for x in lines[j].split()[:5]])
+
+            i += 2 + count
+        else:
+            i += 1
+
+    return image_names, num_faces, np.asarray(ellipses, dtype=np.float64).reshape(-1, 5)
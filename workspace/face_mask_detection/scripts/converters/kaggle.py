@@ -13,14 +13,20 @@ class KaggleToKittiConverter(ToKittiConverter):
             images_dir,
             labels_dir,
             limit,
-            verbose
+            verbose,
+            workers=1,
+            force=False,
+            copy_method=None,
+            encoding=None
     ):
-        super(KaggleToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, 'train')
+        super(KaggleToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, 'train',
+                                                     workers=workers, force=force, copy_method=copy_method,
+                                                     encoding=encoding)
 
         self.images_dir = images_dir
         self.labels_dir = labels_dir
 
-    def __call__(self):
+    def examples(self):
         image_extensions = ['.jpeg', '.jpg', '.png']
         for image_name in os.listdir(self.images_dir):
             _, ext = os.path.splitext(image_name)
@@ -35,21 +41,15 @@ class KaggleToKittiConverter(ToKittiConverter):
 
                         category = Category.MASK if cat_name == 'mask' else Category.NO_MASK
 
-                        if self.count[category] < self.limit[category]:
-                            xmin = int(object_tag.find("bndbox/xmin").text)
-                            xmax = int(object_tag.find("bndbox/xmax").text)
-                            ymin = int(object_tag.find("bndbox/ymin").text)
-                            ymax = int(object_tag.find("bndbox/ymax").text)
-                            bbox = [xmin, ymin, xmax, ymax]
-                            class_names.append(category)
-                            bboxes.append(bbox)
+                        xmin = int(object_tag.find("bndbox/xmin").text)
+                        xmax = int(object_tag.find("bndbox/xmax").text)
+                        ymin = int(object_tag.find("bndbox/ymin").text)
+                        ymax = int(object_tag.find("bndbox/ymax").text)
+                        bbox = [xmin, ymin, xmax, ymax]
+                        class_names.append(category)
+                        bboxes.append(bbox)
                     if bboxes:
-                        self.write_example(
-                            image_path=os.path.join(self.images_dir, image_name),
-                            class_names=class_names,
-                            bboxes=bboxes)
-
-        return self.count_mask, self.count_no_mask
+                        yield os.path.join(self.images_dir, image_name), class_names, bboxes
 
     def get_image_metafile(self, image_file):
         image_name = os.path.splitext(image_file)[0]
@@ -15,20 +15,26 @@ class MafaToKittiConverter(ToKittiConverter):
             images_dir,
             limit,
             stage,
-            verbose
+            verbose,
+            workers=1,
+            force=False,
+            copy_method=None,
+            encoding=None
     ):
-        super(MafaToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, stage)
+        super(MafaToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, stage,
+                                                   workers=workers, force=force, copy_method=copy_method,
+                                                   encoding=encoding)
 
         self.annotations_path = annotations_path
         self.data = scipy.io.loadmat(self.annotations_path)
         self.images_dir = images_dir
         self.len_dataset = len(self.data["label_train"][0]) if self.train else len(self.data["LabelTest"][0])
 
-    def __call__(self):
+    def examples(self):
         for i in range(0, self.len_dataset):
-            self.extract_labels(i=i)
-
-        return self.count_mask, self.count_no_mask
+            example = self.extract_labels(i=i)
+            if example:
+                yield example
 
     def extract_labels(self, i):
         class_names = []
@@ -53,7 +59,7 @@ class MafaToKittiConverter(ToKittiConverter):
                 elif _category_id == 3 and _occlusion_degree < 2:
                     category_name = Category.NO_MASK  # Faces without Mask
 
-                if category_name and self.count[category_name] < self.limit[category_name]:
+                if category_name:
                     class_names.append(category_name)
                     bboxes.append(bbox)
         else:
@@ -78,12 +84,10 @@ class MafaToKittiConverter(ToKittiConverter):
                 elif _face_type == 2:
                     category_name = Category.NO_MASK
 
-                if category_name and self.count[category_name] < self.limit[category_name]:
+                if category_name:
                     class_names.append(category_name)
                     bboxes.append(bbox)
 
         if bboxes:
-            self.write_example(
-                image_path=os.path.join(self.images_dir, image_name),
-                class_names=class_names,
-                bboxes=bboxes)
+            return os.path.join(self.images_dir, image_name), class_names, bboxes
+        return None
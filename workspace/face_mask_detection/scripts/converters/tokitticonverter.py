@@ -2,6 +2,8 @@ import os
 
 from masterthesis.datasets.kitti_utils import ToKittiBaseConverter
 
+MANIFEST_FILENAME = 'manifest.jsonl'
+
 
 class _Category(type):
 
@@ -18,18 +20,29 @@ class Category(metaclass=_Category):
 
 class ToKittiConverter(ToKittiBaseConverter):
 
-    def __init__(self, base_dir, limit, kitti_image_size=None, verbose=False, stage='train'):
+    def __init__(self, base_dir, limit, kitti_image_size=None, verbose=False, stage='train', frozen=False,
+                 workers=1, force=False, copy_method=None, encoding=None):
         super(ToKittiConverter, self).__init__(
             kitti_images_dir=os.path.join(base_dir, stage, 'images'),
             kitti_labels_dir=os.path.join(base_dir, stage, 'labels'),
             limit=limit,
             kitti_image_size=kitti_image_size,
             verbose=verbose,
-            strict=True
+            strict=True,
+            frozen=frozen,
+            workers=workers,
+            manifest_path=os.path.join(base_dir, stage, MANIFEST_FILENAME),
+            force=force,
+            copy_method=copy_method,
+            encoding=encoding
         )
 
         self.train = stage == 'train'
 
+    def __call__(self):
+        super(ToKittiConverter, self).__call__()
+        return self.count_mask, self.count_no_mask
+
     def log(self, image_path, w, h, bbox):
         from . import log
         log(image_path, w, h, bbox)
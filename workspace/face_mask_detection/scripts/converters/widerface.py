@@ -15,9 +15,15 @@ class WiderFaceToKittiConverter(ToKittiConverter):
             annotations_path,
             limit,
             stage,
-            verbose
+            verbose,
+            workers=1,
+            force=False,
+            copy_method=None,
+            encoding=None
     ):
-        super(WiderFaceToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, stage)
+        super(WiderFaceToKittiConverter, self).__init__(kitti_base_dir, limit, kitti_image_size, verbose, stage,
+                                                        workers=workers, force=force, copy_method=copy_method,
+                                                        encoding=encoding)
 
         self.annotations_path = annotations_path
         self.data = scipy.io.loadmat(self.annotations_path)
@@ -28,7 +34,7 @@ class WiderFaceToKittiConverter(ToKittiConverter):
         self.images_dir = images_dir
         self.len_dataset = len(self.file_names)
 
-    def __call__(self):
+    def examples(self):
         # pick_list = ['19--Couple', '13--Interview', '16--Award_Ceremony','2--Demonstration', '22--Picnic']
         # Use following pick list for more image data
         pick_list = ['2--Demonstration', '4--Dancing', '5--Car_Accident', '15--Stock_Market', '23--Shoppers',
@@ -49,23 +55,17 @@ class WiderFaceToKittiConverter(ToKittiConverter):
                     #  print face_bbx.shape
                     bboxes = []
                     class_names = []
-                    if self.count_no_mask < self.no_mask_limit:
-                        for i in range(face_bbx.shape[0]):
-                            xmin = int(face_bbx[i][0])
-                            ymin = int(face_bbx[i][1])
-                            xmax = int(face_bbx[i][2]) + xmin
-                            ymax = int(face_bbx[i][3]) + ymin
-                            # Consider only Occlusion Free masks
-                            if category_id[i][0] == 0:
-                                category_name = Category.NO_MASK
-                                bboxes.append((xmin, ymin, xmax, ymax))
-                                class_names.append(category_name)
+                    for i in range(face_bbx.shape[0]):
+                        xmin = int(face_bbx[i][0])
+                        ymin = int(face_bbx[i][1])
+                        xmax = int(face_bbx[i][2]) + xmin
+                        ymax = int(face_bbx[i][3]) + ymin
+                        # Consider only Occlusion Free masks
+                        if category_id[i][0] == 0:
+                            category_name = Category.NO_MASK
+                            bboxes.append((xmin, ymin, xmax, ymax))
+                            class_names.append(category_name)
 
-                        if bboxes and len(bboxes) < 4:
-                            # print("Len of BBox:{} in Image:{}".format(len(bboxes),im_name))
-                            self.write_example(
-                                image_path=os.path.join(self.images_dir, image_name),
-                                class_names=class_names,
-                                bboxes=bboxes)
-
-        return self.count_mask, self.count_no_mask
+                    if bboxes and len(bboxes) < 4:
+                        # print("Len of BBox:{} in Image:{}".format(len(bboxes),im_name))
+                        yield os.path.join(self.images_dir, image_name), class_names, bboxes
@@ -5,11 +5,15 @@ import json
 import logging
 import os
 import sys
+import time
 
 import converters
+from masterthesis.datasets import planning
+from masterthesis.datasets.kitti_utils import COPY_METHODS, DEFAULT_ENCODING, JPEG_SUBSAMPLINGS, RESAMPLING_FILTERS
 from masterthesis.utils import TimeIt
 
 DEFAULT_KITTI_IMAGE_SIZE = (960, 544)
+DEFAULT_COPY_METHOD = None
 
 
 def print_summary(d, label=None):
@@ -32,7 +36,13 @@ def data_to_kitti(
         category_limit=sys.maxsize,
         label_filename='000_1OC3DT',
         action=None,
-        verbose=False
+        verbose=False,
+        workers=1,
+        force=False,
+        copy_method=DEFAULT_COPY_METHOD,
+        encoding=None,
+        plan_only=False,
+        plan_output=None
 ):
     if action not in ['train', 'test', 'check_labels']:
         raise ValueError(f'Unrecognized action: \'{action}\'')
@@ -61,49 +71,33 @@ def data_to_kitti(
             Category.NO_MASK: category_limit
         }
 
-        def update_statistics(label=None):
-            nonlocal category_limit_dict
-
-            category_limit_dict[Category.MASK] -= count_masks
-            category_limit_dict[Category.NO_MASK] -= count_no_masks
-
-            print_summary({k: category_limit - v for k, v in category_limit_dict.items()}, label=label)
+        # Converters by dataset, in traversal order: the category limits apply to the datasets one after the other
+        kitti_converters = {}
 
         with TimeIt(f'{action} dataset conversion complete'):
-            previous = False
-
-            def new_line():
-                nonlocal previous
-                if previous:
-                    print()
-                previous = True
-
             # ----------------------------------------
-            # Kaggle Dataset Conversion
+            # Kaggle Dataset
             # ----------------------------------------
             if kaggle_base_dir and train:
                 from converters.kaggle import KaggleToKittiConverter
                 images_dir = os.path.join(kaggle_base_dir, 'images')
                 annotations_path = os.path.join(kaggle_base_dir, 'labels')
 
-                with TimeIt(f'Kaggle {action} dataset conversion complete'):
-                    new_line()
-                    print(f'Converting Kaggle {action} dataset to KITTI...')
-
-                    converter = KaggleToKittiConverter(
-                        kitti_base_dir=kitti_base_dir,
-                        kitti_image_size=kitti_image_size,
-                        images_dir=images_dir,
-                        labels_dir=annotations_path,
-                        limit=category_limit_dict,
-                        verbose=verbose
-                    )
-
-                    count_masks, count_no_masks = converter()
-                    update_statistics('Summary after processing Kaggle Dataset')
+                kitti_converters['Kaggle'] = KaggleToKittiConverter(
+                    kitti_base_dir=kitti_base_dir,
+                    kitti_image_size=kitti_image_size,
+                    images_dir=images_dir,
+                    labels_dir=annotations_path,
+                    limit=category_limit_dict,
+                    verbose=verbose,
+                    workers=workers,
+                    force=force,
+                    copy_method=copy_method,
+                    encoding=encoding
+                )
 
             # ----------------------------------------
-            # MAFA Dataset Conversion
+            # MAFA Dataset
             # ----------------------------------------
             if mafa_base_dir:
                 from converters.mafa import MafaToKittiConverter
@@ -114,48 +108,42 @@ def data_to_kitti(
                     annotations_path = os.path.join(mafa_base_dir, 'MAFA-Label-Test/LabelTestAll.mat')
                     images_dir = os.path.join(mafa_base_dir, 'test-images/images')
 
-                with TimeIt(f'MAFA {action} dataset conversion complete'):
-                    new_line()
-                    print(f'Converting MAFA {action} dataset to KITTI...')
-
-                    converter = MafaToKittiConverter(
-                        kitti_base_dir=kitti_base_dir,
-                        kitti_image_size=kitti_image_size,
-                        annotations_path=annotations_path,
-                        images_dir=images_dir,
-                        limit=category_limit_dict,
-                        stage=action,
-                        verbose=verbose
-                    )
-
-                    count_masks, count_no_masks = converter()
-                    update_statistics('Summary after processing MAsked FAces Dataset')
+                kitti_converters['MAFA'] = MafaToKittiConverter(
+                    kitti_base_dir=kitti_base_dir,
+                    kitti_image_size=kitti_image_size,
+                    annotations_path=annotations_path,
+                    images_dir=images_dir,
+                    limit=category_limit_dict,
+                    stage=action,
+                    verbose=verbose,
+                    workers=workers,
+                    force=force,
+                    copy_method=copy_method,
+                    encoding=encoding
+                )
 
             # ----------------------------------------
-            # FDDB Dataset Conversion
+            # FDDB Dataset
             # ----------------------------------------
             if fddb_base_dir and train:
                 from converters.fddb import FddbToKittiConverter
                 annotations_path = os.path.join(fddb_base_dir, 'FDDB-folds')
 
-                with TimeIt(f'FDDB {action} dataset conversion complete'):
-                    new_line()
-                    print(f'Converting FDDB {action} dataset to KITTI...')
-
-                    converter = FddbToKittiConverter(
-                        kitti_base_dir=kitti_base_dir,
-                        kitti_image_size=kitti_image_size,
-                        base_dir=fddb_base_dir,
-                        labels_dir=annotations_path,
-                        limit=category_limit_dict,
-                        verbose=verbose
-                    )
-
-                    count_masks, count_no_masks = converter()
-                    update_statistics('Summary after processing Face Detection Dataset and Benchmark')
+                kitti_converters['FDDB'] = FddbToKittiConverter(
+                    kitti_base_dir=kitti_base_dir,
+                    kitti_image_size=kitti_image_size,
+                    base_dir=fddb_base_dir,
+                    labels_dir=annotations_path,
+                    limit=category_limit_dict,
+                    verbose=verbose,
+                    workers=workers,
+                    force=force,
+                    copy_method=copy_method,
+                    encoding=encoding
+                )
 
             # ----------------------------------------
-            # Wider-Face Dataset Conversion
+            # Wider-Face Dataset
             # ----------------------------------------
             if widerface_base_dir:
                 from converters.widerface import WiderFaceToKittiConverter
@@ -167,22 +155,75 @@ def data_to_kitti(
                     annotations_path = os.path.join(widerface_base_dir, 'wider_face_split/wider_face_val.mat')
                     images_dir = os.path.join(widerface_base_dir, 'WIDER_val/images')
 
-                with TimeIt(f'WiderFace {action} dataset conversion complete'):
-                    new_line()
-                    print(f'Converting WiderFace {action} dataset to KITTI...')
+                kitti_converters['WiderFace'] = WiderFaceToKittiConverter(
+                    kitti_base_dir=kitti_base_dir,
+                    kitti_image_size=kitti_image_size,
+                    images_dir=images_dir,
+                    annotations_path=annotations_path,
+                    limit=category_limit_dict,
+                    stage=action,
+                    verbose=verbose,
+                    workers=workers,
+                    force=force,
+                    copy_method=copy_method,
+                    encoding=encoding
+                )
+
+            if not kitti_converters:
+                return
+
+            table = plan_conversion(kitti_converters, category_limit_dict, plan_output)
+            if not plan_only:
+                write_conversion(kitti_converters, table, action)
+
+
+def plan_conversion(kitti_converters, limit, plan_output=None):
+    """
+    Applies the category limits to the annotations of all the datasets at once, reading the image headers only,
+    so that the images of rejected examples are never decoded.
+    """
+    with TimeIt('Conversion planned'):
+        table = planning.annotations_table({name: converter.examples() for name, converter in kitti_converters.items()})
+        planning.add_image_sizes(table)
+        planning.plan(table, limit, strict=all(converter.strict for converter in kitti_converters.values()))
+
+    for row in table[~table['valid']].itertuples():
+        kitti_converters[row.source].log(row.image_path, int(row.width), int(row.height),
+                                         [row.xmin, row.ymin, row.xmax, row.ymax])
+
+    print(planning.composition(table).to_string())
+
+    if plan_output:
+        table.to_csv(plan_output, index=False)
+        print(f'Plan written to {plan_output}')
+
+    return table
+
+
+def print_throughput(converter, elapsed_time):
+    methods = ', '.join(f'{count} {method}' for method, count in sorted(converter.methods.items()))
+    print(f'{converter.num_encoded} examples written ({methods or "none"}), {converter.num_skipped} unchanged')
+    print(f'{converter.num_encoded / elapsed_time:.2f} examples/s, '
+          f'{converter.bytes_written / 2 ** 20:.1f} MiB written, '
+          f'{converter.bytes_linked / 2 ** 20:.1f} MiB hardlinked without using disk space')
+
+
+def write_conversion(kitti_converters, table, action):
+    counts = {class_name: 0 for class_name in table['class_name'].cat.categories}
+
+    for name, converter in kitti_converters.items():
+        with TimeIt(f'{name} {action} dataset conversion complete'):
+            print()
+            print(f'Converting {name} {action} dataset to KITTI...')
 
-                    converter = WiderFaceToKittiConverter(
-                        kitti_base_dir=kitti_base_dir,
-                        kitti_image_size=kitti_image_size,
-                        images_dir=images_dir,
-                        annotations_path=annotations_path,
-                        limit=category_limit_dict,
-                        stage=action,
-                        verbose=verbose
-                    )
+            start_time = time.perf_counter()
+            with converter:
+                converter.write_selection(planning.selection(table, name))
+            print_throughput(converter, time.perf_counter() - start_time)
 
-                    count_masks, count_no_masks = converter()
-                    update_statistics('Summary after processing WIDER FACE')
+            for class_name, count in converter.count.items():
+                counts[class_name] += count
+            print_summary(counts, label=f'Summary after processing {name}')
 
 
 def main(args):
@@ -208,7 +249,18 @@ def main(args):
         category_limit=args.category_limit,
         label_filename=args.label_filename,
         action=action,
-        verbose=args.verbose
+        verbose=args.verbose,
+        workers=args.workers,
+        force=args.force,
+        copy_method=None if args.copy_method == 'none' else args.copy_method,
+        encoding={
+            'draft': args.draft,
+            'resample': args.resample,
+            'quality': args.jpeg_quality,
+            'subsampling': args.jpeg_subsampling
+        },
+        plan_only=args.plan_only,
+        plan_output=args.plan_output
     )
 
     if logs_path and converters.logs:
@@ -238,6 +290,28 @@ if __name__ == '__main__':
     parser.add_argument('--logs-path', default=os.getcwd(), help='Path to the logs file.')
 
     parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--workers', default=1, type=int,
+                        help='Number of processes encoding the images, the output does not depend on it')
+    parser.add_argument('--force', action='store_true',
+                        help='Encode every example again, even if it has not changed since the last conversion')
+    parser.add_argument('--copy-method', choices=COPY_METHODS + ['none'], default='none',
+                        help='How to write the source images that already are RGB JPEGs of the KITTI image size, '
+                             'instead of decoding and encoding them again (falls back to the next methods if not '
+                             'supported). Hardlinked images share their file with the source dataset, so editing '
+                             'them in place also edits the source')
+    parser.add_argument('--draft', action='store_true',
+                        help='Decode large JPEGs at a reduced scale (DCT scaling) before resizing them, much faster '
+                             'on sources several times larger than the KITTI image size')
+    parser.add_argument('--resample', choices=list(RESAMPLING_FILTERS), default=None,
+                        help='Resampling filter of the resize (default of PIL if not given)')
+    parser.add_argument('--jpeg-quality', default=DEFAULT_ENCODING['quality'], type=int,
+                        help='Quality of the encoded JPEGs, from 1 to 95')
+    parser.add_argument('--jpeg-subsampling', choices=list(JPEG_SUBSAMPLINGS), default=None,
+                        help='Chroma subsampling of the encoded JPEGs (default of PIL if not given)')
+    parser.add_argument('--plan-only', action='store_true',
+                        help='Only print the number of examples and boxes that would be converted from every dataset')
+    parser.add_argument('--plan-output', default=None, type=str,
+                        help='Path to a CSV file to save the planned boxes to, with their validity and selection')
 
     data_group = parser.add_mutually_exclusive_group(required=True)
     data_group.add_argument('--train', help='Convert Training dataset to KITTI', action='store_true')
@@ -0,0 +1,265 @@
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+from masterthesis.detection.results import DetectionResult
+from masterthesis.detection.tiling import merge_tiles, tile_layout
+from masterthesis.utils.profiler import Profiler
+
+DEFAULT_MIN_SCORE_THRESHOLD = 0.6
+
+DEFAULT_NMS_MAX_OUTPUT_SIZE = 100
+DEFAULT_NMS_IOU_THRESHOLD = 0.5
+DEFAULT_NMS_SCORE_THRESHOLD = 0.005
+
+DEFAULT_WARMUP_RUNS = 3
+
+CHANNEL_ORDERS = [
+    'host',
+    'graph'
+]
+
+DEFAULT_TILE_OVERLAP = 64
+
+DEFAULT_CROP_SIZE = (64, 64)
+DEFAULT_CROP_MARGIN = 0.1
+DEFAULT_CLASSIFIER_BATCH_SIZE = 32
+DEFAULT_CLASSIFIER_THRESHOLD = 0.5
+
+MASK_CLASS_ID = 1
+NO_MASK_CLASS_ID = 2
+
+DISPLAY_NAMES = {
+    MASK_CLASS_ID: 'Mask',
+    NO_MASK_CLASS_ID: 'No mask'
+}
+
+COLORS = {
+    MASK_CLASS_ID: (0, 255, 0),
+    NO_MASK_CLASS_ID: (255, 0, 0)
+}
+
+
+# Frames are drawn in place in the BGR order of cv2
+BGR_COLORS = {class_id: color[::-1] for class_id, color in COLORS.items()}
+
+
+class Detector(object):
+    """
+    Runs a TF2 Object Detection API detect_fn on batches of up to batch_size BGR frames.
+    Frames are copied into a preallocated uint8 input array, so that every batch is converted into a single
+    tensor, and the outputs are post-processed into a reusable DetectionResult.
+
+    Partial batches are padded with the frames of the previous batch, so that detect_fn is always called
+    with the same input shape. The SavedModel must have been exported with a dynamic (or batch_size) batch
+    dimension for batch_size greater than one.
+
+    Frames of a batch must have the same size, unless input_size (width, height) is given: frames are then
+    resized to it, and boxes are still returned in the coordinates of every original frame.
+
+    channel_order tells where BGR frames are converted to RGB: 'host' converts them with OpenCV while they
+    are copied into the input array, 'graph' reverses the channels inside the TensorFlow graph, so that a
+    single frame of the right size is handed to TensorFlow as it is, tensor conversion being the only copy.
+    bytes_copied counts the bytes copied on the host, tensor conversion included.
+    """
+
+    def __init__(
+            self,
+            detect_fn,
+            batch_size=1,
+            min_score_threshold=DEFAULT_MIN_SCORE_THRESHOLD,
+            nms_args=None,
+            input_size=None,
+            channel_order='host',
+            profiler=None
+    ):
+        assert batch_size >= 1
+        assert channel_order in CHANNEL_ORDERS, f'Unknown channel order: \'{channel_order}\''
+
+        if channel_order == 'graph':
+            signature = detect_fn
+            detect_fn = tf.function(lambda images: signature(tf.reverse(images, axis=[-1])))
+
+        self.detect_fn = detect_fn
+        self.channel_order = channel_order
+        self.batch_size = batch_size
+        self.min_score_threshold = min_score_threshold
+        self.nms_args = nms_args
+        self.input_size = input_size
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        max_detections = nms_args.max_output_size if nms_args else DEFAULT_NMS_MAX_OUTPUT_SIZE
+        self.result = DetectionResult(batch_size=batch_size, max_detections=max_detections)
+
+        self._inputs = None
+
+        self.num_frames = 0
+        self.bytes_copied = 0
+
+    @property
+    def bytes_per_frame(self):
+        return self.bytes_copied / self.num_frames if self.num_frames else 0
+
+    def _input_tensor(self, frames):
+        host = self.channel_order == 'host'
+
+        # A single BGR frame is already a contiguous batch of one
+        if not host and not self.input_size and self.batch_size == 1:
+            inputs = frames[0][np.newaxis]
+            self.bytes_copied += inputs.nbytes
+            return tf.convert_to_tensor(inputs)
+
+        if self.input_size:
+            width, height = self.input_size
+            shape = (self.batch_size, height, width, 3)
+        else:
+            shape = (self.batch_size, *frames[0].shape)
+            assert all(frame.shape == frames[0].shape for frame in frames), 'Frames of different sizes ' \
+                                                                           'require an input size.'
+
+        if self._inputs is None or self._inputs.shape != shape:
+            self._inputs = np.zeros(shape, dtype=np.uint8)
+
+        for i, frame in enumerate(frames):
+            if self.input_size:
+                frame = cv2.resize(frame, self.input_size)
+                self.bytes_copied += frame.nbytes
+
+            if host:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._inputs[i])
+            else:
+                np.copyto(self._inputs[i], frame)
+
+        self.bytes_copied += len(frames) * self._inputs[0].nbytes + self._inputs.nbytes
+        return tf.convert_to_tensor(self._inputs)
+
+    def input_shape(self, frame_size):
+        """Shape of the input tensor of detect_fn for frames of frame_size (width, height)."""
+        width, height = self.input_size or frame_size
+        return self.batch_size, height, width, 3
+
+    def warm_up(self, frame_size, num_runs=DEFAULT_WARMUP_RUNS):
+        """
+        Runs num_runs batches of black frames of frame_size (width, height), so that graph optimization and
+        kernel selection are paid before the first real frame. Returns the latencies in milliseconds of the
+        runs, the first one being the cold latency. Warm-up runs are neither profiled nor counted.
+        """
+        width, height = frame_size
+        frames = [np.zeros((height, width, 3), dtype=np.uint8)] * self.batch_size
+
+        enabled, self.profiler.enabled = self.profiler.enabled, False
+        latencies = []
+        try:
+            for _ in range(num_runs):
+                start_time = time.perf_counter()
+                self.detect(frames)
+                latencies.append((time.perf_counter() - start_time) * 1000)
+        finally:
+            self.profiler.enabled = enabled
+
+        self.num_frames = 0
+        self.bytes_copied = 0
+
+        return latencies
+
+    def detect(self, frames):
+        """Returns the DetectionResult of frames (at most batch_size), with boxes in pixel coordinates."""
+        assert 0 < len(frames) <= self.batch_size, f'Expected 1 to {self.batch_size} frames, got {len(frames)}.'
+
+        with self.profiler.span('preprocess'):
+            input_tensor = self._input_tensor(frames)
+
+        with self.profiler.span('detect'):
+            detections = self.detect_fn(input_tensor)
+
+        with self.profiler.span('postprocess'):
+            # All outputs are batches tensors, they are copied once into the preallocated buffers of result
+            result = self.result.load(detections, num_frames=len(frames))
+            self.num_frames += len(frames)
+            result.threshold(self.min_score_threshold)
+
+            if self.nms_args:
+                result.non_max_suppression(
+                    iou_threshold=self.nms_args.iou_threshold,
+                    score_threshold=self.nms_args.score_threshold,
+                    max_output_size=self.nms_args.max_output_size,
+                    top_k=self.nms_args.top_k,
+                    class_agnostic=self.nms_args.class_agnostic
+                )
+
+            result.denormalize([(frame.shape[1], frame.shape[0]) for frame in frames])
+
+        return result
+
+    def __call__(self, frame):
+        """Returns the (boxes, scores, classes) arrays of the detections of a single frame."""
+        return self.detect([frame]).frame(0)
+
+
+class TiledDetector(object):
+    """
+    Runs a Detector on overlapping tile_size (width, height) tiles of high-resolution frames, so that small
+    objects are not lost by downscaling the whole frame to the input size of the model. Tiles are cropped
+    without copying and detected in batches of detector.batch_size, their boxes are mapped back to the frame
+    and the duplicates of objects seen by several tiles are merged with NMS.
+
+    If full_frame_detector is given, it also runs on the whole frame, so that objects larger than the tiles
+    are detected too. Tile layouts are cached per frame resolution.
+    """
+
+    def __init__(
+            self,
+            detector,
+            tile_size,
+            overlap=DEFAULT_TILE_OVERLAP,
+            iou_threshold=DEFAULT_NMS_IOU_THRESHOLD,
+            class_agnostic=False,
+            full_frame_detector=None
+    ):
+        assert detector.input_size is None, 'Tiles are already of the input size of the model.'
+
+        self.detector = detector
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.iou_threshold = iou_threshold
+        self.class_agnostic = class_agnostic
+        self.full_frame_detector = full_frame_detector
+        self.profiler = detector.profiler
+
+        self.num_frames = 0
+        self.num_tiles = 0
+
+    @property
+    def tiles_per_frame(self):
+        return self.num_tiles / self.num_frames if self.num_frames else 0
+
+    def layout(self, frame):
+        height, width = frame.shape[:2]
+        return tile_layout(width, height, *self.tile_size, self.overlap)
+
+    def __call__(self, frame):
+        """Returns the (boxes, scores, classes) arrays of the detections of a single frame."""
+        tiles = self.layout(frame)
+        crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+
+        boxes, scores, classes = [], [], []
+        for start in range(0, len(crops), self.detector.batch_size):
+            batch = crops[start:start + self.detector.batch_size]
+            result = self.detector.detect(batch)
+
+            for i in range(len(batch)):
+                for detections, values in zip((boxes, scores, classes), result.frame(i)):
+                    detections.append(values)
+
+        self.num_frames += 1
+        self.num_tiles += len(tiles)
+
+        if self.full_frame_detector is not None:
+            for detections, values in zip((boxes, scores, classes), self.full_frame_detector(frame)):
+                detections.append(values)
+
+            tiles = np.concatenate([tiles, [[0, 0, frame.shape[1], frame.shape[0]]]])
+
+        with self.profiler.span('merge'):
+            return merge_tiles(boxes, scores, classes, tiles, self.iou_threshold, self.class_agnostic)
@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import logging
+import time
+from http import HTTPStatus
+
+import cv2
+import numpy as np
+import tensorflow as tf
+from argparse import Namespace
+from detector import (
+    DEFAULT_MIN_SCORE_THRESHOLD,
+    DEFAULT_NMS_IOU_THRESHOLD,
+    DEFAULT_NMS_MAX_OUTPUT_SIZE,
+    DEFAULT_NMS_SCORE_THRESHOLD,
+    DEFAULT_WARMUP_RUNS,
+    DISPLAY_NAMES,
+    Detector
+)
+from masterthesis.utils.profiler import Profiler
+from masterthesis.utils.serving import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_LATENCY,
+    HttpServer,
+    MicroBatcher,
+    Response,
+    prometheus_metrics
+)
+from model_cache import ModelCache, load_detect_fn, report_warm_up
+
+tf.get_logger().setLevel(logging.ERROR)
+
+
+def decode_image(data):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('Cannot decode the image, expected a JPEG or PNG file.')
+    return img
+
+
+def to_json(result, index):
+    boxes, scores, classes = result.frame(index)
+
+    # float32 values would be printed with spurious digits
+    boxes = boxes.astype(np.float64).round(2).tolist()
+    scores = scores.astype(np.float64).round(4).tolist()
+
+    return [
+        {
+            'box': box,
+            'score': score,
+            'class_id': class_id,
+            'class_name': DISPLAY_NAMES.get(class_id)
+        }
+        for box, score, class_id in zip(boxes, scores, classes.tolist())
+    ]
+
+
+class InferenceService(object):
+    """
+    POST /detect with a JPEG or PNG image as body returns its detections as JSON, with boxes in pixels as
+    [xmin, ymin, xmax, ymax]. GET /metrics returns the metrics of the service in the Prometheus text format.
+    """
+
+    def __init__(self, detector, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_latency=DEFAULT_MAX_LATENCY):
+        self.detector = detector
+        self.profiler = Profiler()
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_latency, profiler=self.profiler)
+
+        self.num_requests = 0
+        self.num_errors = 0
+
+    def _run_batch(self, imgs):
+        result = self.detector.detect(imgs)
+        return [to_json(result, i) for i in range(len(imgs))]
+
+    async def detect(self, request):
+        start_ns = time.perf_counter_ns()
+        self.num_requests += 1
+
+        try:
+            # Decoding is CPU bound, keep it out of the event loop
+            img = await asyncio.get_running_loop().run_in_executor(None, decode_image, request.body)
+            detections = await self.batcher.submit(img)
+        except Exception:
+            self.num_errors += 1
+            raise
+        finally:
+            self.profiler.record('request', time.perf_counter_ns() - start_ns)
+
+        height, width, _ = img.shape
+        return Response.json({'width': width, 'height': height, 'detections': detections})
+
+    async def metrics(self, request):
+        counters = {
+            'requests_total': self.num_requests,
+            'errors_total': self.num_errors,
+            'batches_total': self.batcher.num_batches,
+            'batched_requests_total': self.batcher.num_items,
+            'queue_size': self.batcher.queue_size,
+        }
+        return Response(prometheus_metrics(counters, self.profiler, prefix='detector_'),
+                        content_type='text/plain; version=0.0.4')
+
+    async def health(self, request):
+        return Response('OK', HTTPStatus.OK)
+
+    async def serve(self, host, port):
+        self.batcher.start()
+
+        server = HttpServer({
+            ('POST', '/detect'): self.detect,
+            ('GET', '/metrics'): self.metrics,
+            ('GET', '/health'): self.health,
+        })
+
+        print(f'Serving on http://{host}:{port}')
+        try:
+            await server.serve(host, port)
+        finally:
+            await self.batcher.stop()
+
+
+def main(args):
+    width, height = args.input_size
+    cache = ModelCache(args.model_cache_dir) if args.model_cache_dir else None
+
+    print('Loading saved model...')
+    detect_fn, key = load_detect_fn(args.saved_model_dir, (args.max_batch_size, height, width, 3), cache)
+
+    nms_args = None if args.nms_disabled else Namespace(
+        max_output_size=DEFAULT_NMS_MAX_OUTPUT_SIZE,
+        iou_threshold=DEFAULT_NMS_IOU_THRESHOLD,
+        score_threshold=DEFAULT_NMS_SCORE_THRESHOLD,
+        top_k=None,
+        class_agnostic=False
+    )
+
+    # Uploads have arbitrary sizes, they are resized to input_size so that they can be batched together
+    detector = Detector(
+        detect_fn,
+        batch_size=args.max_batch_size,
+        min_score_threshold=args.min_score_threshold,
+        nms_args=nms_args,
+        input_size=tuple(args.input_size)
+    )
+
+    # The first requests would otherwise pay graph optimization and kernel selection
+    report_warm_up('Detector', detector.warm_up(args.input_size, max(1, args.warmup_runs)), cache, key)
+
+    service = InferenceService(detector, max_batch_size=args.max_batch_size, max_latency=args.max_latency)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP inference service with micro-batching')
+
+    parser.add_argument('--saved-model-dir', required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=8080, type=int)
+
+    parser.add_argument('--max-batch-size', default=DEFAULT_MAX_BATCH_SIZE, type=int)
+    parser.add_argument('--max-latency', default=DEFAULT_MAX_LATENCY, type=float,
+                        help='Maximum time (in seconds) a request waits for other requests to be batched with')
+    parser.add_argument('--input-size', nargs=2, type=int, default=[640, 480], metavar=('WIDTH', 'HEIGHT'))
+
+    parser.add_argument('--warmup-runs', default=DEFAULT_WARMUP_RUNS, type=int)
+    parser.add_argument('--model-cache-dir', help='Cache of the SavedModel re-exported with a static input shape')
+
+    parser.add_argument('--min-score-threshold', default=DEFAULT_MIN_SCORE_THRESHOLD, type=float)
+    parser.add_argument('--nms-disabled', action='store_true')
+
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+import argparse
+import csv
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+
+def random_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', img)[1].tobytes()
+
+
+def worker(url, data, content_type, num_requests, latencies, errors):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80)
+    headers = {'Content-Type': content_type}
+
+    for _ in range(num_requests):
+        start_time = time.perf_counter()
+        try:
+            connection.request('POST', url.path, body=data, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (ConnectionError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            connection.close()
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80)
+            continue
+
+        latencies.append(time.perf_counter() - start_time)
+
+    connection.close()
+
+
+def run(url, data, content_type, concurrency, num_requests):
+    """Sends num_requests requests from concurrency clients, returns the QPS and the latencies in seconds."""
+    latencies, errors = [], []
+    per_worker = max(1, num_requests // concurrency)
+
+    threads = [
+        threading.Thread(target=worker, args=(url, data, content_type, per_worker, latencies, errors))
+        for _ in range(concurrency)
+    ]
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed_time = time.perf_counter() - start_time
+
+    return len(latencies) / elapsed_time, np.asarray(latencies), errors
+
+
+def main(args):
+    url = urlparse(args.url)
+
+    if args.image_path:
+        with open(args.image_path, 'rb') as f:
+            data = f.read()
+        content_type = 'image/png' if args.image_path.lower().endswith('.png') else 'image/jpeg'
+    else:
+        data = random_image(*args.image_size)
+        content_type = 'image/jpeg'
+
+    # Warm up the connection and the service
+    run(url, data, content_type, 1, 2)
+
+    rows = []
+    print(f'{"clients":>8} {"QPS":>10} {"p50 (ms)":>10} {"p95 (ms)":>10} {"p99 (ms)":>10} {"errors":>7}')
+    for concurrency in args.concurrency:
+        qps, latencies, errors = run(url, data, content_type, concurrency, args.num_requests)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else (np.nan,) * 3
+
+        rows.append({'concurrency': concurrency, 'qps': qps, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                     'errors': len(errors)})
+        print(f'{concurrency:>8} {qps:>10.2f} {p50:>10.2f} {p95:>10.2f} {p99:>10.2f} {len(errors):>7}')
+
+    if args.output_path:
+        with open(args.output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='QPS/latency curve of the inference service')
+
+    parser.add_argument('--url', default='http://127.0.0.1:8080/detect')
+
+    input_group = parser.add_mutually_exclusive_group()
+    input_group.add_argument('--image-path')
+    input_group.add_argument('--image-size', nargs=2, type=int, default=[640, 480], metavar=('WIDTH', 'HEIGHT'))
+
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--num-requests', default=256, type=int, help='Number of requests per concurrency level')
+    parser.add_argument('-o', '--output-path', help='Save the results to this CSV file')
+
+    main(parser.parse_args())
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import tensorflow as tf
+from masterthesis.utils import TimeIt
+
+HASH_CHUNK_SIZE = 1 << 20
+
+METADATA_FILENAME = 'metadata.json'
+
+
+def model_hash(saved_model_dir):
+    """SHA-256 of the graph and the variables of a SavedModel, so that re-exported models get a new hash."""
+    sha = hashlib.sha256()
+
+    paths = [os.path.join(saved_model_dir, 'saved_model.pb')]
+    variables_dir = os.path.join(saved_model_dir, 'variables')
+    if os.path.isdir(variables_dir):
+        paths += [os.path.join(variables_dir, filename) for filename in sorted(os.listdir(variables_dir))]
+
+    for path in paths:
+        sha.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def cache_key(saved_model_dir, input_shape):
+    # Graphs serialized by a TensorFlow version are not guaranteed to be optimized the same by another one
+    shape = 'x'.join(str(dim) for dim in input_shape)
+    return f'{model_hash(saved_model_dir)[:16]}-{shape}-tf{tf.__version__}'
+
+
+def _export(signature, model, input_shape, path):
+    @tf.function(input_signature=[tf.TensorSpec(input_shape, dtype=tf.uint8)])
+    def serving_default(input_tensor):
+        return signature(input_tensor)
+
+    module = tf.Module()
+    module.model = model
+
+    # Exported to a temporary directory first, so that concurrent or interrupted exports never leave a
+    # partial entry behind
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    tf.saved_model.save(module, tmp_path, signatures={'serving_default': serving_default.get_concrete_function()})
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another process has already exported the same entry
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class ModelCache(object):
+    """
+    Caches SavedModels re-exported with a static input shape (batch, height, width, 3), keyed by the hash of
+    the model and the input shape. The static shape lets TensorFlow fold the shape-dependent preprocessing of
+    the graph once at export time, instead of tracing and optimizing the dynamic graph at every start.
+
+    Every entry also stores the cold and warm latencies measured when the model was warmed up, so that they
+    can be compared across restarts.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, saved_model_dir, input_shape):
+        """Returns the (detect_fn, key, hit) of a SavedModel for inputs of input_shape."""
+        key = cache_key(saved_model_dir, input_shape)
+        path = self.path(key)
+
+        hit = os.path.isdir(path)
+        if not hit:
+            model = tf.saved_model.load(saved_model_dir)
+            _export(model.signatures['serving_default'], model, input_shape, path)
+
+        return tf.saved_model.load(path).signatures['serving_default'], key, hit
+
+    def metadata(self, key):
+        path = os.path.join(self.path(key), METADATA_FILENAME)
+        if not os.path.isfile(path):
+            return {}
+
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def update_metadata(self, key, **values):
+        metadata = {**self.metadata(key), **values, 'updated': time.time()}
+
+        path = os.path.join(self.path(key), METADATA_FILENAME)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def load_detect_fn(saved_model_dir, input_shape=None, cache=None):
+    """
+    Returns the (detect_fn, key) of a SavedModel. If a ModelCache and the input shape are given, the model
+    specialized to input_shape is loaded from cache (and exported first on a miss), key is None otherwise.
+    """
+    if cache is None or input_shape is None:
+        with TimeIt('Saved model has been loaded successfully'):
+            return tf.saved_model.load(saved_model_dir).signatures['serving_default'], None
+
+    with TimeIt(f'Saved model for inputs of shape {tuple(input_shape)} has been loaded successfully'):
+        detect_fn, key, hit = cache.load(saved_model_dir, input_shape)
+
+    print(f'Model cache {"hit" if hit else "miss"}: {key}')
+    return detect_fn, key
+
+
+def report_warm_up(name, latencies, cache=None, key=None):
+    """Prints the cold and warm latencies of a warm-up, and saves them to the cache entry of key if given."""
+    if not latencies:
+        return
+
+    cold_ms = latencies[0]
+    warm_ms = sum(latencies[1:]) / len(latencies[1:]) if len(latencies) > 1 else float('nan')
+    print(f'{name}: cold inference {cold_ms:.2f} ms, warm inference {warm_ms:.2f} ms')
+
+    if cache is not None and key is not None:
+        previous = cache.metadata(key)
+        if 'cold_ms' in previous:
+            print(f'{name}: previous start cold inference {previous["cold_ms"]:.2f} ms, '
+                  f'warm inference {previous["warm_ms"]:.2f} ms')
+        cache.update_metadata(key, cold_ms=cold_ms, warm_ms=warm_ms)
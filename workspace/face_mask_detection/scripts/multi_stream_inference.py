@@ -0,0 +1,103 @@
+import argparse
+import logging
+import os
+
+import tensorflow as tf
+from argparse import Namespace
+from detector import (
+    BGR_COLORS,
+    DEFAULT_MIN_SCORE_THRESHOLD,
+    DEFAULT_NMS_IOU_THRESHOLD,
+    DEFAULT_NMS_MAX_OUTPUT_SIZE,
+    DEFAULT_NMS_SCORE_THRESHOLD,
+    DISPLAY_NAMES,
+    Detector
+)
+from masterthesis.utils import TimeIt
+from masterthesis.utils.demo import DROP_POLICIES
+from masterthesis.utils.streams import SCHEDULING_POLICIES, MultiStreamRunner, Stream, is_live_source
+
+tf.get_logger().setLevel(logging.ERROR)
+
+
+def main(args):
+    print('Loading saved model...')
+    with TimeIt('Saved model has been loaded successfully'):
+        model = tf.saved_model.load(args.saved_model_dir)
+        detect_fn = model.signatures['serving_default']
+
+    nms_args = None if args.nms_disabled else Namespace(
+        max_output_size=DEFAULT_NMS_MAX_OUTPUT_SIZE,
+        iou_threshold=DEFAULT_NMS_IOU_THRESHOLD,
+        score_threshold=DEFAULT_NMS_SCORE_THRESHOLD,
+        top_k=None,
+        class_agnostic=False
+    )
+
+    # The model is loaded once and shared by all the streams
+    detector = Detector(
+        detect_fn,
+        batch_size=args.batch_size,
+        min_score_threshold=args.min_score_threshold,
+        nms_args=nms_args,
+        input_size=args.input_size
+    )
+
+    def run_on_batch(imgs):
+        detector.detect(imgs).draw(imgs, display_names=DISPLAY_NAMES, colors=BGR_COLORS)
+        return imgs
+
+    streams = []
+    for i, source in enumerate(args.sources):
+        name = f'{i}:{os.path.basename(source)}'
+        output_path = None
+        if args.output_dir:
+            filename = f'{i}.avi' if is_live_source(source) else f'{i}_{os.path.basename(source)}'
+            output_path = os.path.join(args.output_dir, 'annotated_' + filename)
+
+        streams.append(Stream(
+            source,
+            name=name,
+            queue_size=args.queue_size,
+            drop_policy=args.drop_policy,
+            output_path=output_path
+        ))
+
+    print(f'Running inference on {len(streams)} streams')
+    MultiStreamRunner(
+        streams,
+        run_on_batch=run_on_batch,
+        batch_size=args.batch_size,
+        policy=args.policy,
+        max_wait=args.max_wait
+    ).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run one detection model on many video streams')
+
+    parser.add_argument('--saved-model-dir', required=True)
+    parser.add_argument(
+        'sources',
+        nargs='+',
+        help='Video files, stream URLs (e.g. rtsp://...) or test streams (test:WIDTHxHEIGHT@FPS[:NUM_FRAMES])'
+    )
+    parser.add_argument('--output-dir')
+
+    parser.add_argument('--batch-size', default=4, type=int)
+    parser.add_argument('--policy', default='round-robin', choices=SCHEDULING_POLICIES)
+    parser.add_argument('--max-wait', default=0.005, type=float,
+                        help='Maximum time (in seconds) to wait for a batch to fill')
+    parser.add_argument('--queue-size', default=4, type=int, help='Maximum number of queued frames per stream')
+    parser.add_argument('--drop-policy', choices=DROP_POLICIES,
+                        help='Default: drop-oldest for live streams, block for video files')
+    parser.add_argument('--input-size', nargs=2, type=int, default=[640, 480], metavar=('WIDTH', 'HEIGHT'),
+                        help='Frames of all the streams are resized to this size to be batched together')
+
+    parser.add_argument('--min-score-threshold', default=DEFAULT_MIN_SCORE_THRESHOLD, type=float)
+    parser.add_argument('--nms-disabled', action='store_true')
+
+    args = parser.parse_args()
+    args.input_size = tuple(args.input_size)
+
+    main(args)
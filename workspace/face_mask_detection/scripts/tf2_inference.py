@@ -7,9 +7,29 @@ import cv2
 import numpy as np
 import tensorflow as tf
 from argparse import Namespace
-from masterthesis.detection.utils import visualize_detections
+from detector import (
+    BGR_COLORS,
+    CHANNEL_ORDERS,
+    DEFAULT_CLASSIFIER_BATCH_SIZE,
+    DEFAULT_CROP_MARGIN,
+    DEFAULT_CROP_SIZE,
+    DEFAULT_MIN_SCORE_THRESHOLD,
+    DEFAULT_NMS_IOU_THRESHOLD,
+    DEFAULT_NMS_MAX_OUTPUT_SIZE,
+    DEFAULT_NMS_SCORE_THRESHOLD,
+    DEFAULT_TILE_OVERLAP,
+    DEFAULT_WARMUP_RUNS,
+    DISPLAY_NAMES,
+    Detector,
+    TiledDetector
+)
+from masterthesis.detection.tracking import MATCHING_METHODS, StridedTracker, Tracker
 from masterthesis.utils import TimeIt
-from masterthesis.utils.demo import run_on_video
+from masterthesis.utils.demo import DROP_POLICIES, run_on_video, run_on_video_batched, run_on_video_pipelined
+from masterthesis.utils.motion import DEFAULT_MAX_SKIP, MotionGate
+from masterthesis.utils.profiler import Profiler
+from masterthesis.utils.visualization_utils import draw_detections_on_image_array
+from model_cache import ModelCache, load_detect_fn, report_warm_up
 
 
 # INFO and WARNING messages are not printed
@@ -34,90 +54,74 @@ class Range(object):
 
 tf.get_logger().setLevel(logging.ERROR)
 
-DEFAULT_MIN_SCORE_THRESHOLD = 0.6
 
-DEFAULT_NMS_MAX_OUTPUT_SIZE = 100
-DEFAULT_NMS_IOU_THRESHOLD = 0.5
-DEFAULT_NMS_SCORE_THRESHOLD = 0.005
+def __run_on_batch(detector, imgs):
+    result = detector.detect(imgs)
 
-DISPLAY_NAMES = {
-    1: 'Mask',
-    2: 'No mask'
-}
+    # Frames are not used after inference, so that detections are drawn on them without copying them
+    with detector.profiler.span('draw'):
+        result.draw(imgs, display_names=DISPLAY_NAMES, colors=BGR_COLORS)
 
-COLORS = {
-    1: (0, 255, 0),
-    2: (255, 0, 0)
-}
+    return imgs
 
 
-def __run_on_image(
-        detect_fn,
-        img,
-        min_score_threshold=DEFAULT_MIN_SCORE_THRESHOLD,
-        nms_args=None
-):
-    # img shape = (H, W, D) D order = (B, G, R) in cv2
-    img = img[:, :, ::-1]  # convert BGR -> RGB
-    input_tensor = tf.convert_to_tensor(img)
-    input_tensor = input_tensor[tf.newaxis, ...]
+def __run_on_image(detector, img):
+    return __run_on_batch(detector, [img])[0]
 
-    detections = detect_fn(input_tensor)
 
-    # print(detections)
-
-    # All outputs are batches tensors.
-    # Convert to numpy arrays, and take index [0] to remove the batch dimension.
-    # We're only interested in the first num_detections.
-    num_detections = int(detections.pop('num_detections').numpy().item())
-    detections = {key: value[0, :num_detections].numpy() for key, value in detections.items()}
-    # detections['num_detections'] = num_detections
-
-    boxes = detections['detection_boxes']
-    classes = detections['detection_classes'].astype(np.uint8)
-    scores = detections['detection_scores']
-
-    if nms_args:
-        selected_indices = tf.image.non_max_suppression(
+def __draw(img, boxes, scores, classes, profiler):
+    with profiler.span('draw'):
+        draw_detections_on_image_array(
+            img,
             boxes=boxes,
+            classes=classes,
             scores=scores,
-            max_output_size=nms_args.max_output_size,
-            iou_threshold=nms_args.iou_threshold,
-            score_threshold=nms_args.score_threshold
+            display_names=DISPLAY_NAMES,
+            colors=BGR_COLORS
         )
 
-        boxes = boxes[selected_indices]
-        classes = classes[selected_indices]
-        scores = scores[selected_indices]
+    return img
 
-    # print(f'detection_boxes: {boxes.shape}')
-    # print(f'detection_classes: {classes}')
-    # print(f'detection_classes: {classes.shape}')
-    # print(f'detection_scores: {scores}')
-    # print(f'detection_scores: {scores.shape}')
 
-    out_img = img.copy()
+def __run_on_image_tracked(tracker, img, profiler):
+    # The detector only runs every tracker.stride frames, tracks are extrapolated on the other ones.
+    with profiler.span('track'):
+        tracks = tracker(img)
 
-    visualize_detections(
-        out_img,
-        boxes=boxes,
-        classes=classes,
-        scores=scores,
-        display_names=DISPLAY_NAMES,
-        colors=COLORS,
-        min_score_threshold=min_score_threshold,
-        use_normalized_coordinates=True
-    )
+    # Smoothed and extrapolated boxes can leave the frame, and negative coordinates would wrap around when drawn.
+    # Clipped into a copy, so that the state of the tracker is not changed.
+    height, width = img.shape[:2]
+    boxes = np.clip(np.reshape(tracks.boxes.data, (-1, 4)), 0, [width - 1, height - 1, width - 1, height - 1])
 
-    return out_img[:, :, ::-1]  # convert RGB -> BGR
+    return __draw(img, boxes, tracks.scores, tracks.classes, profiler)
 
 
-def main(args):
-    print('Loading saved model...')
-    with TimeIt('Saved model has been loaded successfully'):
-        model = tf.saved_model.load(args.saved_model_dir)
-        detect_fn = model.signatures['serving_default']
+def __run_on_image_gated(gate, img, profiler):
+    # The detections of the last frame the detector has run on are reused while the scene does not change
+    boxes, scores, classes = gate(img)
+    return __draw(img, boxes, scores, classes, profiler)
+
+
+def __run_on_image_detect(detect, img, profiler):
+    # detect returns the detections of a single frame (tiled or two-stage inference)
+    with profiler.span('frame'):
+        boxes, scores, classes = detect(img)
+
+    return __draw(img, boxes, scores, classes, profiler)
+
+
+def __frame_size(args):
+    if args.image_path:
+        height, width = cv2.imread(args.image_path).shape[:2]
+        return width, height
+
+    cap = cv2.VideoCapture(args.video_path)
+    frame_size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return frame_size
 
+
+def main(args):
     output_dir = args.output_dir
 
     filepath = args.image_path if args.image_path else args.video_path
@@ -127,31 +131,180 @@ def main(args):
         max_output_size=args.nms_max_output_size,
         iou_threshold=args.nms_iou_threshold,
         score_threshold=args.nms_score_threshold,
+        top_k=args.nms_top_k,
+        class_agnostic=args.nms_class_agnostic
     )
 
-    def run_on_image(x):
-        return __run_on_image(
-            detect_fn=detect_fn,
-            img=x,
+    profiler = Profiler(enabled=args.profile or args.profile_output is not None)
+
+    # Input shapes are known before the first frame, so that the model is warmed up (and loaded from the
+    # cache) for the shapes it is going to run on
+    frame_width, frame_height = frame_size = __frame_size(args)
+    cache = ModelCache(args.model_cache_dir) if args.model_cache_dir else None
+    detect_fns = {}
+
+    def load(input_shape):
+        # Without a cache every detector shares the dynamic-shape signature of the SavedModel
+        shape = tuple(input_shape) if cache else None
+        if shape not in detect_fns:
+            detect_fns[shape] = load_detect_fn(args.saved_model_dir, shape, cache)
+        return detect_fns[shape]
+
+    def warm_up(name, detector, key, warmup_frame_size):
+        report_warm_up(name, detector.warm_up(warmup_frame_size, args.warmup_runs), cache, key)
+
+    print('Loading saved model...')
+
+    detector = None
+    if not args.classifier_path and (not args.tile_size or args.tile_full_frame):
+        batch_size = args.batch_size if args.video_path else 1
+        detect_fn, key = load((batch_size, frame_height, frame_width, 3))
+
+        detector = Detector(
+            detect_fn,
+            batch_size=batch_size,
+            min_score_threshold=args.min_score_threshold,
+            nms_args=nms_args,
+            channel_order=args.channel_order,
+            profiler=profiler
+        )
+        warm_up('Detector', detector, key, frame_size)
+
+        def run_on_image(x):
+            return __run_on_image(detector, x)
+
+        def run_on_batch(x):
+            return __run_on_batch(detector, x)
+
+    detect = detector
+    if args.tile_size:
+        tile_size = min(args.tile_size[0], frame_width), min(args.tile_size[1], frame_height)
+        detect_fn, key = load((args.tile_batch_size, tile_size[1], tile_size[0], 3))
+
+        tile_detector = Detector(
+            detect_fn,
+            batch_size=args.tile_batch_size,
+            min_score_threshold=args.min_score_threshold,
+            nms_args=nms_args,
+            channel_order=args.channel_order,
+            profiler=profiler
+        )
+        warm_up('Tile detector', tile_detector, key, tile_size)
+
+        detect = TiledDetector(
+            tile_detector,
+            tile_size=tile_size,
+            overlap=args.tile_overlap,
+            iou_threshold=args.nms_iou_threshold,
+            class_agnostic=args.nms_class_agnostic,
+            full_frame_detector=detector
+        )
+
+    if args.classifier_path:
+        # PyTorch is only required by the two-stage pipeline
+        from two_stage import MaskClassifier, TwoStageDetector
+
+        face_detect_fn, _ = load_detect_fn(args.face_saved_model_dir)
+        with TimeIt('Classifier has been loaded successfully'):
+            classifier = MaskClassifier.load(
+                args.classifier_path,
+                crop_size=tuple(args.crop_size),
+                batch_size=args.classifier_batch_size,
+                profiler=profiler
+            )
+
+        face_detector = Detector(
+            face_detect_fn,
             min_score_threshold=args.min_score_threshold,
-            nms_args=nms_args
+            nms_args=nms_args,
+            channel_order=args.channel_order,
+            profiler=profiler
         )
+        warm_up('Face detector', face_detector, None, frame_size)
+
+        detect = TwoStageDetector(face_detector, classifier, margin=args.crop_margin)
+
+    if detect is not detector:
+        def run_on_image(x):
+            return __run_on_image_detect(detect, x, profiler)
+
+    gate = None
+    if args.video_path and args.motion_threshold is not None:
+        gate = MotionGate(detect, threshold=args.motion_threshold, max_skip=args.max_skip)
+
+        def run_on_image(x):
+            return __run_on_image_gated(gate, x, profiler)
+
+    if args.video_path and args.tracking:
+        tracker = StridedTracker(
+            gate or detect,
+            stride=args.detector_stride,
+            tracker=Tracker(
+                max_age=args.tracker_max_age,
+                min_hits=args.tracker_min_hits,
+                iou_threshold=args.tracker_iou_threshold,
+                matching=args.tracker_matching
+            )
+        )
+
+        def run_on_image(x):
+            return __run_on_image_tracked(tracker, x, profiler)
 
     print(f'Running inference on {filepath}')
     with TimeIt(f'Inference results have been saved to {output_path}'):
         if args.image_path:
             img = cv2.imread(filepath)
-            out_img = run_on_image(img)
+            with profiler.span('image'):
+                out_img = run_on_image(img)
 
             cv2.imwrite(output_path, out_img)
 
+        elif args.video_path and args.batch_size > 1:
+            run_on_video_batched(
+                filepath,
+                run_on_batch=run_on_batch,
+                batch_size=args.batch_size,
+                output_path=output_path,
+                profiler=profiler
+            )
+
+        elif args.video_path and args.pipelined:
+            run_on_video_pipelined(
+                filepath,
+                run_on_image=run_on_image,
+                output_path=output_path,
+                read_queue_size=args.read_queue_size,
+                write_queue_size=args.write_queue_size,
+                drop_policy=args.drop_policy,
+                profiler=profiler
+            )
+
         elif args.video_path:
             run_on_video(
                 filepath,
                 run_on_image=run_on_image,
-                output_path=output_path
+                output_path=output_path,
+                profiler=profiler
             )
 
+    if gate:
+        print()
+        gate.print_statistics()
+
+    if profiler.enabled and not (args.video_path and args.pipelined):
+        print()
+        profiler.print_statistics()
+
+    if profiler.enabled and detector:
+        print(f'Host bytes copied per frame: {detector.bytes_per_frame / 2 ** 20:.2f} MiB')
+
+    if profiler.enabled and args.tile_size:
+        print(f'Tiles per frame: {detect.tiles_per_frame:.1f}')
+
+    if args.profile_output:
+        profiler.export(args.profile_output)
+        print(f'Profiling statistics have been saved to {args.profile_output}')
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -205,5 +358,263 @@ if __name__ == '__main__':
         choices=Range(0, 1)
     )
 
+    parser.add_argument(
+        '--nms-top-k',
+        default=None,
+        type=int,
+        choices=Range(1, sys.maxsize)
+    )
+
+    parser.add_argument(
+        '--nms-class-agnostic',
+        action='store_true'
+    )
+
+    ########################################
+    # Input arguments
+    ########################################
+
+    parser.add_argument(
+        '--channel-order',
+        default='host',
+        choices=CHANNEL_ORDERS,
+        help='Convert BGR frames to RGB on the host (OpenCV) or inside the TensorFlow graph'
+    )
+
+    ########################################
+    # Batching arguments
+    ########################################
+
+    parser.add_argument(
+        '--batch-size',
+        default=1,
+        type=int,
+        choices=Range(1, sys.maxsize),
+        help='Number of video frames per detect_fn call, the model must accept batches of this size'
+    )
+
+    ########################################
+    # Tiling arguments
+    ########################################
+
+    parser.add_argument(
+        '--tile-size',
+        default=None,
+        nargs=2,
+        type=int,
+        metavar=('WIDTH', 'HEIGHT'),
+        help='Run the detector on overlapping tiles of this size of every frame, for high-resolution inputs'
+    )
+
+    parser.add_argument(
+        '--tile-overlap',
+        default=DEFAULT_TILE_OVERLAP,
+        type=int,
+        choices=Range(0, sys.maxsize),
+        help='Minimum overlap (in pixels) of neighbouring tiles, objects up to this size are never cut'
+    )
+
+    parser.add_argument(
+        '--tile-batch-size',
+        default=1,
+        type=int,
+        choices=Range(1, sys.maxsize),
+        help='Number of tiles per detect_fn call, the model must accept batches of this size'
+    )
+
+    parser.add_argument(
+        '--tile-full-frame',
+        action='store_true',
+        help='Also run the detector on the whole frame, to detect objects larger than the tiles'
+    )
+
+    ########################################
+    # Two-stage arguments
+    ########################################
+
+    parser.add_argument(
+        '--classifier-path',
+        default=None,
+        help='TorchScript mask/no-mask classifier, run on the faces found by the model of --face-saved-model-dir '
+             'instead of running the face-mask detector'
+    )
+
+    parser.add_argument(
+        '--face-saved-model-dir',
+        default=None
+    )
+
+    parser.add_argument(
+        '--crop-size',
+        default=list(DEFAULT_CROP_SIZE),
+        nargs=2,
+        type=int,
+        metavar=('WIDTH', 'HEIGHT')
+    )
+
+    parser.add_argument(
+        '--crop-margin',
+        default=DEFAULT_CROP_MARGIN,
+        type=float,
+        help='Faces are expanded by this fraction of their size on every side before being classified'
+    )
+
+    parser.add_argument(
+        '--classifier-batch-size',
+        default=DEFAULT_CLASSIFIER_BATCH_SIZE,
+        type=int,
+        choices=Range(1, sys.maxsize),
+        help='Fixed number of crops per classifier forward pass'
+    )
+
+    ########################################
+    # Start-up arguments
+    ########################################
+
+    parser.add_argument(
+        '--warmup-runs',
+        default=DEFAULT_WARMUP_RUNS,
+        type=int,
+        choices=Range(0, sys.maxsize),
+        help='Number of inferences on black frames before the first real frame, the first one being cold'
+    )
+
+    parser.add_argument(
+        '--model-cache-dir',
+        default=None,
+        help='Cache the SavedModel re-exported with the static input shape of the input, keyed by model hash '
+             'and input shape, so that restarts load the specialized model'
+    )
+
+    ########################################
+    # Profiling arguments
+    ########################################
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the latency percentiles of every stage'
+    )
+
+    parser.add_argument(
+        '--profile-output',
+        help='Export the profiling statistics to this file (CSV if it ends with .csv, JSON otherwise)'
+    )
+
+    ########################################
+    # Video pipeline arguments
+    ########################################
+
+    parser.add_argument(
+        '--pipelined',
+        action='store_true',
+        help='Decode and encode the video on separate threads, overlapping I/O with inference'
+    )
+
+    parser.add_argument(
+        '--read-queue-size',
+        default=8,
+        type=int,
+        choices=Range(1, sys.maxsize)
+    )
+
+    parser.add_argument(
+        '--write-queue-size',
+        default=8,
+        type=int,
+        choices=Range(1, sys.maxsize)
+    )
+
+    parser.add_argument(
+        '--drop-policy',
+        default='block',
+        choices=DROP_POLICIES,
+        help='What the reader does when the inference falls behind: block (offline) or drop-oldest (live)'
+    )
+
+    ########################################
+    # Motion gating arguments
+    ########################################
+
+    parser.add_argument(
+        '--motion-threshold',
+        default=None,
+        type=float,
+        choices=Range(0, 1),
+        help='Skip the detector (reusing the last detections) on video frames where less than this fraction '
+             'of the pixels changed'
+    )
+
+    parser.add_argument(
+        '--max-skip',
+        default=DEFAULT_MAX_SKIP,
+        type=int,
+        choices=Range(0, sys.maxsize),
+        help='Maximum number of consecutive frames the detector can be skipped on'
+    )
+
+    ########################################
+    # Tracking arguments
+    ########################################
+
+    parser.add_argument(
+        '--tracking',
+        action='store_true',
+        help='Track the detections across the frames of the video'
+    )
+
+    parser.add_argument(
+        '--detector-stride',
+        default=1,
+        type=int,
+        choices=Range(1, sys.maxsize),
+        help='Run the detector every DETECTOR_STRIDE frames, tracks are extrapolated on the other ones'
+    )
+
+    parser.add_argument(
+        '--tracker-max-age',
+        default=1,
+        type=int,
+        choices=Range(1, sys.maxsize),
+        help='Number of detector runs a track survives without being matched'
+    )
+
+    parser.add_argument(
+        '--tracker-min-hits',
+        default=3,
+        type=int,
+        choices=Range(1, sys.maxsize)
+    )
+
+    parser.add_argument(
+        '--tracker-iou-threshold',
+        default=0.3,
+        type=float,
+        choices=Range(0, 1)
+    )
+
+    parser.add_argument(
+        '--tracker-matching',
+        default='hungarian',
+        choices=MATCHING_METHODS
+    )
+
     args = parser.parse_args()
+
+    if args.batch_size > 1 and (args.tracking or args.pipelined or args.motion_threshold is not None):
+        parser.error('--batch-size greater than one cannot be combined with --tracking, --pipelined or '
+                     '--motion-threshold')
+
+    if args.batch_size > 1 and args.tile_size:
+        parser.error('--batch-size greater than one cannot be combined with --tile-size, use --tile-batch-size')
+
+    if args.classifier_path and not args.face_saved_model_dir:
+        parser.error('--classifier-path requires --face-saved-model-dir')
+
+    if args.classifier_path and (args.tile_size or args.batch_size > 1):
+        parser.error('--classifier-path cannot be combined with --tile-size or --batch-size')
+
+    if args.tile_size and args.tile_overlap >= min(args.tile_size):
+        parser.error('--tile-overlap must be smaller than the tiles')
+
     main(args)
@@ -0,0 +1,106 @@
+import numpy as np
+import torch
+from detector import (
+    DEFAULT_CLASSIFIER_BATCH_SIZE,
+    DEFAULT_CLASSIFIER_THRESHOLD,
+    DEFAULT_CROP_MARGIN,
+    DEFAULT_CROP_SIZE,
+    MASK_CLASS_ID,
+    NO_MASK_CLASS_ID
+)
+from masterthesis.detection.crops import crop_and_resize, expand_boxes
+from masterthesis.utils.profiler import Profiler
+
+
+class MaskClassifier(object):
+    """
+    Classifies BGR face crops as mask/no-mask with a TorchScript model, taking (N, 3, height, width) float RGB
+    crops in [0, 1] (normalization must be part of the model) and returning the (N,) or (N, 1) no-mask logits.
+
+    Crops are gathered into a preallocated (batch_size, height, width, 3) uint8 array, that is shared with
+    the input tensor, and the model always runs on the whole array, so that it sees a single input shape.
+    """
+
+    @staticmethod
+    def load(path, device=None, **kwargs):
+        device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        model = torch.jit.load(path, map_location=device)
+        return MaskClassifier(model.eval(), device=device, **kwargs)
+
+    def __init__(
+            self,
+            model,
+            crop_size=DEFAULT_CROP_SIZE,
+            batch_size=DEFAULT_CLASSIFIER_BATCH_SIZE,
+            device=None,
+            profiler=None
+    ):
+        self.model = model
+        self.crop_size = crop_size
+        self.batch_size = batch_size
+        self.device = torch.device(device or 'cpu')
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        width, height = crop_size
+        self._crops = np.zeros((batch_size, height, width, 3), dtype=np.uint8)
+        self._inputs = torch.from_numpy(self._crops)
+
+        self.num_batches = 0
+
+    @torch.no_grad()
+    def _forward(self):
+        inputs = self._inputs.to(self.device, non_blocking=True)
+        # (B, H, W, BGR) uint8 to (B, RGB, H, W) float
+        inputs = inputs.permute(0, 3, 1, 2).flip(1).float().div_(255)
+
+        self.num_batches += 1
+        return torch.sigmoid(self.model(inputs).reshape(len(inputs), -1)[:, 0]).cpu().numpy()
+
+    def __call__(self, frame, boxes):
+        """Returns the no-mask probabilities of the [xmin, ymin, xmax, ymax] pixel boxes of frame."""
+        probabilities = np.empty(len(boxes), dtype=np.float32)
+
+        for start in range(0, len(boxes), self.batch_size):
+            chunk = boxes[start:start + self.batch_size]
+
+            with self.profiler.span('crop'):
+                crop_and_resize(frame, chunk, self.crop_size, out=self._crops)
+
+            with self.profiler.span('classify'):
+                probabilities[start:start + len(chunk)] = self._forward()[:len(chunk)]
+
+        return probabilities
+
+
+class TwoStageDetector(object):
+    """
+    Detects faces with face_detector (a frame to (boxes, scores, classes) callable, e.g. a Detector running a
+    face or head detector), then classifies all of them at once with a MaskClassifier. Boxes are expanded by
+    margin times their size before cropping, as the classifier needs some context around the face.
+
+    Returns the detections of a frame with the classes of the single-stage detector.
+    """
+
+    def __init__(
+            self,
+            face_detector,
+            classifier,
+            margin=DEFAULT_CROP_MARGIN,
+            threshold=DEFAULT_CLASSIFIER_THRESHOLD
+    ):
+        self.face_detector = face_detector
+        self.classifier = classifier
+        self.margin = margin
+        self.threshold = threshold
+
+    def __call__(self, frame):
+        boxes, scores, _ = self.face_detector(frame)
+
+        if len(boxes) == 0:
+            return boxes, scores, np.empty(0, dtype=np.int32)
+
+        crop_boxes = expand_boxes(boxes, self.margin, (frame.shape[1], frame.shape[0]))
+        probabilities = self.classifier(frame, crop_boxes)
+
+        classes = np.where(probabilities > self.threshold, NO_MASK_CLASS_ID, MASK_CLASS_ID).astype(np.int32)
+        return boxes, scores, classes
@@ -23,14 +23,22 @@ class WiderPersonToKittiConverter(ToKittiConverter):
             widerperson_base_dir,
             limit,
             stage,
-            verbose
+            verbose,
+            workers=1,
+            force=False,
+            copy_method=None,
+            encoding=None
     ):
         super(WiderPersonToKittiConverter, self).__init__(
             kitti_base_dir,
             limit,
             kitti_image_size,
             verbose=verbose,
-            stage=stage
+            stage=stage,
+            workers=workers,
+            force=force,
+            copy_method=copy_method,
+            encoding=encoding
         )
 
         self.annotations_dir = os.path.join(widerperson_base_dir, 'Annotations')
@@ -40,37 +48,30 @@ class WiderPersonToKittiConverter(ToKittiConverter):
         with open(os.path.join(widerperson_base_dir, filename + '.txt'), 'r') as f:
             self.image_ids = list(map(lambda x: x.strip(), f.readlines()))
 
-    def __call__(self):
+    def examples(self):
         for image_id in self.image_ids:
             image_filename = image_id + '.jpg'
-            if self.count_person < self.person_limit:
-                bboxes = []
-                class_names = []
-
-                with open(os.path.join(self.annotations_dir, image_filename + '.txt'), 'r') as f:
-                    # Read number of annotations
-                    count = int(f.readline())
-                    for _ in range(count):
-                        reader = LineReader(f.readline().strip(), r'[\t ]+')
-
-                        # Read class label
-                        category = reader(func=int)
-
-                        if category not in [
-                            WiderPersonCategory.CROWD,
-                            WiderPersonCategory.IGNORE_REGION
-                        ]:
-                            # Read bbox
-                            bbox = reader(4, func=float)
-
-                            bboxes.append(bbox)
-                            class_names.append(Category.PERSON)
-
-                if bboxes:
-                    self.write_example(
-                        image_path=os.path.join(self.images_dir, image_filename),
-                        class_names=class_names,
-                        bboxes=bboxes
-                    )
-
-        return self.count_person
+            bboxes = []
+            class_names = []
+
+            with open(os.path.join(self.annotations_dir, image_filename + '.txt'), 'r') as f:
+                # Read number of annotations
+                count = int(f.readline())
+                for _ in range(count):
+                    reader = LineReader(f.readline().strip(), r'[\t ]+')
+
+                    # Read class label
+                    category = reader(func=int)
+
+                    if category not in [
+                        WiderPersonCategory.CROWD,
+                        WiderPersonCategory.IGNORE_REGION
+                    ]:
+                        # Read bbox
+                        bbox = reader(4, func=float)
+
+                        bboxes.append(bbox)
+                        class_names.append(Category.PERSON)
+
+            if bboxes:
+                yield os.path.join(self.images_dir, image_filename), class_names, bboxes